@@ -1,5 +1,7 @@
 """Utility classes and functions for calculating the arm relative and absolute position."""
-from typing import Dict
+import functools
+import math
+from typing import Dict, Tuple
 
 import numpy as np
 import torch
@@ -59,43 +61,77 @@ def position_rotation_from_mat(matrix):
     return result
 
 
-def find_closest_inverse(deg):
-    for k in saved_inverse_rotation_mats.keys():
-        if abs(k - deg) < 5:
-            return saved_inverse_rotation_mats[k]
-    # if it reaches here it means it had not calculated the degree before
-    rotation = R.from_euler("xyz", [0, deg, 0], degrees=True)
-    result = rotation.as_matrix()
-    inverse = inverse_rot_trans_mat(result)
-    # print("WARNING: Had to calculate the matrix for ", deg)
-    return inverse
+def _quantized_yaw(deg: float) -> float:
+    # rotations within 5 degrees of a multiple of 45 (in [0, 360]) snap to it, as the saved inverses always did
+    if not math.isfinite(deg):
+        return deg
+    closest = round(deg / 45) * 45
+    if 0 <= closest <= 360 and abs(deg - closest) < 5:
+        return float(closest % 360)
+    return deg
 
 
-def calc_inverse(deg):
-    rotation = R.from_euler("xyz", [0, deg, 0], degrees=True)
-    result = rotation.as_matrix()
-    inverse = inverse_rot_trans_mat(result)
+@functools.lru_cache(maxsize=1024)
+def _inverse_yaw_matrix(deg: float) -> np.ndarray:
+    # inverse of a rotation of deg degrees around y, in closed form (the transpose of the rotation)
+    theta = math.radians(deg)
+    cos_theta, sin_theta = math.cos(theta), math.sin(theta)
+    inverse = np.array([[cos_theta, 0, -sin_theta], [0, 1, 0], [sin_theta, 0, cos_theta]])
+    inverse.flags.writeable = False
     return inverse
 
 
-saved_inverse_rotation_mats = {i: calc_inverse(i) for i in range(0, 360, 45)}
-saved_inverse_rotation_mats[360] = saved_inverse_rotation_mats[0]
+def find_closest_inverse(deg):
+    return _inverse_yaw_matrix(_quantized_yaw(float(deg)))
+
+
+@functools.lru_cache(maxsize=1024)
+def _normalized_euler(x: float, y: float, z: float) -> Tuple[float, float, float]:
+    # the rotation position_rotation_from_mat(make_rotation_matrix(...)) returns, objects rarely rotate
+    rotation = R.from_matrix(R.from_euler("xyz", [x, y, z], degrees=True).as_matrix()).as_euler("xyz", degrees=True)
+    return rotation[0], rotation[1], rotation[2]
 
 
 def convert_world_to_agent_coordinate(world_obj, agent_state):
     position = agent_state["position"]
     rotation = agent_state["rotation"]
-    agent_translation = [position["x"], position["y"], position["z"]]
-    # inverse_agent_rotation = inverse_rot_trans_mat(agent_rotation_matrix[:3, :3])
+    agent_translation = np.array([position["x"], position["y"], position["z"]], dtype=np.float64)
     assert abs(rotation["x"] - 0) < 0.01 and abs(rotation["z"] - 0) < 0.01
     inverse_agent_rotation = find_closest_inverse(rotation["y"])
-    obj_matrix = make_rotation_matrix(world_obj["position"], world_obj["rotation"])
+    obj_position = world_obj["position"]
     obj_translation = np.matmul(
-        inverse_agent_rotation, (obj_matrix[:3, 3] - agent_translation)
+        inverse_agent_rotation,
+        np.array([obj_position["x"], obj_position["y"], obj_position["z"]], dtype=np.float64) - agent_translation,
     )
     # add rotation later
-    obj_matrix[:3, 3] = obj_translation
-    result = position_rotation_from_mat(obj_matrix)
+    obj_rotation = world_obj["rotation"]
+    rotation_x, rotation_y, rotation_z = _normalized_euler(float(obj_rotation["x"]), float(obj_rotation["y"]), float(obj_rotation["z"]))
+    return {
+        "position": {"x": obj_translation[0], "y": obj_translation[1], "z": obj_translation[2]},
+        "rotation": {"x": rotation_x, "y": rotation_y, "z": rotation_z},
+    }
+
+
+def convert_world_to_agent_coordinate_batched(world_positions, agent_positions, agent_rotations) -> np.ndarray:
+    """Positions of N points in the coordinates of the agents observing them, as the "position" of
+    convert_world_to_agent_coordinate.
+
+    world_positions is N x 3, agent_positions N x 3 (or 3 for a single agent) and agent_rotations holds the N
+    yaws in degrees (or is a single yaw, whose inverse then comes from the same cache). Returns an N x 3 float64
+    array.
+    """
+    offsets = np.asarray(world_positions, dtype=np.float64).reshape(-1, 3) - np.asarray(agent_positions, dtype=np.float64).reshape(-1, 3)
+    if np.ndim(agent_rotations) == 0:
+        return offsets @ find_closest_inverse(agent_rotations).T
+    degrees = np.asarray(agent_rotations, dtype=np.float64)
+    closest = np.round(degrees / 45) * 45
+    snapped = (closest >= 0) & (closest <= 360) & (np.abs(degrees - closest) < 5)
+    theta = np.radians(np.where(snapped, closest % 360, degrees))
+    cos_theta, sin_theta = np.cos(theta), np.sin(theta)
+    result = np.empty_like(offsets)
+    result[:, 0] = cos_theta * offsets[:, 0] - sin_theta * offsets[:, 2]
+    result[:, 1] = offsets[:, 1]
+    result[:, 2] = sin_theta * offsets[:, 0] + cos_theta * offsets[:, 2]
     return result
 
 
@@ -2,7 +2,7 @@
 import datetime
 import os
 import random
-from typing import Any
+from typing import Any, Dict, Optional
 
 import cv2
 import gym
@@ -26,13 +26,17 @@ from scripts.thor_category_names import thor_possible_objects
 # from legacy.from_phone_to_sim.more_optimized import get_point_cloud
 # from legacy.from_phone_to_sim.thor_frames_to_pointcloud import frames_to_world_points, world_points_to_pointcloud
 from utils.manipulathor_data_loader_utils import get_random_query_image_from_img_adr, get_random_query_feature_from_img_adr
+from utils.mask_noise_utils import MaskNoise
+from utils.nan_inf_utils import scrub_nan_inf
+from utils.object_mask_utils import ObjectMaskAtResolution, MaskRegion
+from utils.sensor_observation_cache import memoize_observation_per_step
 
 class RGBSensorThorNoNan(RGBSensorThor):
     def frame_from_env(
         self, env: IThorEnvironment, task: Task[IThorEnvironment]
     ) -> np.ndarray:  # type:ignore
         frame = env.current_frame.copy()
-        frame = remove_nan(frame)
+        frame = scrub_nan_inf(frame)
         return frame
 
 class DepthSensorThorNoNan(DepthSensorThor):
@@ -40,16 +44,9 @@ class DepthSensorThorNoNan(DepthSensorThor):
         self, env: IThorEnvironment, task: Task[IThorEnvironment]
     ) -> np.ndarray:  # type:ignore
         frame = (env.controller.last_event.depth_frame.copy())
-        frame = remove_nan(frame)
+        frame = scrub_nan_inf(frame)
         return frame
 
-def remove_nan(frame): #TODO inefficient and hacky
-    should_be_removed = np.isinf(frame) + np.isnan(frame)
-    frame[should_be_removed] = 0
-    should_be_removed = np.isinf(frame) + np.isnan(frame)
-    assert should_be_removed.sum() == 0
-    return frame
-
 class RelativeArmDistanceToGoal(Sensor):
     def __init__(self, uuid: str = "relative_arm_dist", **kwargs: Any):
         observation_space = gym.spaces.Box(
@@ -165,7 +162,7 @@ class CategoryFeatureSampleSensor(Sensor):
 
 
 class NoisyObjectMask(Sensor):
-    def __init__(self, type: str,noise, height, width,  uuid: str = "object_mask", distance_thr: float = -1, recall_percent = 1, **kwargs: Any):
+    def __init__(self, type: str,noise, height, width,  uuid: str = "object_mask", distance_thr: float = -1, recall_percent = 1, mask_noise: Optional[Dict[str, Any]] = None, **kwargs: Any):
         observation_space = gym.spaces.Box(
             low=0, high=1, shape=(1,), dtype=np.float32
         )  # (low=-1.0, high=2.0, shape=(3, 4), dtype=np.float32)
@@ -178,7 +175,13 @@ class NoisyObjectMask(Sensor):
         self.distance_thr = distance_thr
         super().__init__(**prepare_locals_for_super(locals()))
         assert self.recall_percent == 1 or self.noise == 0
+        self.mask_at_resolution = ObjectMaskAtResolution(self.width, self.height)
+        # keyword arguments of utils.mask_noise_utils.MaskNoise, e.g. dict(dropout_percent=0.1, seed=0)
+        self.mask_noise = None if mask_noise is None else MaskNoise(**mask_noise)
+        # float64 as the masks always were; two buffers used in turns so the previous step's mask stays valid
+        self._outputs = [np.zeros((self.width, self.height, 1)) for _ in range(2)]
 
+    @memoize_observation_per_step
     def get_observation(
             self, env: ManipulaTHOREnvironment, task: Task, *args: Any, **kwargs: Any
     ) -> Any:
@@ -191,37 +194,40 @@ class NoisyObjectMask(Sensor):
             raise Exception('Not implemented', self.type)
 
         target_object_id = task.task_info[info_to_search]
-        all_visible_masks = env.controller.last_event.instance_masks
-        if target_object_id in all_visible_masks:
-            mask_frame = all_visible_masks[target_object_id]
-
-            if self.distance_thr > 0:
-
-                agent_location = env.get_agent_location()
-                object_location = env.get_object_by_id(target_object_id)['position']
-                current_agent_distance_to_obj = sum([(object_location[k] - agent_location[k])**2 for k in ['x', 'z']]) ** 0.5
-                if current_agent_distance_to_obj > self.distance_thr or mask_frame.sum() < 20: # objects that are smaller than this many pixels should be removed. High chance all spatulas will be removed
-                    mask_frame[:] = 0
-
-        else:
-            mask_frame =np.zeros(env.controller.last_event.frame[:,:,0].shape)
-
-        result = (np.expand_dims(mask_frame.astype(np.float),axis=-1))
-        if len(env.controller.last_event.instance_masks) == 0:
-            fake_mask = np.zeros(env.controller.last_event.frame[:,:,0].shape)
-        else:
-            fake_mask = random.choice([v for v in env.controller.last_event.instance_masks.values()])
-        fake_mask = (np.expand_dims(fake_mask.astype(np.float),axis=-1))
-        fake_mask, is_real_mask = add_mask_noise(result, fake_mask, noise=self.noise)
-        current_shape = fake_mask.shape
-        if (current_shape[0], current_shape[1]) == (self.width, self.height):
-            resized_mask = fake_mask
-        else:
-            resized_mask = cv2.resize(fake_mask, (self.height, self.width)).reshape(self.width, self.height, 1) # my gut says this is gonna be slow
+        event = env.controller.last_event
+        segmentation_frame = event.instance_segmentation_frame
+        mask = self.mask_at_resolution.mask(segmentation_frame, event.object_id_to_color.get(target_object_id))
+
+        if self.distance_thr > 0 and mask.any():
+            agent_location = env.get_agent_location()
+            object_location = env.get_object_by_id(target_object_id)['position']
+            current_agent_distance_to_obj = sum([(object_location[k] - agent_location[k])**2 for k in ['x', 'z']]) ** 0.5
+            number_of_pixels = np.count_nonzero(mask) * self.mask_at_resolution.source_pixels_per_pixel(segmentation_frame)
+            if current_agent_distance_to_obj > self.distance_thr or number_of_pixels < 20: # objects that are smaller than this many pixels should be removed. High chance all spatulas will be removed
+                mask[:] = False
+
+        self._outputs.reverse()
+        result = self._outputs[0]
+        np.copyto(result[:, :, 0], mask)
+        if self.mask_noise is not None:
+            result[:] = self.mask_noise(result[None])[0]
+        if self.noise > 0:
+            result = self.add_noise(event, result)
         if self.recall_percent < 1:
             if random.random() > self.recall_percent:
-                resized_mask[:] = 0
-        return resized_mask
+                result[:] = 0
+        return result
+
+    def add_noise(self, event, result):
+        if len(event.instance_masks) == 0:
+            fake_mask = np.zeros(event.frame[:,:,0].shape)
+        else:
+            fake_mask = random.choice([v for v in event.instance_masks.values()])
+        fake_mask = fake_mask.astype(np.float64)
+        if fake_mask.shape != (self.width, self.height):
+            fake_mask = cv2.resize(fake_mask, (self.height, self.width))
+        noisy_mask, is_real_mask = add_mask_noise(result, fake_mask.reshape(self.width, self.height, 1), noise=self.noise)
+        return noisy_mask
 
 class NoMaskSensor(NoisyObjectMask):
     def get_observation(
@@ -233,33 +239,20 @@ class NoMaskSensor(NoisyObjectMask):
         return result
 
 class NoisyObjectRegion(NoisyObjectMask):
-    def __init__(self, type: str,noise, region_size,height, width,  uuid: str = "object_mask", distance_thr: float = -1, **kwargs: Any):
+    def __init__(self, type: str,noise, region_size,height, width,  uuid: str = "object_mask", distance_thr: float = -1, region_dtype=np.float64, **kwargs: Any):
         super().__init__(**prepare_locals_for_super(locals()))
         self.region_size = region_size
         assert self.region_size == 14, 'the following need to be changed'
-        # self.avgpool = torch.nn.AvgPool2d(16, stride=16)
+        number_of_repeat = 16
+        # region_dtype np.bool_ or np.uint8 gives 8x smaller observations than the float64 default
+        self.mask_region = MaskRegion(self.region_size, number_of_repeat, threshold=0.1, dtype=region_dtype)
 
     def get_observation(
             self, env: ManipulaTHOREnvironment, task: Task, *args: Any, **kwargs: Any
     ) -> Any:
 
         mask = super(type(self), self).get_observation(env, task, *args, **kwargs)
-
-
-        region = cv2.resize(mask, (self.region_size, self.region_size))
-        region = (region > 0.1).astype(float).reshape(self.region_size, self.region_size, 1)
-        assert self.region_size == 14, 'the folliowing number wont work'
-        number_of_repeat = 16
-        region = region.repeat(number_of_repeat, axis=0).repeat(number_of_repeat, axis=1)
-
-        #
-        # with torch.no_grad():  this takes  forever
-        #     region = torch.tensor(mask).permute(2, 0, 1)
-        #     region = self.avgpool(region)
-        #     region = (region > 0.1).float()
-        #     region = torch.nn.functional.interpolate(region.unsqueeze(0), (self.width, self.height)).squeeze(0).permute(1,2,0)
-
-        return region
+        return self.mask_region.region(mask)
 
 
 def add_mask_noise(real_mask, fake_mask, noise):
@@ -270,9 +263,6 @@ def add_mask_noise(real_mask, fake_mask, noise):
     result = real_mask.copy()
 
     random_prob = random.random()
-    if noise > 0:
-        print('remove todo')
-        ForkedPdb().set_trace()
     if random_prob < REMOVE_RATE:
         result[:] = 0.
         is_real_mask = False
@@ -24,6 +24,7 @@ from ithor_arm.ithor_arm_tasks import (
 from ithor_arm.ithor_arm_viz import LoggerVisualizer, BringObjImageVisualizer
 from manipulathor_utils.debugger_util import ForkedPdb
 from utils.manipulathor_data_loader_utils import get_random_query_image, get_random_query_feature, get_random_query_feature_from_img_adr, get_random_query_image_file_name
+from utils.noise_pool_utils import episode_index
 
 
 class BringObjectAbstractTaskSampler(TaskSampler):
@@ -249,6 +250,7 @@ class DiverseBringObjectTaskSampler(BringObjectAbstractTaskSampler):
         assert init_object['object_id'] != goal_object['object_id']
 
         self.reset_scene(scene_name)
+        self.env.start_noise_episode(episode_index(data_point))
 
 
 
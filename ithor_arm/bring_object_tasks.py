@@ -31,7 +31,6 @@ from ithor_arm.ithor_arm_viz import LoggerVisualizer
 from manipulathor_utils.debugger_util import ForkedPdb
 from scripts.dataset_generation.find_categories_to_use import get_room_type_from_id
 from scripts.hacky_objects_that_move import CONSTANTLY_MOVING_OBJECTS
-from scripts.jupyter_helper import get_reachable_positions
 
 
 def position_distance(s1, s2):
@@ -185,6 +184,7 @@ class AbstractBringObjectTask(Task[ManipulaTHOREnvironment]):
         result = super(AbstractBringObjectTask, self).metrics()
         if self.is_done():
             result = {**result, **self.calc_action_stat_metrics()}
+            result = {**result, **self.env.controller_metrics()}
             final_obj_distance_from_goal = self.obj_distance_from_goal()
             result[
                 "metric/average/final_obj_distance_from_goal"
@@ -547,7 +547,7 @@ class NoPickUPExploreBringObjectTask(BringObjectTask):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        all_locations = [[k['x'], k['y'], k['z']] for k in get_reachable_positions(self.env.controller)]
+        all_locations = [[k['x'], k['y'], k['z']] for k in self.env.get_reachable_positions(use_cache=False)]
         self.all_reachable_positions = torch.Tensor(all_locations)
         self.has_visited = torch.zeros((len(self.all_reachable_positions), 1))
     def judge(self) -> float:
@@ -610,7 +610,7 @@ class WPickUPExploreBringObjectTask(WPickUpBringObjectTask):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        all_locations = [[k['x'], k['y'], k['z']] for k in get_reachable_positions(self.env.controller)]
+        all_locations = [[k['x'], k['y'], k['z']] for k in self.env.get_reachable_positions(use_cache=False)]
         self.all_reachable_positions = torch.Tensor(all_locations)
         self.has_visited = torch.zeros((len(self.all_reachable_positions), 1))
     def judge(self) -> float:
@@ -672,7 +672,7 @@ class WPickUPExploreBringObjectTask(WPickUpBringObjectTask):
 class ExploreWiseRewardTask(BringObjectTask):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        all_locations = [[k['x'], k['y'], k['z']] for k in (self.env.get_reachable_positions())]
+        all_locations = [[k['x'], k['y'], k['z']] for k in (self.env.get_reachable_positions(use_cache=False))]
         self.all_reachable_positions = torch.Tensor(all_locations)
         self.has_visited = torch.zeros((len(self.all_reachable_positions), 1))
         self.source_observed_reward = False
@@ -1,4 +1,6 @@
 """Constant values and hyperparameters that are used by the environment."""
+from types import MappingProxyType
+
 import ai2thor
 import ai2thor.fifo_server
 from allenact_plugins.ithor_plugin.ithor_environment import IThorEnvironment
@@ -32,6 +34,14 @@ ADITIONAL_ARM_ARGS = {
     "speed": 1,
 }
 
+# Read-only controller payloads keyed by the controller action name. The environment fills in only the
+# fields that change per step ({**ARM_ACTION_TEMPLATES[name], "ahead": ...}) instead of deep-copying
+# ADITIONAL_ARM_ARGS and rebuilding the dict on every step.
+ARM_ACTION_TEMPLATES = MappingProxyType({
+    name: MappingProxyType(dict(action=name, **ADITIONAL_ARM_ARGS))
+    for name in ["MoveAgent", "RotateAgent", "MoveArm", "MoveArmBase"]
+})
+
 MOVE_AHEAD = "MoveAhead"
 MOVE_BACK = "MoveBack"
 ROTATE_LEFT = "RotateLeft"
@@ -113,7 +123,7 @@ def transport_wrapper(controller, target_object, target_location):
     if issubclass(type(controller), IThorEnvironment):
         event = controller.step(transport_detail)
         controller.step(advance_detail)
-    elif type(controller) == ai2thor.controller.Controller:
+    else:  # a Controller, possibly wrapped in a SupervisedController
         event = controller.step(**transport_detail)
         controller.step(**advance_detail)
     return event
@@ -3,6 +3,8 @@
 from ast import For
 import copy
 import math
+from collections import deque
+import time
 import typing
 import warnings
 from typing import Tuple, Dict, List, Set, Union, Any, Optional
@@ -15,10 +17,13 @@ from allenact_plugins.ithor_plugin.ithor_constants import VISIBILITY_DISTANCE, F
 from allenact_plugins.ithor_plugin.ithor_environment import IThorEnvironment
 
 from ithor_arm.ithor_arm_noise_models import NoiseInMotionHabitatFlavor, NoiseInMotionSimple1DNormal
+from utils.noise_pool_utils import NoisePool
 from ithor_arm.arm_calculation_utils import convert_world_to_agent_coordinate
+from ithor_arm.supervised_controller import SupervisedController
 
 from ithor_arm.ithor_arm_constants import (
     ADITIONAL_ARM_ARGS,
+    ARM_ACTION_TEMPLATES,
     ARM_MIN_HEIGHT,
     ARM_MAX_HEIGHT,
     MOVE_ARM_HEIGHT_CONSTANT,
@@ -29,7 +34,73 @@ from ithor_arm.ithor_arm_constants import (
 )
 from manipulathor_utils.debugger_util import ForkedPdb
 from scripts.hacky_objects_that_move import OBJECTS_MOVE_THR
-from scripts.jupyter_helper import get_reachable_positions
+from utils.nan_inf_utils import scrub_nan_inf_values
+from utils.reachable_positions_cache import REACHABLE_POSITIONS_CACHE
+
+
+class ReadOnlyDict(dict):
+    """A dict that refuses in-place modification. Copying or pickling it gives back a plain dict."""
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("{} is read-only, copy it before modifying it".format(type(self).__name__))
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(dict(self), memo)
+
+
+class ObjectLocations:
+    """Positions and rotations of all objects in one event, as (N, 3) arrays whose rows follow `object_ids`."""
+
+    def __init__(self, objects: List[Dict[str, Any]]):
+        self.object_ids = [o["objectId"] for o in objects]
+        poses = np.array(
+            [
+                [
+                    o["position"]["x"], o["position"]["y"], o["position"]["z"],
+                    o["rotation"]["x"], o["rotation"]["y"], o["rotation"]["z"],
+                ]
+                for o in objects
+            ],
+            dtype=np.float64,
+        ).reshape(-1, 6)
+        self.positions = poses[:, :3]
+        self.rotations = poses[:, 3:]
+        self._row_of: Optional[Dict[str, int]] = None
+
+    def positions_for(self, object_ids: List[str]) -> np.ndarray:
+        """Positions in the row order of `object_ids`, NaN for objects missing from this snapshot."""
+        if object_ids == self.object_ids:
+            return self.positions
+        if self._row_of is None:
+            self._row_of = {object_id: i for (i, object_id) in enumerate(self.object_ids)}
+        positions = np.full((len(object_ids), 3), np.nan)
+        for i, object_id in enumerate(object_ids):
+            row = self._row_of.get(object_id)
+            if row is not None:
+                positions[i] = self.positions[row]
+        return positions
+
+
+AGENT_POSE_DTYPE = np.dtype([(k, np.float64) for k in ("x", "y", "z", "rotation", "horizon")])
+
+
+def agent_pose(location: Dict[str, Any]) -> np.void:
+    """Packs the x, y, z, rotation and horizon of an agent location dict into a fixed-size numpy record.
+    Fields read and write like dict entries (`pose["x"]`) and are updated in place."""
+    return np.array(tuple(location[k] for k in AGENT_POSE_DTYPE.names), dtype=AGENT_POSE_DTYPE)[()]
+
+
+def agent_pose_to_dict(pose: np.void) -> Dict[str, float]:
+    return {k: float(pose[k]) for k in AGENT_POSE_DTYPE.names}
 
 
 class ManipulaTHOREnvironment(IThorEnvironment):
@@ -44,6 +115,9 @@ class ManipulaTHOREnvironment(IThorEnvironment):
     controller : The ai2thor controller.
     """
 
+    action_templates = ARM_ACTION_TEMPLATES
+    additional_arm_args = ADITIONAL_ARM_ARGS
+
     def __init__(
             self,
             x_display: Optional[str] = None,
@@ -131,10 +205,37 @@ class ManipulaTHOREnvironment(IThorEnvironment):
                 ForkedPdb().set_trace()
         else:
             self.noise_model = NoiseInMotionHabitatFlavor(effect_scale=0.0) # un-noise model
+        # Draw the motion noise from pre-generated blocks, replayable by (seed, episode, step), see
+        # utils.noise_pool_utils. The task samplers number the episodes (start_noise_episode), so with the same
+        # env_args['noise_pool_seed'] in every worker an episode gets the same noise whichever worker runs it.
+        self.noise_pool = NoisePool(env_args['noise_pool_seed']) if 'noise_pool_seed' in env_args else None
+        if self.noise_pool is not None:
+            self.noise_model.use_noise_pool(self.noise_pool)
+        # steps of the noise pool are counted from this action on
+        self.noise_episode_first_action = 0
 
         self.ahead_nominal = 0.2
         self.rotate_nominal = 45
 
+        # Build controller payloads from ARM_ACTION_TEMPLATES instead of deep-copying the action and
+        # ADITIONAL_ARM_ARGS on every step. Set env_args['copy_free_step'] = False for the old path.
+        self.copy_free_step = env_args.get('copy_free_step', True)
+        # wall-clock seconds of the most recent env steps, controller calls included
+        self.step_latencies = deque(maxlen=1000)
+        # filled by sensors decorated with utils.sensor_observation_cache.memoize_observation_per_step
+        self.observation_cache = None
+        # point clouds shared by the pointnav emulator sensors, see utils.object_centroid_utils
+        self.object_centroid_estimator = None
+        self.reachable_positions_scene_key: Optional[str] = None
+        self._object_index_event: Optional[ai2thor.server.Event] = None
+        self._object_index: Dict[str, Dict[str, Any]] = {}
+        self._object_views: Dict[str, ReadOnlyDict] = {}
+        self._object_locations_event: Optional[ai2thor.server.Event] = None
+        self._object_locations: Optional[ObjectLocations] = None
+
+        # Number of past steps kept by update_memory, 0 disables the episode memory.
+        self.MEMORY_SIZE = env_args.get('memory_size', 0)
+        self.memory_frames = deque(maxlen=self.MEMORY_SIZE)
 
         self.start(None)
         # self.check_controller_version()
@@ -142,11 +243,8 @@ class ManipulaTHOREnvironment(IThorEnvironment):
         # noinspection PyTypeHints
         self.controller.docker_enabled = docker_enabled  # type: ignore
 
-        self.MEMORY_SIZE = 5
-
         if "quality" not in self.env_args:
             self.env_args["quality"] = self._quality
-        # self.memory_frames = []
 
     def check_controller_version(self):
         if MANIPULATHOR_COMMIT_ID is not None:
@@ -167,13 +265,42 @@ class ManipulaTHOREnvironment(IThorEnvironment):
     #             MANIPULATHOR_COMMIT_ID,
     #             MANIPULATHOR_COMMIT_ID,
     #         )
-    def get_reachable_positions(self):
-        return get_reachable_positions(self.controller)
+    def get_reachable_positions(self, use_cache: bool = True):
+        """Reachable positions of the current scene, shared through REACHABLE_POSITIONS_CACHE (and the
+        env_args['reachable_positions_cache_dir'] directory if set) by every environment with the same agent
+        configuration. The cached grid does not follow objects moved after the first reset of the scene, pass
+        use_cache=False to query the current one."""
+        return REACHABLE_POSITIONS_CACHE.get_or_query(
+            self.controller,
+            self.reachable_positions_scene_key if use_cache else None,
+            self.env_args,
+            self.env_args.get('reachable_positions_cache_dir'),
+        )
     def create_controller(self):
         assert 'commit_id' in self.env_args, 'No commit id is specified'
         controller = Controller(**self.env_args)
         return controller
 
+    def controller_metrics(self) -> Dict[str, float]:
+        """Restart count and latency of the supervised controller, the mean latency of recent steps and, when
+        sensors memoize their observations (utils.sensor_observation_cache) or share point clouds
+        (utils.object_centroid_utils), how many recomputations that saved, and the blocks drawn by the motion
+        noise pool (utils.noise_pool_utils). Set
+        env_args['controller_standby'] = True to keep a pre-spawned controller to swap in when the active one
+        crashes."""
+        metrics = {}
+        if isinstance(self.controller, SupervisedController):
+            metrics.update(self.controller.metrics())
+        if len(self.step_latencies) > 0:
+            metrics["controller/mean_step_latency"] = float(np.mean(self.step_latencies))
+        if self.observation_cache is not None:
+            metrics.update(self.observation_cache.metrics())
+        if self.object_centroid_estimator is not None:
+            metrics.update(self.object_centroid_estimator.metrics())
+        if self.noise_pool is not None:
+            metrics.update(self.noise_pool.metrics())
+        return metrics
+
     def start(
             self,
             scene_name: Optional[str],
@@ -195,13 +322,15 @@ class ManipulaTHOREnvironment(IThorEnvironment):
                 "Trying to start the environment but it is already started."
             )
 
-        self.controller = self.create_controller()
+        self.controller = SupervisedController(
+            self.create_controller, keep_standby=self.env_args.get('controller_standby', False)
+        )
 
         if (
                 self._start_player_screen_height,
                 self._start_player_screen_width,
         ) != self.current_frame.shape[:2]:
-            self.controller.step(
+            self.controller.setup_step(
                 {
                     "action": "ChangeResolution",
                     "x": self._start_player_screen_width,
@@ -221,7 +350,7 @@ class ManipulaTHOREnvironment(IThorEnvironment):
     ):
         self._move_mag = move_mag
         self._grid_size = self._move_mag
-        # self.memory_frames = []
+        self.memory_frames.clear()
 
         if scene_name is None:
             scene_name = self.controller.last_event.metadata["sceneName"]
@@ -233,33 +362,43 @@ class ManipulaTHOREnvironment(IThorEnvironment):
             self.reset_environment_and_additional_commands(scene_name)
         except Exception as e:
             print("RESETTING THE SCENE,", scene_name, 'because of', str(e))
-            self.controller = ai2thor.controller.Controller(
-                **self.env_args
-            )
+            self.controller.restart()
             self.reset_environment_and_additional_commands(scene_name)
 
         if self.object_open_speed != 1.0:
-            self.controller.step(
+            self.controller.setup_step(
                 {"action": "ChangeOpenSpeed", "x": self.object_open_speed}
             )
 
         self._initially_reachable_points = None
         self._initially_reachable_points_set = None
-        self.controller.step({"action": "GetReachablePositions"})
-        if not self.controller.last_event.metadata["lastActionSuccess"]:
-            warnings.warn(
-                "Error when getting reachable points: {}".format(
-                    self.controller.last_event.metadata["errorMessage"]
-                )
-            )
-        self._initially_reachable_points = self.last_action_return
+        # procedural houses all share a scene name, the task sampler names them once the house is created
+        self.reachable_positions_scene_key = None if scene_name == 'Procedural' else scene_name
+        # the agent is snapped back onto this grid, so it has to match the objects of this episode
+        self._initially_reachable_points = self.get_reachable_positions(
+            use_cache=not self.restrict_to_initially_reachable_points
+        )
 
         self.list_of_actions_so_far = []
 
+        if self.noise_pool is not None:
+            self.noise_pool.start_episode()
+        self.noise_episode_first_action = 0
         self.noise_model.reset_noise_model()
         self.nominal_agent_location = self.get_agent_location()
 
 
+    def start_noise_episode(self, episode: int):
+        """Draws the motion noise of the following steps as episode `episode` of the noise pool, with its steps
+        counted from here. Task samplers call this with the `utils.noise_pool_utils.episode_index` of their data
+        point, so that the noise depends neither on the environment's earlier episodes nor on the number of
+        workers. Does nothing without a noise pool."""
+        if self.noise_pool is None:
+            return
+        self.noise_pool.start_episode(episode)
+        self.noise_episode_first_action = len(self.list_of_actions_so_far)
+        self.noise_model.reset_noise_model()
+
     def randomize_agent_location(
             self, seed: int = None, partial_position: Optional[Dict[str, float]] = None
     ) -> Dict:
@@ -282,20 +421,28 @@ class ManipulaTHOREnvironment(IThorEnvironment):
             raise AttributeError("Must be <= 1 inventory objects.")
 
     def correct_nan_inf(self, flawed_dict, extra_tag=""):
-        corrected_dict = copy.deepcopy(flawed_dict)
-        anything_changed = 0
-        for (k, v) in corrected_dict.items():
-            if v != v or math.isinf(v):
-                corrected_dict[k] = 0
-                anything_changed += 1
-        return corrected_dict
+        return scrub_nan_inf_values(flawed_dict)
 
     def get_object_by_id(self, object_id: str) -> Optional[Dict[str, Any]]:
-        for o in self.last_event.metadata["objects"]:
-            if o["objectId"] == object_id:
-                o["position"] = self.correct_nan_inf(o["position"], "obj id")
-                return o
-        return None
+        """Read-only view of the object's metadata with a NaN/inf free position. Lookups go through an index that
+        is built once per event and dropped when the next event arrives."""
+        event = self.last_event
+        if self._object_index_event is not event:
+            self._object_index_event = event
+            self._object_index = {o["objectId"]: o for o in event.metadata["objects"]}
+            self._object_views = {}
+        view = self._object_views.get(object_id)
+        if view is None:
+            o = self._object_index.get(object_id)
+            if o is None:
+                return None
+            view = ReadOnlyDict(
+                o,
+                position=ReadOnlyDict(self.correct_nan_inf(o["position"], "obj id")),
+                rotation=ReadOnlyDict(o["rotation"]),
+            )
+            self._object_views[object_id] = view
+        return view
 
     def get_current_arm_state(self):
         h_min = ARM_MIN_HEIGHT
@@ -330,6 +477,26 @@ class ManipulaTHOREnvironment(IThorEnvironment):
         return dict(position=xyz_dict, rotation={"x": 0, "y": 0, "z": 0})
 
     
+    @property
+    def nominal_agent_location(self) -> Dict[str, Any]:
+        """The agent location (as get_agent_location returns it) advanced by the nominal motion of every
+        successful action. A new dict after every update, so references to an earlier one do not move."""
+        if self._nominal_location is None:
+            self._nominal_location = {**agent_pose_to_dict(self._nominal_pose), **self._nominal_location_extras}
+        return self._nominal_location
+
+    @property
+    def nominal_agent_pose(self) -> np.void:
+        """The agent_pose record behind nominal_agent_location, for readers that only need its fields. It is
+        updated in place by every successful action, copy it to keep a pose."""
+        return self._nominal_pose
+
+    @nominal_agent_location.setter
+    def nominal_agent_location(self, location: Dict[str, Any]):
+        self._nominal_pose = agent_pose(location)
+        self._nominal_location_extras = {k: v for k, v in location.items() if k not in AGENT_POSE_DTYPE.names}
+        self._nominal_location = None
+
     def update_nominal_location(self, action_dict):
         # location = {
         #     "x": metadata["agent"]["position"]["x"],
@@ -340,24 +507,25 @@ class ManipulaTHOREnvironment(IThorEnvironment):
         #     "standing": metadata.get("isStanding", metadata["agent"].get("isStanding")),
         # }
 
-        curr_loc = self.nominal_agent_location
-        new_loc = copy.deepcopy(curr_loc)
-
-        if action_dict['action'] is 'RotateLeft':
-            new_loc["rotation"] = (new_loc["rotation"] - self.rotate_nominal) % 360
-        elif action_dict['action'] is 'RotateRight':
-            new_loc["rotation"] = (new_loc["rotation"] + self.rotate_nominal) % 360
-        elif action_dict['action'] is 'MoveAhead':
-            new_loc["x"] += self.ahead_nominal * np.sin(new_loc["rotation"] * np.pi / 180)
-            new_loc["z"] += self.ahead_nominal * np.cos(new_loc["rotation"] * np.pi / 180)
-        elif action_dict['action'] is 'TeleportFull':
-            new_loc["x"] = action_dict['x']
-            new_loc["y"] = action_dict['y']
-            new_loc["z"] = action_dict['z']
-            new_loc["rotation"] = action_dict['rotation']['y']
-            new_loc["horizon"] = action_dict['horizon']
-        
-        self.nominal_agent_location = new_loc
+        # the pose record is updated in place, nominal_agent_location is rebuilt from it when next read
+        pose = self._nominal_pose
+        self._nominal_location = None
+        action = action_dict['action']
+
+        if action == 'RotateLeft':
+            pose["rotation"] = (pose["rotation"] - self.rotate_nominal) % 360
+        elif action == 'RotateRight':
+            pose["rotation"] = (pose["rotation"] + self.rotate_nominal) % 360
+        elif action == 'MoveAhead':
+            yaw = math.radians(pose["rotation"])
+            pose["x"] += self.ahead_nominal * math.sin(yaw)
+            pose["z"] += self.ahead_nominal * math.cos(yaw)
+        elif action == 'TeleportFull':
+            pose["x"] = action_dict['x']
+            pose["y"] = action_dict['y']
+            pose["z"] = action_dict['z']
+            pose["rotation"] = action_dict['rotation']['y']
+            pose["horizon"] = action_dict['horizon']
 
     def get_pickupable_objects(self):
 
@@ -366,62 +534,71 @@ class ManipulaTHOREnvironment(IThorEnvironment):
 
         return object_list
 
-    def get_current_object_locations(self):
-        obj_loc_dict = {}
-        metadata = self.controller.last_event.metadata["objects"]
-        for o in metadata:
-            obj_loc_dict[o["objectId"]] = dict(
-                position=o["position"], rotation=o["rotation"]
-            )
-        return copy.deepcopy(obj_loc_dict)
-
-    def close_enough(self, current_obj_pose, init_obj_pose, threshold):
-        position_close = [
-            abs(current_obj_pose["position"][k] - init_obj_pose["position"][k])
-            <= threshold
-            for k in ["x", "y", "z"]
-        ]
-        position_is_close = sum(position_close) == 3
-        # rotation_close = [
-        #     abs(current_obj_pose["rotation"][k] - init_obj_pose["rotation"][k])
-        #     <= threshold
-        #     for k in ["x", "y", "z"]
-        # ]
-        # rotation_is_close = sum(rotation_close) == 3
-        return position_is_close # and rotation_is_close
-
-    def get_objects_moved(self, initial_object_locations):
+    def get_current_object_locations(self) -> "ObjectLocations":
+        """Snapshot of every object's pose in the current event, memoized until the next event."""
+        event = self.last_event
+        if self._object_locations_event is not event:
+            self._object_locations_event = event
+            self._object_locations = ObjectLocations(event.metadata["objects"])
+        return self._object_locations
+
+    def get_objects_moved(self, initial_object_locations, threshold=OBJECTS_MOVE_THR):
+        """Ids of the objects whose position moved more than `threshold` along any axis since the
+        `initial_object_locations` snapshot. Rotations are tracked but, as before, not compared."""
         current_object_locations = self.get_current_object_locations()
-        moved_objects = []
-        for object_id in current_object_locations.keys():
-            if not self.close_enough(
-                    current_object_locations[object_id],
-                    initial_object_locations[object_id],
-                    threshold=OBJECTS_MOVE_THR,
-            ):
-                moved_objects.append(object_id)
-
-        return moved_objects
+        initial_positions = initial_object_locations.positions_for(current_object_locations.object_ids)
+        # written so that NaN positions count as moved
+        still = (np.abs(current_object_locations.positions - initial_positions) <= threshold).all(axis=1)
+        return [current_object_locations.object_ids[i] for i in np.flatnonzero(~still)]
+
     def update_memory(self):
-        rgb = self.controller.last_event.frame.copy()
-        depth = self.controller.last_event.depth_frame.copy()
-        event = copy.deepcopy(self.controller.last_event.metadata)
-        # depth = depth[...,np.newaxis]
-        current_frame = {
-            'rgb': rgb,
-            'depth': depth,
-            'event':event,
-        }
-        # if len(self.memory_frames) == 0:
-        #     self.memory_frames = [current_frame for _ in range(self.MEMORY_SIZE)]
-        # else:
-        #     self.memory_frames = self.memory_frames[1:] + [current_frame]
+        """Keeps references to the frames and metadata of the last MEMORY_SIZE steps. Nothing is copied here, so
+        the entries must be treated as read-only; use get_memory_frames for copies."""
+        if self.MEMORY_SIZE == 0:
+            return
+        event = self.controller.last_event
+        self.memory_frames.append({
+            'rgb': event.frame,
+            'depth': event.depth_frame,
+            'event': event.metadata,
+        })
+
+    def get_memory_frames(self):
+        """Copies of the remembered frames, oldest first."""
+        return [
+            {
+                'rgb': frame['rgb'].copy(),
+                'depth': frame['depth'].copy(),
+                'event': copy.deepcopy(frame['event']),
+            }
+            for frame in self.memory_frames
+        ]
+
+    def arm_action_payload(self, action_dict, controller_action, **changing_fields):
+        """Controller payload for `controller_action` with the additional arm args, built from the
+        precompiled template unless `copy_free_step` is disabled."""
+        if self.copy_free_step:
+            return {**action_dict, **self.action_templates[controller_action], **changing_fields}
+        copy_aditions = copy.deepcopy(self.additional_arm_args)
+        action_dict = {**action_dict, **copy_aditions}
+        action_dict["action"] = controller_action
+        action_dict.update(changing_fields)
+        return action_dict
+
+    @staticmethod
+    def is_null_motion(controller_action) -> bool:
+        if controller_action["action"] == "RotateAgent":
+            return controller_action["degrees"] == 0
+        return controller_action.get("ahead", 0) == 0 and controller_action.get("right", 0) == 0
+
     def step(
             self, action_dict: Dict[str, Union[str, int, float]]
     ) -> ai2thor.server.Event:
         """Take a step in the ai2thor environment."""
+        step_start_time = time.perf_counter()
         action = typing.cast(str, action_dict["action"])
-        original_action_dict = copy.deepcopy(action_dict)
+        # nothing below mutates the fields update_nominal_location reads, so the copy-free path keeps a reference
+        original_action_dict = action_dict if self.copy_free_step else copy.deepcopy(action_dict)
 
         skip_render = "renderImage" in action_dict and not action_dict["renderImage"]
         last_frame: Optional[np.ndarray] = None
@@ -454,61 +631,40 @@ class ManipulaTHOREnvironment(IThorEnvironment):
             } # we have to change the last action success if the pik up fails, we do that in the task now
 
         elif action in [MOVE_AHEAD, ROTATE_RIGHT, ROTATE_LEFT]:
-
-            copy_aditions = copy.deepcopy(ADITIONAL_ARM_ARGS)
+            if self.noise_pool is not None:
+                self.noise_pool.start_step(len(self.list_of_actions_so_far) - self.noise_episode_first_action)
 
             # RH: order matters, nominal action happens last
-            action_dict = {**action_dict, **copy_aditions}
             if action in [MOVE_AHEAD]:
                 noise = self.noise_model.get_ahead_drift(self.ahead_nominal)
-
-                action_dict["action"] = "RotateAgent"
-                action_dict["degrees"] = noise[2]
-                sr = self.controller.step(action_dict)
-
-                action_dict = dict()
-                action_dict["action"] = "MoveAgent"
-                action_dict["ahead"] = self.ahead_nominal + noise[0]
-                action_dict["right"] = noise[1]
+                drift_dict = self.arm_action_payload(action_dict, "RotateAgent", degrees=noise[2])
+                action_dict = dict(action="MoveAgent", ahead=self.ahead_nominal + noise[0], right=noise[1])
 
             elif action in [ROTATE_RIGHT]:
                 noise = self.noise_model.get_rotate_drift()
-                action_dict["action"] = "MoveAgent"
-                action_dict["ahead"] = noise[0]
-                action_dict["right"] = noise[1]
-                sr = self.controller.step(action_dict)
-
-                action_dict = dict()
-                action_dict["action"] = "RotateAgent"
-                action_dict["degrees"] = noise[2] + self.rotate_nominal
+                drift_dict = self.arm_action_payload(action_dict, "MoveAgent", ahead=noise[0], right=noise[1])
+                action_dict = dict(action="RotateAgent", degrees=noise[2] + self.rotate_nominal)
 
             elif action in [ROTATE_LEFT]:
                 noise = self.noise_model.get_rotate_drift()
-                action_dict["action"] = "MoveAgent"
-                action_dict["ahead"] = noise[0]
-                action_dict["right"] = noise[1]
-                sr = self.controller.step(action_dict)
+                drift_dict = self.arm_action_payload(action_dict, "MoveAgent", ahead=noise[0], right=noise[1])
+                action_dict = dict(action="RotateAgent", degrees=noise[2] - self.rotate_nominal)
 
-                action_dict = dict()
-                action_dict["action"] = "RotateAgent"
-                action_dict["degrees"] = noise[2] - self.rotate_nominal
+            # a zero drift does not move the agent, it is not worth a controller call
+            if not self.is_null_motion(drift_dict):
+                sr = self.controller.step(drift_dict)
 
         elif "MoveArm" in action:
-            copy_aditions = copy.deepcopy(ADITIONAL_ARM_ARGS)
-            action_dict = {**action_dict, **copy_aditions}
             base_position = self.get_current_arm_state()
             if "MoveArmHeight" in action:
-                action_dict["action"] = "MoveArmBase"
-
                 if action == MOVE_ARM_HEIGHT_P:
                     base_position["h"] += MOVE_ARM_HEIGHT_CONSTANT
                 if action == MOVE_ARM_HEIGHT_M:
                     base_position[
                         "h"
                     ] -= MOVE_ARM_HEIGHT_CONSTANT  # height is pretty big!
-                action_dict["y"] = base_position["h"]
+                action_dict = self.arm_action_payload(action_dict, "MoveArmBase", y=base_position["h"])
             else:
-                action_dict["action"] = "MoveArm"
                 if action == MOVE_ARM_X_P:
                     base_position["x"] += MOVE_ARM_CONSTANT
                 elif action == MOVE_ARM_X_M:
@@ -521,9 +677,11 @@ class ManipulaTHOREnvironment(IThorEnvironment):
                     base_position["z"] += MOVE_ARM_CONSTANT
                 elif action == MOVE_ARM_Z_M:
                     base_position["z"] -= MOVE_ARM_CONSTANT
-                action_dict["position"] = {
-                    k: v for (k, v) in base_position.items() if k in ["x", "y", "z"]
-                }
+                action_dict = self.arm_action_payload(
+                    action_dict,
+                    "MoveArm",
+                    position={k: v for (k, v) in base_position.items() if k in ["x", "y", "z"]},
+                )
 
         sr = self.controller.step(action_dict)
         self.list_of_actions_so_far.append(action_dict)
@@ -546,5 +704,6 @@ class ManipulaTHOREnvironment(IThorEnvironment):
             assert last_frame is not None
             self.last_event.frame = last_frame
 
+        self.step_latencies.append(time.perf_counter() - step_start_time)
         return sr
 
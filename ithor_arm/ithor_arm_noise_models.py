@@ -16,29 +16,41 @@ class NoiseInMotionHabitatFlavor:
             multiplier_means: List[float] = [1,1,1,1,1,1],
             multiplier_sigmas: List[float] = [0,0,0,0,0,0,0],
             effect_scale: float = 1,
+            seed: Optional[int] = None,
         ) -> None:
 
         self.multiplier_means = multiplier_means
         self.multiplier_sigmas = multiplier_sigmas
         self.effect_scale = effect_scale
+        # with a seed, the multipliers and every submodel draw from their own generators spawned from it
+        self.seed_sequence = np.random.SeedSequence(seed) if seed is not None else None
+        self.multiplier_rng = np.random.default_rng(self.submodel_seed()) if seed is not None else np.random
+        self.noise_pool = None
         
         self.ahead = None
         self.rotate = None
 
         self.reset_noise_model()
     
+    def submodel_seed(self):
+        return self.seed_sequence.spawn(1)[0] if self.seed_sequence is not None else None
+
     def generate_linear_submodel(self,m1,m2,m3,s1,s2,s3):
         return MotionNoiseModel(
-            _TruncatedMultivariateGaussian([m1 * 0.074, m2 * 0.036], [s1 * 0.019, s2 * 0.033]),
-            _TruncatedMultivariateGaussian([m3 * 0.189], [s3 * 0.038]))
+            _TruncatedMultivariateGaussian([m1 * 0.074, m2 * 0.036], [s1 * 0.019, s2 * 0.033], seed=self.submodel_seed()),
+            _TruncatedMultivariateGaussian([m3 * 0.189], [s3 * 0.038], seed=self.submodel_seed()))
         
     def generate_rotational_submodel(self,m1,m2,m3,s1,s2,s3):
         return MotionNoiseModel(
-            _TruncatedMultivariateGaussian([m1 * 0.002, m2 * 0.003], [s1 * 0.0, s2 * 0.002]),
-            _TruncatedMultivariateGaussian([m3 * 0.219], [s3 * 0.019]))
+            _TruncatedMultivariateGaussian([m1 * 0.002, m2 * 0.003], [s1 * 0.0, s2 * 0.002], seed=self.submodel_seed()),
+            _TruncatedMultivariateGaussian([m3 * 0.219], [s3 * 0.019], seed=self.submodel_seed()))
     
     def generate_model_multipliers(self):
-        return [np.random.normal(self.multiplier_means[i],self.multiplier_sigmas[i]) 
+        if self.noise_pool is not None:
+            normals = self.noise_pool.normals(len(self.multiplier_means))
+            return [self.multiplier_means[i] + self.multiplier_sigmas[i] * normals[i]
+                    for i in range(len(self.multiplier_means))]
+        return [self.multiplier_rng.normal(self.multiplier_means[i],self.multiplier_sigmas[i]) 
                 for i in range(len(self.multiplier_means))]
     
     def reset_noise_model(self):
@@ -46,6 +58,14 @@ class NoiseInMotionHabitatFlavor:
         
         self.ahead = self.generate_linear_submodel(*model_multipliers)
         self.rotate = self.generate_rotational_submodel(*model_multipliers)
+        self.ahead.use_noise_pool(self.noise_pool)
+        self.rotate.use_noise_pool(self.noise_pool)
+
+    def use_noise_pool(self, noise_pool):
+        # the multipliers and the drifts are drawn from the pool (utils.noise_pool_utils) from the next reset on
+        self.noise_pool = noise_pool
+        self.ahead.use_noise_pool(noise_pool)
+        self.rotate.use_noise_pool(noise_pool)
     
     def get_ahead_drift(self,*_):
         # returns [ahead change, left/right change, rot change] from an ahead command in [m,m,deg]
@@ -88,6 +108,7 @@ class NoiseInMotionSimple1DNormal:
         self.lateral_noise_meta_dist_params = lateral_noise_meta_dist_params
         self.turning_noise_meta_dist_params = turning_noise_meta_dist_params
         self.effect_scale = effect_scale
+        self.noise_pool = None
         
         self.ahead_noise_params = [0,0]
         self.lateral_noise_params = [0,0]
@@ -95,9 +116,18 @@ class NoiseInMotionSimple1DNormal:
 
         self.reset_noise_model()
     
+    def use_noise_pool(self, noise_pool):
+        # the noise params and the drifts are drawn from the pool (utils.noise_pool_utils) from the next reset on
+        self.noise_pool = noise_pool
+
+    def normal(self, loc, scale):
+        if self.noise_pool is not None:
+            return self.noise_pool.normal(loc, scale)
+        return np.random.normal(loc, scale)
+
     def generate_motion_noise_params(self,meta_dist):
-        bias = np.random.normal(*meta_dist['bias_dist'])
-        variance = np.abs(np.random.normal(*meta_dist['variance_dist']))
+        bias = self.normal(*meta_dist['bias_dist'])
+        variance = np.abs(self.normal(*meta_dist['variance_dist']))
         return [bias,variance]
 
     def reset_noise_model(self):
@@ -107,14 +137,14 @@ class NoiseInMotionSimple1DNormal:
     
     def get_ahead_drift(self, nominal_ahead):
         # returns [ahead change, left/right change, rot change] from an ahead command in [m,m,deg]
-        linear_drift = self.effect_scale * np.random.normal(*self.ahead_noise_params)
-        side_drift = self.effect_scale * np.random.normal(*self.lateral_noise_params)
+        linear_drift = self.effect_scale * self.normal(*self.ahead_noise_params)
+        side_drift = self.effect_scale * self.normal(*self.lateral_noise_params)
         rotation_drift = np.arctan2(side_drift,linear_drift + nominal_ahead) * 180 / np.pi
 
         return [linear_drift, side_drift, rotation_drift ]
 
     def get_rotate_drift(self):
         # for this model, rotating incurs no positional drift. Returns [0,0,deg]
-        rotation_drift = self.effect_scale * np.random.normal(*self.turning_noise_params)
+        rotation_drift = self.effect_scale * self.normal(*self.turning_noise_params)
 
         return [0, 0, rotation_drift]
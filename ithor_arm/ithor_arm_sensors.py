@@ -16,6 +16,7 @@ from ithor_arm.arm_calculation_utils import (
 )
 from ithor_arm.ithor_arm_environment import ManipulaTHOREnvironment
 from manipulathor_utils.debugger_util import ForkedPdb
+from utils.nan_inf_utils import scrub_nan_inf
 
 
 class DepthSensorThor(
@@ -58,7 +59,7 @@ class DepthSensorThor(
         #           'mean', sum(self.depth_dict['mean']) / len(self.depth_dict['mean']),
         #           'norm', sum(self.depth_dict['norm']) / len(self.depth_dict['norm'])
         #           )
-        return depth
+        return scrub_nan_inf(depth)
 
 
 class NoVisionSensorThor(
@@ -18,6 +18,7 @@ from ithor_arm.ithor_arm_tasks import (
     EasyArmPointNavTask
 )
 from ithor_arm.ithor_arm_viz import LoggerVisualizer, ImageVisualizer
+from utils.noise_pool_utils import episode_index
 
 
 class AbstractMidLevelArmTaskSampler(TaskSampler):
@@ -210,6 +211,7 @@ class SimpleArmPointNavGeneralSampler(AbstractMidLevelArmTaskSampler):
         self.env.reset(
             scene_name=scene, agentMode="arm", agentControllerType="mid-level"
         )
+        self.env.start_noise_episode(episode_index(source_data_point, target_data_point))
 
         event1, event2, event3 = initialize_arm(self.env.controller)
 
@@ -358,6 +360,7 @@ class ArmPointNavTaskSampler(SimpleArmPointNavGeneralSampler):
         self.env.reset(
             scene_name=scene, agentMode="arm", agentControllerType="mid-level"
         )
+        self.env.start_noise_episode(episode_index(source_data_point, target_data_point))
 
         event1, event2, event3 = initialize_arm(self.env.controller)
 
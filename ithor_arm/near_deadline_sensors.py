@@ -24,7 +24,7 @@ from allenact_plugins.ithor_plugin.ithor_sensors import RGBSensorThor
 
 from torch.distributions.utils import lazy_property
 
-from ithor_arm.arm_calculation_utils import convert_world_to_agent_coordinate, diff_position, convert_state_to_tensor
+from ithor_arm.arm_calculation_utils import convert_world_to_agent_coordinate, convert_world_to_agent_coordinate_batched, diff_position, convert_state_to_tensor
 from ithor_arm.bring_object_sensors import add_mask_noise
 from ithor_arm.ithor_arm_constants import DONT_USE_ALL_POSSIBLE_OBJECTS_EVER
 from ithor_arm.ithor_arm_environment import ManipulaTHOREnvironment
@@ -33,12 +33,15 @@ from ithor_arm.pointcloud_sensors import rotate_points_to_agent, KianaReachableB
 from manipulathor_baselines.bring_object_baselines.models.detection_model import ConditionalDetectionModel
 from manipulathor_utils.debugger_util import ForkedPdb
 from scripts.thor_category_names import thor_possible_objects
-from utils.calculation_utils import calc_world_coordinates
+from utils.calculation_utils import calc_world_coordinates, RecencyWeightedPointHistory
+from utils.object_centroid_utils import object_centroid_estimator_of
 from utils.klemens_constants import OMNI_CATEGORIES, OMNI_TO_ITHOR, ITHOR_TO_OMNI
 
 from utils.noise_depth_util_files.sim_depth import RedwoodDepthNoise
 from utils.noise_from_habitat import ControllerNoiseModel, MotionNoiseModel, _TruncatedMultivariateGaussian
+from utils.nan_inf_utils import scrub_nan_inf
 from utils.noise_in_motion_util import NoiseInMotion, squeeze_bool_mask, tensor_from_dict
+from utils.sensor_observation_cache import memoize_observation_per_step
 
 KINECT_FOV_W, KINECT_FOV_H = 59, 90
 
@@ -62,6 +65,7 @@ class FancyNoisyObjectMaskWLabels(Sensor):
         super().__init__(**prepare_locals_for_super(locals()))
 
 
+    @memoize_observation_per_step
     def get_observation(
             self, env: ManipulaTHOREnvironment, task: Task, *args: Any, **kwargs: Any
     ) -> Any:
@@ -142,7 +146,7 @@ class PointNavEmulatorSensor(Sensor):
 
 
     def get_accurate_locations(self, env):
-        metadata = copy.deepcopy(env.controller.last_event.metadata)
+        metadata = env.controller.last_event.metadata
         camera_xyz = np.array([metadata["cameraPosition"][k] for k in ["x", "y", "z"]])
         camera_rotation=metadata["agent"]["rotation"]["y"]
         camera_horizon=metadata["agent"]["cameraHorizon"]
@@ -193,9 +197,10 @@ class PointNavEmulatorSensor(Sensor):
         else:
             real_current_location = self.get_accurate_locations(env)
 
+            # every location is built fresh and only ever replaced, never mutated, so none of them is copied
             if self.real_prev_location is None:
-                self.real_prev_location = copy.deepcopy(real_current_location)
-                self.belief_prev_location = copy.deepcopy(real_current_location)
+                self.real_prev_location = real_current_location
+                self.belief_prev_location = real_current_location
             else:
 
                 belief_camera_horizon = real_current_location['camera_horizon']
@@ -206,8 +211,8 @@ class PointNavEmulatorSensor(Sensor):
                 # belief_arm_state = self.add_noise_to_arm(tensor_from_dict(real_current_location['arm_state']['position']), real_agent_location, )
                 belief_arm_state = real_current_location['arm_state']
 
-                self.belief_prev_location = copy.deepcopy(dict(camera_xyz=belief_camera_xyz, camera_rotation=belief_camera_rotation, camera_horizon=belief_camera_horizon, arm_state=belief_arm_state))
-                self.real_prev_location = copy.deepcopy(real_current_location)
+                self.belief_prev_location = dict(camera_xyz=belief_camera_xyz, camera_rotation=belief_camera_rotation, camera_horizon=belief_camera_horizon, arm_state=belief_arm_state)
+                self.real_prev_location = real_current_location
 
 
             return self.belief_prev_location
@@ -265,14 +270,11 @@ class PointNavEmulatorSensor(Sensor):
                 midpoint = midpoint.cpu()
 
             # agent_centric_middle_of_object = rotate_to_agent(midpoint, self.device, camera_xyz, camera_rotation)
-            agent_state = dict(position=dict(x=camera_xyz[0], y=camera_xyz[1], z=camera_xyz[2], ), rotation=dict(x=0, y=camera_rotation, z=0))
-            midpoint_position_rotation = dict(position=dict(x=midpoint[0], y=midpoint[1], z=midpoint[2]), rotation=dict(x=0,y=0,z=0))
-            midpoint_agent_coord = convert_world_to_agent_coordinate(midpoint_position_rotation, agent_state)
+            midpoint_agent_coord, arm_state_agent_coord = convert_world_to_agent_coordinate_batched(
+                [midpoint.numpy(), [arm_state['position'][k] for k in ['x','y','z']]], camera_xyz, camera_rotation)
+            distance_in_agent_coord = arm_state_agent_coord - midpoint_agent_coord
 
-            arm_state_agent_coord = convert_world_to_agent_coordinate(arm_state, agent_state)
-            distance_in_agent_coord = dict(x=arm_state_agent_coord['position']['x'] - midpoint_agent_coord['position']['x'],y=arm_state_agent_coord['position']['y'] - midpoint_agent_coord['position']['y'],z=arm_state_agent_coord['position']['z'] - midpoint_agent_coord['position']['z'])
-
-            agent_centric_middle_of_object = torch.Tensor([distance_in_agent_coord['x'], distance_in_agent_coord['y'], distance_in_agent_coord['z']])
+            agent_centric_middle_of_object = torch.Tensor(distance_in_agent_coord)
 
             # Removing this hurts the performance
             agent_centric_middle_of_object = agent_centric_middle_of_object.abs()
@@ -373,7 +375,7 @@ class PointNavEmulatorSensorOnlyAgentLocation(PointNavEmulatorSensor):
 
 class PointNavEmulSensorDeadReckoning(Sensor):
 
-    def __init__(self, type: str, mask_sensor:Sensor, depth_sensor:Sensor, uuid: str = "point_nav_emul", **kwargs: Any):
+    def __init__(self, type: str, mask_sensor:Sensor, depth_sensor:Sensor, history_window: Optional[int] = None, uuid: str = "point_nav_emul", **kwargs: Any):
         observation_space = gym.spaces.Box(
             low=0, high=1, shape=(1,), dtype=np.float32
         )  # (low=-1.0, high=2.0, shape=(3, 4), dtype=np.float32)
@@ -387,17 +389,19 @@ class PointNavEmulSensorDeadReckoning(Sensor):
         self.dummy_answer = torch.zeros(3)
         self.dummy_answer[:] = 4 # is this good enough?
         self.device = torch.device("cpu")
+        # only the midpoints of the last history_window steps are averaged, all of them if None
+        self.history_window = history_window
         super().__init__(**prepare_locals_for_super(locals()))
 
     def get_agent_belief_state(self,env):
         #TODO all these values need to be checked
         fov=max(KINECT_FOV_W, KINECT_FOV_H)#TODO are you sure? it should be smaller one I think
-        belief_agent_state = env.nominal_agent_location
+        belief_agent_state = env.nominal_agent_pose
         real_agent_state = env.get_agent_location()
 
         belief_camera_horizon = 45
-        belief_camera_xyz = np.array([belief_agent_state[k] for k in ['x','y','z']])
-        belief_camera_rotation = (belief_agent_state['rotation'] + 90) % 360
+        belief_camera_xyz = np.array(belief_agent_state[['x','y','z']].tolist())
+        belief_camera_rotation = (float(belief_agent_state['rotation']) + 90) % 360
 
         real_camera_xyz = np.array([real_agent_state[k] for k in ['x','y','z']])
 
@@ -412,11 +416,11 @@ class PointNavEmulSensorDeadReckoning(Sensor):
         #TODO remove
         if self.type == 'destination':
             return self.dummy_answer
-        mask = (self.mask_sensor.get_observation(env, task, *args, **kwargs)) #TODO this is called multiple times?
+        mask = (self.mask_sensor.get_observation(env, task, *args, **kwargs)) # memoized per step, see utils.sensor_observation_cache
         depth_frame_original = self.depth_sensor.get_observation(env, task, *args, **kwargs).squeeze(-1)
 
         if task.num_steps_taken() == 0:
-            self.pointnav_history_aggr = []
+            self.pointnav_history_aggr = RecencyWeightedPointHistory(self.history_window)
             self.real_prev_location = []
             self.belief_prev_location = []
 
@@ -426,8 +430,8 @@ class PointNavEmulSensorDeadReckoning(Sensor):
 
         if mask.sum() != 0:
 
-            midpoint_agent_coord = get_mid_point_of_object_from_depth_and_mask(mask, depth_frame_original, self.min_xyz, camera_xyz, camera_rotation, camera_horizon, fov, self.device)
-            self.pointnav_history_aggr.append((midpoint_agent_coord.cpu(), 1, task.num_steps_taken()))
+            midpoint_agent_coord, _ = object_centroid_estimator_of(env).centroid(mask, depth_frame_original, self.min_xyz, camera_xyz, camera_rotation, camera_horizon, fov, self.device, zero_depth_is_missing=False)
+            self.pointnav_history_aggr.append(midpoint_agent_coord.cpu(), task.num_steps_taken())
 
         # if len(self.belief_prev_location) > 190:
         #     import matplotlib
@@ -456,14 +460,10 @@ class PointNavEmulSensorDeadReckoning(Sensor):
         return result
         
     def history_aggregation(self, camera_xyz, camera_rotation, arm_agent_coord, current_step_number):
-        if len(self.pointnav_history_aggr) == 0:
+        midpoint = self.pointnav_history_aggr.weighted_average(current_step_number)
+        if midpoint is None:
             return self.dummy_answer
         else:
-            weights = [1. / (current_step_number + 1 - num_steps) for mid,num_pixels,num_steps in self.pointnav_history_aggr]
-            total_weights = sum(weights)
-            total_sum = [mid * (1. / (current_step_number + 1 - num_steps)) for mid,num_pixels,num_steps in self.pointnav_history_aggr]
-            total_sum = sum(total_sum)
-            midpoint = total_sum / total_weights
             agent_state = dict(position=dict(x=camera_xyz[0], y=camera_xyz[1], z=camera_xyz[2], ), rotation=dict(x=0, y=camera_rotation, z=0))
             midpoint_position_rotation = dict(position=dict(x=midpoint[0], y=midpoint[1], z=midpoint[2]), rotation=dict(x=0,y=0,z=0))
             midpoint_agent_coord = convert_world_to_agent_coordinate(midpoint_position_rotation, agent_state)
@@ -553,6 +553,7 @@ class PredictionObjectMask(Sensor):
             mask = probs_mask.argmax(dim=1).float().unsqueeze(1)#To add the channel back in the end of the image
             return mask
 
+    @memoize_observation_per_step
     def get_observation(
             self, env: ManipulaTHOREnvironment, task: Task, *args: Any, **kwargs: Any
     ) -> Any:
@@ -636,6 +637,7 @@ class DetectronPredictionObjectMask(Sensor):
                 mask = torch.zeros((224,224))
             return mask.long().cpu().unsqueeze(-1).numpy()#Channel last
 
+    @memoize_observation_per_step
     def get_observation(
             self, env: ManipulaTHOREnvironment, task: Task, *args: Any, **kwargs: Any
     ) -> Any:
@@ -680,7 +682,8 @@ class RealPointNavSensor(Sensor):
         super().__init__(**prepare_locals_for_super(locals()))
 
     def get_accurate_locations(self, env):
-        metadata = copy.deepcopy(env.controller.last_event.metadata['agent'])
+        agent = env.controller.last_event.metadata['agent']
+        metadata = dict(position=dict(agent['position']), rotation=dict(agent['rotation']))
         # camera_xyz = np.array([metadata["cameraPosition"][k] for k in ["x", "y", "z"]])
         # camera_rotation=metadata["agent"]["rotation"]["y"]
         # camera_horizon=metadata["agent"]["cameraHorizon"]
@@ -729,9 +732,10 @@ class RealPointNavSensor(Sensor):
         else:
             real_current_location = self.get_accurate_locations(env)
 
+            # every location is built fresh and only ever replaced, never mutated, so none of them is copied
             if self.real_prev_location is None:
-                self.real_prev_location = copy.deepcopy(real_current_location)
-                self.belief_prev_location = copy.deepcopy(real_current_location)
+                self.real_prev_location = real_current_location
+                self.belief_prev_location = real_current_location
             else:
                 change_in_xyz = tensor_from_dict(real_current_location['position']) - tensor_from_dict(self.real_prev_location['position'])
 
@@ -741,8 +745,8 @@ class RealPointNavSensor(Sensor):
                 belief_camera_rotation = self.add_rotation_noise(change_in_rotation, last_step_belief_rotation)
                 # belief_arm_state = self.add_noise_to_arm(tensor_from_dict(real_current_location['arm_state']['position']), real_agent_location, )
 
-                self.belief_prev_location = copy.deepcopy(dict(position=dict(x=belief_camera_xyz[0], y=belief_camera_xyz[1],z=belief_camera_xyz[2]), rotation=dict(x=0,y=belief_camera_rotation, z=0)))
-                self.real_prev_location = copy.deepcopy(real_current_location)
+                self.belief_prev_location = dict(position=dict(x=belief_camera_xyz[0], y=belief_camera_xyz[1],z=belief_camera_xyz[2]), rotation=dict(x=0,y=belief_camera_rotation, z=0))
+                self.real_prev_location = real_current_location
 
 
             return self.belief_prev_location
@@ -829,7 +833,7 @@ class NoisyDepthSensorThor(
         return RedwoodDepthNoise()
 
     def frame_from_env(self, env: IThorEnvironment, task: Optional[Task]) -> np.ndarray:
-        depth = (env.controller.last_event.depth_frame.copy())
+        depth = scrub_nan_inf(env.controller.last_event.depth_frame.copy())
         noisy_depth = self.noise_model.add_noise(depth, depth_normalizer=50)
         return noisy_depth
 
@@ -875,6 +879,7 @@ class MisDetectionNoisyObjectMask(Sensor):
         super().__init__(**prepare_locals_for_super(locals()))
 
 
+    @memoize_observation_per_step
     def get_observation(
             self, env: ManipulaTHOREnvironment, task: Task, *args: Any, **kwargs: Any
     ) -> Any:
@@ -935,6 +940,7 @@ class MaskCutoffNoisyObjectMask(Sensor):
         super().__init__(**prepare_locals_for_super(locals()))
 
 
+    @memoize_observation_per_step
     def get_observation(
             self, env: ManipulaTHOREnvironment, task: Task, *args: Any, **kwargs: Any
     ) -> Any:
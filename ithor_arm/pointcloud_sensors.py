@@ -3,11 +3,11 @@ import datetime
 import os
 from typing import Any
 
-from typing import Optional, Sequence, Dict
+from typing import Optional, Sequence, Dict, Tuple
 
 from allenact.embodiedai.mapping.mapping_utils.point_cloud_utils import (
-    depth_frame_to_world_space_xyz,
-    project_point_cloud_to_map,
+    camera_space_xyz_to_world_xyz,
+    depth_frame_to_camera_space_xyz,
 )
 
 import ai2thor.controller
@@ -21,6 +21,8 @@ from allenact.base_abstractions.task import Task
 from allenact.utils.misc_utils import prepare_locals_for_super
 from allenact_plugins.robothor_plugin.robothor_environment import RoboThorEnvironment
 
+from utils.batched_transformation_utils import project_point_cloud_to_map_batched, point_cloud_to_map_indices
+
 
 def show_3d(things_to_show, map_size = None, additional_tag=''):
     # import matplotlib
@@ -57,6 +59,9 @@ class KianaBinnedPointCloudMapTHORSensor(
             # height_bins: Sequence[float] = (0.02, 2),
             height_bins: Sequence[float] = tuple([i * 0.2 for i in range(0, 10)]),
             ego_only: bool = True,
+            subsample: int = 1,
+            map_as_tensor: bool = False,
+            map_device: torch.device = torch.device("cpu"),
             uuid: str = "binned_pc_map",
             **kwargs: Any,
     ):
@@ -76,12 +81,15 @@ class KianaBinnedPointCloudMapTHORSensor(
             map_size_in_cm=map_size_in_cm,
             resolution_in_cm=resolution_in_cm,
             height_bins=height_bins,
+            device=torch.device(map_device),
+            subsample=subsample,
+            as_tensor=map_as_tensor,
         )
 
         map_space = gym.spaces.Box(
             low=0,
             high=np.inf,
-            shape=self.binned_pc_map_builder.binned_point_cloud_map.shape,
+            shape=self.binned_pc_map_builder.map_shape,
             dtype=np.float32,
         )
 
@@ -133,7 +141,7 @@ class KianaBinnedPointCloudMapTHORSensor(
             )
 
 
-        map_dict = self.binned_pc_map_builder.update(depth_frame=depth_frame_for_target_obj,camera_xyz=np.array([metadata["cameraPosition"][k] for k in ["x", "y", "z"]]),camera_rotation=metadata["agent"]["rotation"]["y"],camera_horizon=metadata["agent"]["cameraHorizon"],)
+        map_dict = self.binned_pc_map_builder.update(depth_frame=depth_frame_for_target_obj,camera_xyz=np.array([metadata["cameraPosition"][k] for k in ["x", "y", "z"]]),camera_rotation=metadata["agent"]["rotation"]["y"],camera_horizon=metadata["agent"]["cameraHorizon"],outputs=self.observation_space.spaces.keys(),)
 
         return {k: map_dict[k] for k in self.observation_space.spaces.keys()}
 
@@ -191,6 +199,11 @@ class KianaBinnedPointCloudMapBuilder(object):
         calling `reset(...)`.
     device : A `torch.device` on which to run computations. If this device is a GPU you can potentially
         obtain significant speed-ups.
+    subsample : Only every `subsample`th row and column of the depth frames given to `update` is projected.
+        With the default of 1 every pixel with a depth is projected.
+    as_tensor : Keep the map as a float32 tensor on `device`, updated in place, and return tensors from `update`
+        instead of numpy arrays. The "map" and "map_with_agent" outputs are then references to the internal maps
+        rather than copies.
     """
 
     def __init__(
@@ -201,6 +214,8 @@ class KianaBinnedPointCloudMapBuilder(object):
             resolution_in_cm: int,
             height_bins: Sequence[float],
             device: torch.device = torch.device("cpu"),
+            subsample: int = 1,
+            as_tensor: bool = False,
     ):
         # assert vision_range_in_cm % resolution_in_cm == 0
 
@@ -210,17 +225,19 @@ class KianaBinnedPointCloudMapBuilder(object):
         self.resolution_in_cm = resolution_in_cm
         self.height_bins = height_bins
         self.device = device
-
-        self.binned_point_cloud_map = np.zeros(
-            (
-                self.map_size_in_cm // self.resolution_in_cm,
-                self.map_size_in_cm // self.resolution_in_cm,
-                len(self.height_bins) + 1,
-            ),
-            dtype=np.float32,
+        self.subsample = subsample
+        self.as_tensor = as_tensor
+        self._camera_space_rays_cache: Dict[Tuple[int, int, str], torch.Tensor] = {}
+
+        self.map_shape = (
+            self.map_size_in_cm // self.resolution_in_cm,
+            self.map_size_in_cm // self.resolution_in_cm,
+            len(self.height_bins) + 1,
         )
-
-
+        self.binned_point_cloud_map = self._zeros_map()
+        # map_with_agent of the tensor backed map, only kept up to date once it has been asked for
+        self._map_with_agent: Optional[torch.Tensor] = None
+        self._agent_cell_in_map: Optional[Tuple[int, int, int]] = None
 
         self.min_xyz: Optional[np.ndarray] = None
 
@@ -230,6 +247,7 @@ class KianaBinnedPointCloudMapBuilder(object):
             camera_xyz: np.ndarray,
             camera_rotation: float,
             camera_horizon: float,
+            outputs: Sequence[str] = ("egocentric_update", "allocentric_update", "map", "map_with_agent"),
     ) -> Dict[str, np.ndarray]:
         """Updates the map with the input depth frame from the agent.
 
@@ -253,6 +271,9 @@ class KianaBinnedPointCloudMapBuilder(object):
              is what is used to update the internally stored representation of the map.
         *  `"map"` -  A `(map_size)x(map_size)x(len(self.height_bins) + 1)` tensor corresponding
             to the sum of all `"allocentric_update"` values since the last `reset()`.
+        *  `"map_with_agent"` - A copy of `"map"` with the cell holding the camera set to -1.
+
+        Only the keys in `outputs` are returned, the map is updated either way.
         ```
         """
         with torch.no_grad():
@@ -262,102 +283,134 @@ class KianaBinnedPointCloudMapBuilder(object):
                 torch.from_numpy(camera_xyz - self.min_xyz).float().to(self.device)
             )
 
-            current_agent_location = torch.zeros(depth_frame.shape).to(self.device)
-            current_agent_location[:] = np.NaN
-            current_agent_location[112,112] = 0
-            current_agent_world_space_point_cloud = depth_frame_to_world_space_xyz(depth_frame=current_agent_location,camera_world_xyz=camera_xyz,rotation=camera_rotation,horizon=camera_horizon,fov=self.fov,)
-            current_agent_binned_indices = project_point_cloud_to_map(xyz_points=current_agent_world_space_point_cloud,bin_axis="y",bins=self.height_bins,map_size=self.binned_point_cloud_map.shape[0],resolution_in_cm=self.resolution_in_cm,flip_row_col=True,).nonzero().squeeze(0)
-
-            depth_frame = torch.from_numpy(depth_frame).to(self.device)
-            # depth_frame[
-            #     depth_frame
-            #     > self.vision_range_in_map_units * self.resolution_in_cm / 100
-            #     ] = np.NaN
-
-            depth_frame[depth_frame == -1] = np.NaN
-
-
-            world_space_point_cloud = depth_frame_to_world_space_xyz(
-                depth_frame=depth_frame,
+            map_size = self.map_shape[0]
+            depth_frame = torch.as_tensor(depth_frame, device=self.device)
+            camera_space_rays = self._camera_space_rays(*depth_frame.shape[:2])
+            if self.subsample > 1:
+                depth_frame = depth_frame[:: self.subsample, :: self.subsample]
+                camera_space_rays = camera_space_rays[:, :: self.subsample, :: self.subsample]
+
+            # only the pixels with a depth are unprojected, -1 marks the pixels outside of the object's mask
+            valid = torch.logical_and(depth_frame != -1, ~torch.isnan(depth_frame))
+            camera_space_xyz = camera_space_rays[:, valid] * depth_frame[valid][None, :]
+            world_space_point_cloud = camera_space_xyz_to_world_xyz(
+                camera_space_xyzs=camera_space_xyz,
                 camera_world_xyz=camera_xyz,
                 rotation=camera_rotation,
                 horizon=camera_horizon,
-                fov=self.fov,
-            )
+            ).T.unsqueeze(0)
+            if self.as_tensor:
+                return self._update_tensor_map(world_space_point_cloud, camera_xyz, camera_rotation, outputs)
 
-            world_binned_map_update = project_point_cloud_to_map(
+            world_binned_map_update = project_point_cloud_to_map_batched(
                 xyz_points=world_space_point_cloud,
                 bin_axis="y",
                 bins=self.height_bins,
-                map_size=self.binned_point_cloud_map.shape[0],
+                map_size=map_size,
                 resolution_in_cm=self.resolution_in_cm,
                 flip_row_col=True,
-            )
-            # Center the cloud on the agent
-
-            agent_centric_point_cloud = rotate_points_to_agent(world_space_point_cloud, self.device, camera_xyz, camera_rotation, self.map_size_in_cm)
+            )[0]
             allocentric_update_numpy = world_binned_map_update.cpu().numpy()
-            self.binned_point_cloud_map = (
-                    self.binned_point_cloud_map + allocentric_update_numpy
-            )
-
-            agent_centric_binned_map = project_point_cloud_to_map(
-                xyz_points=agent_centric_point_cloud,
-                bin_axis="y",
-                bins=self.height_bins,
-                map_size=self.binned_point_cloud_map.shape[0],
-                resolution_in_cm=self.resolution_in_cm,
-                flip_row_col=True,
-            )
-            # TODO what was this?
-            # vr = self.vision_range_in_map_units
-            # vr_div_2 = self.vision_range_in_map_units // 2
-            # width_div_2 = agent_centric_binned_map.shape[1] // 2
-            # agent_centric_binned_map = agent_centric_binned_map[
-            #                            :vr, (width_div_2 - vr_div_2) : (width_div_2 + vr_div_2), :
-            #                            ]
-
-
-
-
-
-            # things_to_show = world_space_point_cloud; things_to_show = torch.nn.functional.interpolate(things_to_show.permute(2, 0, 1).unsqueeze(0), (40,40)).squeeze(0).permute(1,2,0); show_3d(things_to_show)
-            copied_map = self.binned_point_cloud_map.copy()
-            x, y, z = current_agent_binned_indices
-            copied_map[x, y, z] = -1
-            # if depth_frame[~depth_frame.isnan()].sum() > 0:
-                # non_nan_items = world_space_point_cloud[~depth_frame.isnan()]
-                # self.three_d_points = torch.cat([self.three_d_points, non_nan_items], dim=0)
-                # just_object_of_interest_agent_centric = rotate_points_to_agent(self.three_d_points, self.device, camera_xyz, camera_rotation, self.map_size_in_cm) # remove?
-
-
-                # things_to_show = self.three_d_points;  show_3d(things_to_show)
-                # things_to_show = just_object_of_interest_agent_centric;  show_3d(things_to_show)
-                # things_to_show = agent_centric_binned_map;  show_3d(things_to_show)
-                # things_to_show = agent_centric_binned_map.nonzero();  show_3d(things_to_show)
-                # things_to_show = self.all_previous_ones.nonzero();  show_3d(things_to_show)
-                # things_to_show = torch.Tensor(self.binned_point_cloud_map).nonzero();  show_3d(things_to_show, map_size = self.binned_point_cloud_map.shape)
-                # things_to_show = (agent_centric_binned_map).nonzero();  show_3d(things_to_show, map_size = agent_centric_binned_map.shape)
-
-
-                # converted_to_agent = rotate_points_to_agent(self.three_d_points, self.device, camera_xyz, camera_rotation, self.map_size_in_cm); converted_bin = project_point_cloud_to_map(xyz_points=converted_to_agent,bin_axis="y",bins=self.height_bins,map_size=self.binned_point_cloud_map.shape[0],resolution_in_cm=self.resolution_in_cm,flip_row_col=True,); things_to_show = (converted_bin).nonzero();  show_3d(things_to_show, map_size = converted_bin.shape)
-
-                # print(self.three_d_points.float().mean(dim=0))
-                # print(converted_bin.nonzero().float().mean(dim=0))
-                # converted_to_agent = rotate_points_to_agent(agent_centric_point_cloud[(agent_centric_point_cloud == agent_centric_point_cloud)[:,:,0]], self.device, camera_xyz, camera_rotation, self.map_size_in_cm).squeeze(0); print(converted_to_agent.mean(dim=0))
-
-                # converted_bin = project_point_cloud_to_map(xyz_points=self.three_d_points,bin_axis="y",bins=self.height_bins,map_size=self.binned_point_cloud_map.shape[0],resolution_in_cm=self.resolution_in_cm,flip_row_col=True,);things_to_show = (converted_bin).nonzero();  show_3d(things_to_show, map_size = converted_bin.shape)
-
-                # things_to_show = torch.Tensor(copied_map).nonzero();  show_3d(things_to_show, map_size = copied_map.shape)
-                # print(current_agent_binned_indices)
-                # ForkedPdb().set_trace()
+            self.binned_point_cloud_map += allocentric_update_numpy
+
+            result = {}
+            if "egocentric_update" in outputs:
+                result["egocentric_update"] = self._egocentric_update(world_space_point_cloud, camera_xyz, camera_rotation).cpu().numpy()
+            if "allocentric_update" in outputs:
+                result["allocentric_update"] = allocentric_update_numpy
+            if "map" in outputs:
+                result["map"] = self.binned_point_cloud_map.copy()
+            if "map_with_agent" in outputs:
+                copied_map = self.binned_point_cloud_map.copy()
+                agent_cell = self._agent_cell(camera_xyz)
+                if agent_cell is not None:
+                    copied_map[agent_cell] = -1
+                result["map_with_agent"] = copied_map
+            return result
+
+    def _update_tensor_map(
+            self,
+            world_space_point_cloud: torch.Tensor,
+            camera_xyz: torch.Tensor,
+            camera_rotation: float,
+            outputs: Sequence[str],
+    ) -> Dict[str, torch.Tensor]:
+        """`update` for `as_tensor`: the maps are float32 tensors on `self.device`, the points are added to them
+        in place without building a dense update, "map" and "map_with_agent" are returned by reference (and change
+        with the next call to `update`)."""
+        ind = self._map_indices(world_space_point_cloud)
+        ones = torch.ones(ind.shape, dtype=torch.float32, device=ind.device)
+        self.binned_point_cloud_map.view(-1).index_add_(0, ind, ones)
+        if self._map_with_agent is not None:
+            self._map_with_agent.view(-1).index_add_(0, ind, ones)
+        elif "map_with_agent" in outputs:
+            self._map_with_agent = self.binned_point_cloud_map.clone()
+        if self._map_with_agent is not None:
+            if self._agent_cell_in_map is not None:
+                self._map_with_agent[self._agent_cell_in_map] = self.binned_point_cloud_map[self._agent_cell_in_map]
+            self._agent_cell_in_map = self._agent_cell(camera_xyz)
+            if self._agent_cell_in_map is not None:
+                self._map_with_agent[self._agent_cell_in_map] = -1
+
+        result = {}
+        if "egocentric_update" in outputs:
+            agent_centric_point_cloud = rotate_points_to_agent(world_space_point_cloud, self.device, camera_xyz, camera_rotation, self.map_size_in_cm)
+            agent_centric_ind = self._map_indices(agent_centric_point_cloud)
+            result["egocentric_update"] = self._zeros_map().view(-1).index_add_(
+                0, agent_centric_ind, torch.ones(agent_centric_ind.shape, dtype=torch.float32, device=ind.device)
+            ).view(self.map_shape)
+        if "allocentric_update" in outputs:
+            result["allocentric_update"] = self._zeros_map().view(-1).index_add_(0, ind, ones).view(self.map_shape)
+        if "map" in outputs:
+            result["map"] = self.binned_point_cloud_map
+        if "map_with_agent" in outputs:
+            result["map_with_agent"] = self._map_with_agent
+        return result
+
+    def _map_indices(self, point_cloud: torch.Tensor) -> torch.Tensor:
+        return point_cloud_to_map_indices(
+            xyz_points=point_cloud,
+            bin_axis="y",
+            bins=self.height_bins,
+            map_size=self.map_shape[0],
+            resolution_in_cm=self.resolution_in_cm,
+            flip_row_col=True,
+        )
 
-            return {
-                "egocentric_update": agent_centric_binned_map.cpu().numpy(),
-                "allocentric_update": allocentric_update_numpy,
-                "map": self.binned_point_cloud_map,
-                'map_with_agent': copied_map,
-            }
+    def _egocentric_update(self, world_space_point_cloud: torch.Tensor, camera_xyz: torch.Tensor, camera_rotation: float) -> torch.Tensor:
+        # Center the cloud on the agent
+        agent_centric_point_cloud = rotate_points_to_agent(world_space_point_cloud, self.device, camera_xyz, camera_rotation, self.map_size_in_cm)
+        return project_point_cloud_to_map_batched(
+            xyz_points=agent_centric_point_cloud,
+            bin_axis="y",
+            bins=self.height_bins,
+            map_size=self.map_shape[0],
+            resolution_in_cm=self.resolution_in_cm,
+            flip_row_col=True,
+        )[0]
+
+    def _zeros_map(self):
+        if self.as_tensor:
+            return torch.zeros(self.map_shape, dtype=torch.float32, device=self.device)
+        return np.zeros(self.map_shape, dtype=np.float64)
+
+    def _camera_space_rays(self, height: int, width: int) -> torch.Tensor:
+        """Camera space points of every pixel at depth 1, as a (3 x height x width) tensor."""
+        key = (height, width, str(self.device))
+        if key not in self._camera_space_rays_cache:
+            self._camera_space_rays_cache[key] = depth_frame_to_camera_space_xyz(
+                depth_frame=torch.ones((height, width), device=self.device), mask=None, fov=self.fov,
+            ).view(3, height, width)
+        return self._camera_space_rays_cache[key]
+
+    def _agent_cell(self, camera_xyz: torch.Tensor) -> Optional[Tuple[int, int, int]]:
+        """(row, column, height bin) of the map cell holding the camera, None if it is outside of the map. Any
+        pixel at depth 0 unprojects to the camera, whatever the size of the frame."""
+        row, col = torch.round(100 * camera_xyz[[2, 0]] / self.resolution_in_cm).long().tolist()
+        height_bin = int(torch.bucketize(camera_xyz[1:2], camera_xyz.new(self.height_bins)))
+        if 0 <= row < self.map_shape[0] and 0 <= col < self.map_shape[1]:
+            return row, col, height_bin
+        return None
 
     def reset(self, min_xyz: np.ndarray):
         """Reset the map.
@@ -370,7 +423,9 @@ class KianaBinnedPointCloudMapBuilder(object):
             will have been normalized so the (0,0,:) entry corresponds to these minimum values.
         """
         self.min_xyz = min_xyz
-        self.binned_point_cloud_map = np.zeros_like(self.binned_point_cloud_map)
+        self.binned_point_cloud_map = self._zeros_map()
+        self._map_with_agent = None
+        self._agent_cell_in_map = None
         # self.three_d_points = torch.zeros((0,3))
 
 class KianaReachableBoundsTHORSensor(Sensor[RoboThorEnvironment, Task[RoboThorEnvironment]]):
@@ -404,10 +459,11 @@ class KianaReachableBoundsTHORSensor(Sensor[RoboThorEnvironment, Task[RoboThorEn
 
     @staticmethod
     def get_bounds(
-            controller: ai2thor.controller.Controller, margin: float,
+            controller: ai2thor.controller.Controller, margin: float, positions: Optional[Sequence[Dict]] = None,
     ) -> Dict[str, np.ndarray]:
-        event = controller.step("GetReachablePositions")
-        positions = event.metadata["actionReturn"]
+        if positions is None:
+            event = controller.step("GetReachablePositions")
+            positions = event.metadata["actionReturn"]
         min_x = min(p["x"] for p in positions)
         max_x = max(p["x"] for p in positions)
         min_z = min(p["z"] for p in positions)
@@ -436,8 +492,10 @@ class KianaReachableBoundsTHORSensor(Sensor[RoboThorEnvironment, Task[RoboThorEn
     ) -> Any:
         scene_name = env.controller.last_event.metadata["sceneName"]
         if scene_name not in self._bounds_cache:
+            # the manipulathor environments share reachable positions, see utils.reachable_positions_cache
+            positions = env.get_reachable_positions() if hasattr(env, "get_reachable_positions") else None
             self._bounds_cache[scene_name] = self.get_bounds(
-                controller=env.controller, margin=self.margin
+                controller=env.controller, margin=self.margin, positions=positions
             )
 
         return copy.deepcopy(self._bounds_cache[scene_name])
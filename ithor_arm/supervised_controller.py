@@ -0,0 +1,135 @@
+"""A controller wrapper that replaces a crashed ai2thor controller, optionally with a warm standby."""
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from allenact.utils.system import get_logger
+
+
+class SupervisedController:
+    """Proxies every attribute to the active controller and can swap it for a new one with `restart`.
+
+    Starting a Controller blocks for tens of seconds while Unity boots. With `keep_standby` a second controller is
+    started in a background thread right away (and again after every restart), so that `restart` only has to wait
+    for whatever is left of that boot instead of a full one.
+
+    # Attributes
+
+    controller : The active controller.
+    restart_count : Number of times the active controller was replaced.
+    restart_latencies : Seconds `restart` blocked for, one entry per restart.
+    step_count : Number of `step` calls, i.e. Unity round trips, across all controllers.
+
+    Attributes set on the wrapper that are not its own are set on the active controller, and together with the
+    actions stepped through `setup_step` they are applied again to every controller swapped in by `restart`.
+    """
+
+    _OWN_ATTRIBUTES = frozenset([
+        "create_controller", "keep_standby", "controller", "restart_count", "restart_latencies", "step_count",
+        "_standby", "_standby_error", "_standby_thread", "_controller_attributes", "_setup_actions",
+    ])
+
+    def __init__(self, create_controller: Callable[[], object], keep_standby: bool = False):
+        self.create_controller = create_controller
+        self.keep_standby = keep_standby
+        self._controller_attributes: Dict[str, Any] = {}
+        self._setup_actions: Dict[str, Dict[str, Any]] = {}
+        self.controller = create_controller()
+        self.restart_count = 0
+        self.restart_latencies: List[float] = []
+        self.step_count = 0
+
+        self._standby = None
+        self._standby_error: Optional[BaseException] = None
+        self._standby_thread: Optional[threading.Thread] = None
+        if self.keep_standby:
+            self._spawn_standby()
+
+    def _spawn_standby(self):
+        def spawn():
+            try:
+                self._standby = self.create_controller()
+            except BaseException as e:
+                self._standby_error = e
+
+        self._standby = None
+        self._standby_error = None
+        self._standby_thread = threading.Thread(target=spawn, daemon=True)
+        self._standby_thread.start()
+
+    def _take_standby(self):
+        if self._standby_thread is None:
+            return None
+        self._standby_thread.join()
+        self._standby_thread = None
+        if self._standby_error is not None:
+            get_logger().warning("Standby controller failed to start: {}".format(self._standby_error))
+        standby, self._standby = self._standby, None
+        return standby
+
+    def _configure(self, controller):
+        for name, value in self._controller_attributes.items():
+            setattr(controller, name, value)
+        for action in self._setup_actions.values():
+            controller.step(action)
+
+    def setup_step(self, action: Dict[str, Any]):
+        """Steps `action` and steps it again on every replacement controller. Only the last setup action of
+        each name is kept."""
+        self._setup_actions[action["action"]] = action
+        return self.step(action)
+
+    def restart(self):
+        """Stops the active controller and replaces it with the standby, or with a new controller if there is none."""
+        start_time = time.time()
+        failed_controller = self.controller
+        new_controller = self._take_standby()
+        if new_controller is None:
+            new_controller = self.create_controller()
+        self.controller = new_controller
+        self._configure(new_controller)
+        try:
+            failed_controller.stop()
+        except Exception as e:
+            get_logger().warning("Could not stop the failed controller: {}".format(e))
+
+        self.restart_count += 1
+        self.restart_latencies.append(time.time() - start_time)
+        if self.keep_standby:
+            self._spawn_standby()
+        return self.controller
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "controller/restart_count": self.restart_count,
+            "controller/last_restart_latency": self.restart_latencies[-1] if self.restart_latencies else 0.0,
+            "controller/step_count": self.step_count,
+        }
+
+    def stop(self):
+        standby = self._take_standby()
+        if standby is not None:
+            standby.stop()
+        self.controller.stop()
+
+    # the two attributes read on every step skip __getattr__
+    def step(self, *args, **kwargs):
+        self.step_count += 1
+        return self.controller.step(*args, **kwargs)
+
+    @property
+    def last_event(self):
+        return self.controller.last_event
+
+    def __setattr__(self, name, value):
+        if name in self._OWN_ATTRIBUTES:
+            object.__setattr__(self, name, value)
+        else:
+            self._controller_attributes[name] = value
+            setattr(self.controller, name, value)
+
+    def __getattr__(self, name):
+        if name in self._OWN_ATTRIBUTES:
+            # not set yet, avoid recursing while the first controller is created
+            raise AttributeError(name)
+        return getattr(self.controller, name)
@@ -274,8 +274,11 @@ class StretchObjectDisplacementMapModel(ActorCriticModel[CategoricalDistr]):
         position = pose[:, :, :3]
         rotation = pose[:, :, -1]
         binned_updates = []
-        from utils.batched_transformation_utils import depth_frame_to_camera_space_xyz_batched, camera_space_xyz_to_world_xyz_batched, project_point_cloud_to_map_batched
-        binned_camera_space_xyz = depth_frame_to_camera_space_xyz_batched(frame, mask, fov=camera['fov'][timestep])
+        from utils.batched_transformation_utils import depth_frame_to_camera_space_xyz_batched, camera_space_xyz_to_world_xyz_batched, project_point_cloud_to_map_batched, horizontal_fov
+        # the camera fov is the vertical one, the horizontal one differs for non-square frames such as the kinect's
+        fov_y = camera['fov'][timestep]
+        binned_camera_space_xyz = depth_frame_to_camera_space_xyz_batched(
+            frame, mask, fov=horizontal_fov(fov_y, frame.shape[-2], frame.shape[-1]), fov_y=fov_y)
         xyz_offset = camera['xyz_offset'][timestep].reshape(position.shape)
         
         camera_xyz = position.clone()
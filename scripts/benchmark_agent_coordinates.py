@@ -0,0 +1,87 @@
+"""Times ithor_arm.arm_calculation_utils.convert_world_to_agent_coordinate (closed form yaw inverses in an LRU
+cache) and convert_world_to_agent_coordinate_batched against the previous implementation, which built scipy
+rotations and a 4x4 matrix per call and scanned the inverses saved every 45 degrees, on the conversions a
+pointnav emulator sensor makes (the object's midpoint and the arm, from the camera's pose).
+tests/test_arm_calculation_utils.py checks that they give the previous results.
+
+python scripts/benchmark_agent_coordinates.py
+"""
+import argparse
+import timeit
+
+import numpy as np
+import torch
+from scipy.spatial.transform import Rotation as R
+
+from ithor_arm.arm_calculation_utils import convert_world_to_agent_coordinate, convert_world_to_agent_coordinate_batched
+
+
+def make_rotation_matrix(position, rotation):
+    result = np.zeros((4, 4))
+    r = R.from_euler("xyz", [rotation["x"], rotation["y"], rotation["z"]], degrees=True)
+    result[:3, :3] = r.as_matrix()
+    result[3, 3] = 1
+    result[:3, 3] = [position["x"], position["y"], position["z"]]
+    return result
+
+
+def calc_inverse(deg):
+    return np.linalg.inv(R.from_euler("xyz", [0, deg, 0], degrees=True).as_matrix())
+
+
+saved_inverse_rotation_mats = {i: calc_inverse(i) for i in range(0, 360, 45)}
+saved_inverse_rotation_mats[360] = saved_inverse_rotation_mats[0]
+
+
+def find_closest_inverse(deg):
+    for k in saved_inverse_rotation_mats.keys():
+        if abs(k - deg) < 5:
+            return saved_inverse_rotation_mats[k]
+    return calc_inverse(deg)
+
+
+def previous_conversion(world_obj, agent_state):
+    position = agent_state["position"]
+    rotation = agent_state["rotation"]
+    agent_translation = [position["x"], position["y"], position["z"]]
+    assert abs(rotation["x"] - 0) < 0.01 and abs(rotation["z"] - 0) < 0.01
+    inverse_agent_rotation = find_closest_inverse(rotation["y"])
+    obj_matrix = make_rotation_matrix(world_obj["position"], world_obj["rotation"])
+    obj_matrix[:3, 3] = np.matmul(inverse_agent_rotation, (obj_matrix[:3, 3] - agent_translation))
+    rotation = R.from_matrix(obj_matrix[:3, :3]).as_euler("xyz", degrees=True)
+    position = obj_matrix[:3, 3]
+    return {
+        "position": {"x": position[0], "y": position[1], "z": position[2]},
+        "rotation": {"x": rotation[0], "y": rotation[1], "z": rotation[2]},
+    }
+
+
+def as_dict(xyz, rotation=(0, 0, 0)):
+    return dict(position=dict(zip('xyz', xyz)), rotation=dict(zip('xyz', rotation)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # one step of an arm pointnav emulator sensor: the midpoint and the arm from the camera's pose
+    agent = as_dict(np.array([1.0, 0.9, 2.0]), (0, 270 + 0.3, 0))
+    midpoint, arm = torch.rand(3), rng.uniform(-5, 5, 3)
+    timings = [
+        timeit.timeit(lambda: [previous_conversion(as_dict(point), agent) for point in (midpoint, arm)], number=args.number),
+        timeit.timeit(lambda: [convert_world_to_agent_coordinate(as_dict(point), agent) for point in (midpoint, arm)], number=args.number),
+        timeit.timeit(lambda: convert_world_to_agent_coordinate_batched(np.stack([midpoint.numpy(), arm]), [1.0, 0.9, 2.0], 270.3), number=args.number),
+    ]
+    print('midpoint and arm per step: previous {:.1f} us, cached closed form {:.1f} us, batched {:.1f} us'.format(
+        *[timing / args.number * 1e6 for timing in timings]))
+
+    many, many_agents, many_yaws = rng.uniform(-5, 5, (1000, 3)), rng.uniform(-5, 5, (1000, 3)), rng.uniform(0, 360, 1000)
+    one_agent = timeit.timeit(lambda: convert_world_to_agent_coordinate_batched(many, many_agents[0], many_yaws[0]), number=100) / 100
+    one_agent_each = timeit.timeit(lambda: convert_world_to_agent_coordinate_batched(many, many_agents, many_yaws), number=100) / 100
+    print('1000 points, batched: one agent {:.1f} us, one agent per point {:.1f} us'.format(one_agent * 1e6, one_agent_each * 1e6))
+
+
+if __name__ == '__main__':
+    main()
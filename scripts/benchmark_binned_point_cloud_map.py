@@ -0,0 +1,124 @@
+"""Replays a depth sequence through ithor_arm.pointcloud_sensors.KianaBinnedPointCloudMapBuilder and through the
+previous builder, which unprojected the whole frame (and a second, NaN frame for the agent's cell) every step, and
+reports steps per second of both. The sequence mimics what KianaBinnedPointCloudMapTHORSensor records in a bring
+object episode: 224x224 depth frames with -1 outside of a moving object mask (empty in some steps), from a camera
+walking and turning through the scene.
+
+Also times the tensor backed map (as_tensor=True) against the numpy one at 20 cm and 5 cm resolution with every
+output of the sensor (ego_only=False) turned into the float32 tensor that the preprocessor gets.
+tests/test_pointcloud_sensors.py checks that all of them give the same outputs.
+
+python scripts/benchmark_binned_point_cloud_map.py
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+from allenact.embodiedai.mapping.mapping_utils.point_cloud_utils import (
+    depth_frame_to_world_space_xyz,
+    project_point_cloud_to_map,
+)
+
+from ithor_arm.pointcloud_sensors import KianaBinnedPointCloudMapBuilder, rotate_points_to_agent
+
+SCREEN_SIZE = 224
+MAP_INFO = dict(fov=90, map_size_in_cm=1050, resolution_in_cm=20, height_bins=tuple([i * 0.2 for i in range(0, 10)]))
+MIN_XYZ = np.array([-2.5, 0., -2.5])
+
+
+def previous_update(builder, depth_frame, camera_xyz, camera_rotation, camera_horizon):
+    camera_xyz = torch.from_numpy(camera_xyz - builder.min_xyz).float().to(builder.device)
+    map_size = builder.binned_point_cloud_map.shape[0]
+
+    current_agent_location = torch.zeros(depth_frame.shape).to(builder.device)
+    current_agent_location[:] = float('nan')
+    current_agent_location[112, 112] = 0
+    current_agent_world_space_point_cloud = depth_frame_to_world_space_xyz(depth_frame=current_agent_location, camera_world_xyz=camera_xyz, rotation=camera_rotation, horizon=camera_horizon, fov=builder.fov)
+    current_agent_binned_indices = project_point_cloud_to_map(xyz_points=current_agent_world_space_point_cloud, bin_axis="y", bins=builder.height_bins, map_size=map_size, resolution_in_cm=builder.resolution_in_cm, flip_row_col=True).nonzero().squeeze(0)
+
+    depth_frame = torch.from_numpy(depth_frame).to(builder.device)
+    depth_frame[depth_frame == -1] = float('nan')
+    world_space_point_cloud = depth_frame_to_world_space_xyz(depth_frame=depth_frame, camera_world_xyz=camera_xyz, rotation=camera_rotation, horizon=camera_horizon, fov=builder.fov)
+    world_binned_map_update = project_point_cloud_to_map(xyz_points=world_space_point_cloud, bin_axis="y", bins=builder.height_bins, map_size=map_size, resolution_in_cm=builder.resolution_in_cm, flip_row_col=True)
+    agent_centric_point_cloud = rotate_points_to_agent(world_space_point_cloud, builder.device, camera_xyz, camera_rotation, builder.map_size_in_cm)
+    allocentric_update_numpy = world_binned_map_update.cpu().numpy()
+    builder.binned_point_cloud_map = builder.binned_point_cloud_map + allocentric_update_numpy
+    agent_centric_binned_map = project_point_cloud_to_map(xyz_points=agent_centric_point_cloud, bin_axis="y", bins=builder.height_bins, map_size=map_size, resolution_in_cm=builder.resolution_in_cm, flip_row_col=True)
+    copied_map = builder.binned_point_cloud_map.copy()
+    x, y, z = current_agent_binned_indices
+    copied_map[x, y, z] = -1
+    return {
+        "egocentric_update": agent_centric_binned_map.cpu().numpy(),
+        "allocentric_update": allocentric_update_numpy,
+        "map": builder.binned_point_cloud_map,
+        'map_with_agent': copied_map,
+    }
+
+
+def make_sequence(episode_length, full_frame, rng):
+    sequence = []
+    position, rotation = np.array([0.5, 0.9, 0.5]), 0.
+    row, col = rng.integers(0, SCREEN_SIZE - 40, 2)
+    for _ in range(episode_length):
+        if rng.random() < 0.5:
+            position = position + 0.25 * np.array([np.sin(np.deg2rad(rotation)), 0, np.cos(np.deg2rad(rotation))])
+            position = np.clip(position, 0, 2.5)
+        else:
+            rotation = (rotation + rng.choice([-30, 30])) % 360
+        depth_frame = rng.uniform(0, 5, (SCREEN_SIZE, SCREEN_SIZE)).astype(np.float32)
+        if not full_frame:
+            row, col = np.clip([row, col] + rng.integers(-8, 9, 2), 0, SCREEN_SIZE - 40)
+            mask = np.zeros_like(depth_frame, dtype=bool)
+            if rng.random() < 0.7:
+                mask[row: row + 40, col: col + 30] = True
+            depth_frame[~mask] = -1
+        sequence.append((depth_frame, position, rotation, float(rng.choice([0, 30, 60]))))
+    return sequence
+
+
+def replay(update, builder, sequence):
+    builder.reset(min_xyz=MIN_XYZ)
+    start = time.perf_counter()
+    results = [update(builder, depth_frame.copy(), position, rotation, horizon)
+               for depth_frame, position, rotation, horizon in sequence]
+    return results, len(sequence) / (time.perf_counter() - start)
+
+
+def as_float_tensors(outputs):
+    # what the numpy backed map costs on top of update, the tensor backed map hands over its tensors as they are
+    return {key: torch.as_tensor(value, dtype=torch.float32) for key, value in outputs.items()}
+
+
+def time_tensor_map(sequence, resolution_in_cm):
+    map_info = dict(MAP_INFO, resolution_in_cm=resolution_in_cm)
+    numpy_builder = KianaBinnedPointCloudMapBuilder(**map_info)
+    tensor_builder = KianaBinnedPointCloudMapBuilder(as_tensor=True, **map_info)
+    numpy_speed = replay(lambda builder, *step: as_float_tensors(builder.update(*step)), numpy_builder, sequence)[1]
+    tensor_speed = replay(KianaBinnedPointCloudMapBuilder.update, tensor_builder, sequence)[1]
+    print('    {} cm resolution ({}x{} map): numpy map + conversion {:6.1f} steps/s, tensor map {:6.1f} steps/s'.format(resolution_in_cm, *numpy_builder.map_shape[:2], numpy_speed, tensor_speed))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--episode_length', type=int, default=200)
+    args = parser.parse_args()
+
+    torch.set_num_threads(1)
+    rng = np.random.default_rng(0)
+    for full_frame in [False, True]:
+        sequence = make_sequence(args.episode_length, full_frame, rng)
+        _, previous_speed = replay(previous_update, KianaBinnedPointCloudMapBuilder(**MAP_INFO), sequence)
+        _, speed = replay(KianaBinnedPointCloudMapBuilder.update, KianaBinnedPointCloudMapBuilder(**MAP_INFO), sequence)
+        print('{}: previous builder {:6.1f} steps/s, incremental builder {:6.1f} steps/s'.format(
+            'every pixel with depth' if full_frame else 'object mask', previous_speed, speed))
+
+        for subsample in [2, 4]:
+            _, speed = replay(KianaBinnedPointCloudMapBuilder.update, KianaBinnedPointCloudMapBuilder(subsample=subsample, **MAP_INFO), sequence)
+            print('    subsample {}: {:6.1f} steps/s'.format(subsample, speed))
+        for resolution_in_cm in [20, 5]:
+            time_tensor_map(sequence, resolution_in_cm)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Times utils.batched_transformation_utils.depth_frame_to_camera_space_xyz_batched (cached CameraModel) against
+the previous implementation, which rebuilt the pixel grid every call and wrote NaN into its input, on a batch of
+224x224 frames. tests/test_batched_transformation_utils.py checks that they agree and checks non-square frames
+against a pinhole projection.
+
+python scripts/benchmark_camera_unprojection.py
+"""
+import argparse
+import math
+import timeit
+
+import torch
+
+from utils.batched_transformation_utils import depth_frame_to_camera_space_xyz_batched
+
+
+def previous_unprojection(depth_frame, mask, fov):
+    depth_frame[~mask] = float('nan')
+    resolution = depth_frame.shape[-1]
+    mask = torch.ones_like(depth_frame[0], dtype=bool)
+    camera_space_yx_offsets = torch.stack(torch.where(mask)) + 0.5
+    camera_space_yx_offsets -= resolution / 2.0
+    camera_space_yx_offsets[0, :] *= -1
+    camera_space_yx_offsets *= (2.0 / resolution) * torch.tan((fov[0] / 2) / 180 * math.pi)
+    camera_space_xyz = torch.cat(
+        [camera_space_yx_offsets[1:, :], camera_space_yx_offsets[:1, :], torch.ones_like(camera_space_yx_offsets[:1, :])],
+        axis=0,
+    )
+    return camera_space_xyz.repeat(depth_frame.shape[0], 1, 1) * depth_frame.reshape(depth_frame.shape[0], 1, -1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch_size', type=int, default=8)
+    parser.add_argument('--number', type=int, default=200)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    depth_frame = torch.rand(args.batch_size, 224, 224) * 5
+    mask = torch.rand(args.batch_size, 224, 224) < 0.3
+    fov = torch.full((args.batch_size,), 90.)
+
+    old = timeit.timeit(lambda: previous_unprojection(depth_frame.clone(), mask, fov), number=args.number) / args.number
+    new = timeit.timeit(lambda: depth_frame_to_camera_space_xyz_batched(depth_frame, mask, fov), number=args.number) / args.number
+    print('batch {} 224x224: previous {:.3f} ms, cached camera model {:.3f} ms ({:.1f}x)'.format(
+        args.batch_size, old * 1000, new * 1000, old / new))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Times ManipulaTHOREnvironment.step against a FakeController, so only the python side of a step
+(payload building, bookkeeping) is measured and not Unity.
+
+python scripts/benchmark_env_step.py --steps 20000
+"""
+import argparse
+import random
+import time
+
+from ithor_arm.ithor_arm_constants import MOVE_AHEAD, ROTATE_RIGHT, ROTATE_LEFT, MOVE_ARM_HEIGHT_P, MOVE_ARM_HEIGHT_M, \
+    MOVE_ARM_X_P, MOVE_ARM_X_M, MOVE_ARM_Z_P, MOVE_ARM_Z_M
+from ithor_arm.ithor_arm_environment import ManipulaTHOREnvironment
+from scripts.fake_controller import FakeController
+
+BENCHMARK_ACTIONS = [MOVE_AHEAD, ROTATE_RIGHT, ROTATE_LEFT, MOVE_ARM_HEIGHT_P, MOVE_ARM_HEIGHT_M, MOVE_ARM_X_P,
+                     MOVE_ARM_X_M, MOVE_ARM_Z_P, MOVE_ARM_Z_M]
+
+
+class FakeManipulaTHOREnvironment(ManipulaTHOREnvironment):
+    def create_controller(self):
+        return FakeController(**self.fake_controller_args)
+
+
+def make_fake_environment(env_args, **fake_controller_args):
+    FakeManipulaTHOREnvironment.fake_controller_args = fake_controller_args
+    return FakeManipulaTHOREnvironment(env_args=dict(commit_id='fake', **env_args))
+
+
+def steps_per_second(env, number_of_steps, seed=0):
+    rng = random.Random(seed)
+    actions = [dict(action=rng.choice(BENCHMARK_ACTIONS)) for _ in range(number_of_steps)]
+    start = time.perf_counter()
+    for action_dict in actions:
+        env.step(action_dict)
+    return number_of_steps / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--steps', type=int, default=10000)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--objects', type=int, default=50)
+    parser.add_argument('--noise', default=None, choices=[None, 'habitat', 'simple1d'])
+    args = parser.parse_args()
+
+    envs = {}
+    for copy_free_step in [False, True]:
+        env_args = dict(copy_free_step=copy_free_step)
+        if args.noise is not None:
+            env_args['motion_noise_type'] = args.noise
+            env_args['motion_noise_args'] = dict()
+        envs[copy_free_step] = make_fake_environment(env_args, number_of_objects=args.objects)
+
+    # interleave the runs and keep the best one, single runs are too noisy to compare
+    results = {copy_free_step: 0 for copy_free_step in envs}
+    for _ in range(args.repeats):
+        for copy_free_step, env in envs.items():
+            results[copy_free_step] = max(results[copy_free_step], steps_per_second(env, args.steps))
+    for copy_free_step, result in results.items():
+        print('copy_free_step={}: {:.1f} steps/sec'.format(copy_free_step, result))
+    print('speedup: {:.2f}x'.format(results[True] / results[False]))
+
+
+if __name__ == '__main__':
+    main()
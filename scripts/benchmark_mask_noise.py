@@ -0,0 +1,52 @@
+"""Throughput, in masks per second, of utils.mask_noise_utils.MaskNoise on 224x224 masks for a few batch sizes,
+next to the noise free baseline (the float copy every mask sensor makes) and to applying the same noise one mask
+at a time.
+
+python scripts/benchmark_mask_noise.py
+"""
+import argparse
+import time
+
+import numpy as np
+
+from utils.mask_noise_utils import MaskNoise
+
+SCREEN_SIZE = 224
+NOISE_SETTINGS = dict(dilation_erosion_percent=0.5, dropout_percent=0.1, false_positive_percent=0.2)
+
+
+def make_masks(batch_size, rng):
+    masks = np.zeros((batch_size, SCREEN_SIZE, SCREEN_SIZE, 1))
+    for mask in masks:
+        row, col = rng.integers(0, SCREEN_SIZE - 60, 2)
+        mask[row: row + rng.integers(5, 60), col: col + rng.integers(5, 60)] = 1
+    return masks
+
+
+def masks_per_second(function, masks, seconds):
+    number_of_masks = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        function(masks)
+        number_of_masks += len(masks)
+    return number_of_masks / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=2)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    mask_noise = MaskNoise(seed=0, **NOISE_SETTINGS)
+    for batch_size in [1, 16, 128]:
+        masks = make_masks(batch_size, rng)
+        baseline = masks_per_second(lambda batch: batch.astype(np.float64), masks, args.seconds)
+        one_at_a_time = masks_per_second(lambda batch: [mask_noise(mask[None]) for mask in batch], masks, args.seconds)
+        batched = masks_per_second(mask_noise, masks, args.seconds)
+        print('batch {:3d}: noise free {:8.0f} masks/s, one at a time {:6.0f} masks/s, batched {:6.0f} masks/s'.format(
+            batch_size, baseline, one_at_a_time, batched))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Times utils.object_mask_utils.MaskRegion against the regions NoisyObjectRegion computed before (cv2.resize to
+14x14, > 0.1, np.repeat by 16). tests/test_object_mask_utils.py checks that they are bit-exactly the same, for
+binary masks, sparse masks and the fractional masks left by a bilinear resize.
+
+python scripts/benchmark_mask_region.py
+"""
+import argparse
+import timeit
+
+import cv2
+import numpy as np
+
+from utils.object_mask_utils import MaskRegion
+
+REGION_SIZE = 14
+NUMBER_OF_REPEAT = 16
+SCREEN_SIZE = REGION_SIZE * NUMBER_OF_REPEAT
+
+
+def previous_region(mask):
+    region = cv2.resize(mask, (REGION_SIZE, REGION_SIZE))
+    region = (region > 0.1).astype(float).reshape(REGION_SIZE, REGION_SIZE, 1)
+    return region.repeat(NUMBER_OF_REPEAT, axis=0).repeat(NUMBER_OF_REPEAT, axis=1)
+
+
+def make_mask(kind, rng):
+    if kind == 'binary':
+        mask = np.zeros((SCREEN_SIZE, SCREEN_SIZE))
+        row, col = rng.integers(0, SCREEN_SIZE - 40, 2)
+        mask[row: row + rng.integers(1, 40), col: col + rng.integers(1, 40)] = 1
+    elif kind == 'sparse':
+        mask = (rng.random((SCREEN_SIZE, SCREEN_SIZE)) < rng.random() * 0.05).astype(np.float64)
+    else:
+        mask = cv2.resize((rng.random((300, 300)) < 0.01).astype(np.float64), (SCREEN_SIZE, SCREEN_SIZE))
+    return mask.reshape(SCREEN_SIZE, SCREEN_SIZE, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for dtype in [np.float64, np.uint8, np.bool_]:
+        mask_region = MaskRegion(REGION_SIZE, NUMBER_OF_REPEAT, dtype=dtype)
+        mask = make_mask('binary', rng)
+        old = timeit.timeit(lambda: previous_region(mask), number=args.number) / args.number
+        new = timeit.timeit(lambda: mask_region.region(mask), number=args.number) / args.number
+        print('{:8s}: previous {:.3f} ms, MaskRegion {:.3f} ms ({:.1f}x), {} bytes per region instead of {}'.format(
+            np.dtype(dtype).name, old * 1000, new * 1000, old / new, mask_region.region(mask).nbytes,
+            previous_region(mask).nbytes))
+
+
+if __name__ == '__main__':
+    main()
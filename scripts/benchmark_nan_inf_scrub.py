@@ -0,0 +1,59 @@
+"""Times utils.nan_inf_utils.scrub_nan_inf against the previous isnan/isinf masking, on depth frames of the
+sizes the sensors see: 224x224, the cropped Kinect and Intel frames and the full 720p camera resolutions,
+clean and with a few NaN/inf pixels.
+
+python scripts/benchmark_nan_inf_scrub.py
+"""
+import argparse
+import timeit
+
+import numpy as np
+
+from utils.nan_inf_utils import scrub_nan_inf
+from utils.stretch_utils.stretch_constants import INTEL_RESIZED_W, INTEL_RESIZED_H, KINECT_RESIZED_W, \
+    KINECT_RESIZED_H
+
+FRAME_SIZES = {
+    '224x224': (224, 224),
+    'kinect': (KINECT_RESIZED_H, KINECT_RESIZED_W),
+    'intel': (INTEL_RESIZED_H, INTEL_RESIZED_W),
+    'kinect full': (720, 1280),
+    'intel full': (1280, 720),
+}
+
+
+def masked_scrub(frame):
+    should_be_removed = np.isinf(frame) + np.isnan(frame)
+    frame[should_be_removed] = 0
+    return frame
+
+
+def make_frame(shape, number_of_bad_pixels, rng):
+    frame = rng.uniform(0, 5, shape).astype(np.float32)
+    bad = rng.choice(frame.size, number_of_bad_pixels, replace=False)
+    frame.reshape(-1)[bad[::2]] = np.nan
+    frame.reshape(-1)[bad[1::2]] = np.inf
+    return frame
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for name, shape in FRAME_SIZES.items():
+        for number_of_bad_pixels in [0, 10]:
+            frame = make_frame(shape, number_of_bad_pixels, rng)
+            expected = masked_scrub(frame.copy())
+            result = scrub_nan_inf(frame.copy())
+            assert result.dtype == np.float32 and np.array_equal(result, expected)
+            # both include the copy every sensor makes of the event's frame
+            old = timeit.timeit(lambda: masked_scrub(frame.copy()), number=args.number) / args.number
+            new = timeit.timeit(lambda: scrub_nan_inf(frame.copy()), number=args.number) / args.number
+            print('{:11s} {}x{} bad pixels {:3d}: masked {:.3f} ms, scrub_nan_inf {:.3f} ms ({:.1f}x)'.format(
+                name, shape[0], shape[1], number_of_bad_pixels, old * 1000, new * 1000, old / new))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Times the per step drifts of the simple1d and habitat noise models with and without a
+utils.noise_pool_utils.NoisePool. tests/test_noise_pool_utils.py checks that pooled noise replays exactly by
+(seed, episode, step) and has the right distributions.
+
+python scripts/benchmark_noise_pool.py
+"""
+import argparse
+import timeit
+
+import numpy as np
+
+from ithor_arm.ithor_arm_noise_models import NoiseInMotionHabitatFlavor, NoiseInMotionSimple1DNormal
+from utils.noise_pool_utils import NoisePool
+
+SIMPLE1D_ARGS = dict(
+    ahead_noise_meta_dist_params={'bias_dist': [0, 0.04], 'variance_dist': [0, 0.10]},
+    lateral_noise_meta_dist_params={'bias_dist': [0, 0.04], 'variance_dist': [0, 0.04]},
+    turning_noise_meta_dist_params={'bias_dist': [0, 10], 'variance_dist': [0, 10]},
+)
+HABITAT_ARGS = dict(multiplier_means=[1, 1, 1, 1, 1, 1], multiplier_sigmas=[0.1] * 7)
+
+
+def make_models(pool):
+    models = [NoiseInMotionSimple1DNormal(**SIMPLE1D_ARGS), NoiseInMotionHabitatFlavor(**HABITAT_ARGS)]
+    for model in models:
+        model.use_noise_pool(pool)
+    return models
+
+
+def episode_drifts(model, pool, episode, steps, start_step=0):
+    pool.start_episode(episode)
+    model.reset_noise_model()
+    drifts = []
+    for step in range(start_step, steps):
+        pool.start_step(step)
+        drifts.append(model.get_ahead_drift(0.2) if step % 3 == 0 else model.get_rotate_drift())
+    return np.array(drifts, dtype=np.float64)
+
+
+def time_drifts(number):
+    for with_pool in [False, True]:
+        pool = NoisePool(0) if with_pool else None
+        models = [NoiseInMotionSimple1DNormal(**SIMPLE1D_ARGS), NoiseInMotionHabitatFlavor(**HABITAT_ARGS, seed=0)]
+        for model in models:
+            if pool is not None:
+                pool.start_episode()
+                model.use_noise_pool(pool)
+            model.reset_noise_model()
+            step = iter(range(10 ** 9))
+
+            def drift():
+                if pool is not None:
+                    pool.start_step(next(step))
+                model.get_ahead_drift(0.2)
+
+            seconds = timeit.timeit(drift, number=number) / number
+            print('{:<28} {:<10} {:.2f} us/step'.format(type(model).__name__, 'pool' if with_pool else 'no pool',
+                                                       seconds * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=20000)
+    args = parser.parse_args()
+
+    time_drifts(args.number)
+
+
+if __name__ == '__main__':
+    main()
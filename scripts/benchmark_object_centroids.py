@@ -0,0 +1,66 @@
+"""Times one step of object centroid estimation for the Stretch pointnav emulator sensors (source and destination
+masks on the Intel and on the Kinect depth frames): get_mid_point_of_object_from_depth_and_mask once per sensor
+against utils.object_centroid_utils.ObjectCentroidEstimator. tests/test_object_centroid_utils.py checks that the
+centroids match.
+
+python scripts/benchmark_object_centroids.py
+"""
+import argparse
+import timeit
+
+import numpy as np
+import torch
+
+from utils.calculation_utils import get_mid_point_of_object_from_depth_and_mask
+from utils.object_centroid_utils import ObjectCentroidEstimator
+
+SCREEN_SIZE = 224
+MIN_XYZ = np.zeros(3)
+DEVICE = torch.device('cpu')
+# camera pose and fov of each of the two cameras
+CAMERAS = {
+    'intel': (np.array([1.0, 1.2, 2.0]), 30., 30., 59.),
+    'kinect': (np.array([1.1, 1.4, 2.1]), 120., 45., 90.),
+}
+
+
+def make_depth_frame(rng):
+    depth_frame = rng.uniform(0.3, 4, (SCREEN_SIZE, SCREEN_SIZE)).astype(np.float32)
+    depth_frame[rng.random(depth_frame.shape) < 0.05] = 0
+    return depth_frame
+
+
+def make_mask(rng):
+    mask = np.zeros((SCREEN_SIZE, SCREEN_SIZE, 1))
+    row, col = rng.integers(0, SCREEN_SIZE - 60, 2)
+    mask[row: row + rng.integers(5, 60), col: col + rng.integers(5, 60)] = 1
+    return mask
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=100)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    depth_frames = {camera: make_depth_frame(rng) for camera in CAMERAS}
+    masks = {camera: [make_mask(rng), make_mask(rng)] for camera in CAMERAS}
+    estimator = ObjectCentroidEstimator()
+
+    def per_sensor():
+        return [get_mid_point_of_object_from_depth_and_mask(mask, depth_frames[camera], MIN_XYZ, *CAMERAS[camera], DEVICE)
+                for camera in CAMERAS for mask in masks[camera]]
+
+    def shared():
+        estimator.start_step(object())
+        return [estimator.centroid(mask, depth_frames[camera], MIN_XYZ, *CAMERAS[camera], DEVICE)[0]
+                for camera in CAMERAS for mask in masks[camera]]
+
+    old = timeit.timeit(per_sensor, number=args.number) / args.number
+    new = timeit.timeit(shared, number=args.number) / args.number
+    print('4 sensors, 2 cameras: per sensor {:.2f} ms/step, ObjectCentroidEstimator {:.2f} ms/step ({:.1f}x)'.format(
+        old * 1000, new * 1000, old / new))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Times utils.object_mask_utils.ObjectMaskAtResolution against the previous per step path of the mask sensors
+(full resolution instance mask -> float copy -> cv2.resize), for the segmentation frame sizes the sensors see.
+tests/test_object_mask_utils.py checks that the masks are the ones cv2.INTER_NEAREST gives.
+
+python scripts/benchmark_object_mask.py
+"""
+import argparse
+import timeit
+
+import cv2
+import numpy as np
+
+from utils.object_mask_utils import ObjectMaskAtResolution
+
+# (segmentation frame, sensor output)
+RESOLUTIONS = {
+    'same size': ((224, 224), (224, 224)),
+    'downsampled': ((720, 720), (224, 224)),
+    'non square': ((1280, 720), (224, 224)),
+}
+OBJECT_COLOR = (12, 34, 56)
+
+
+def make_segmentation_frame(shape, rng):
+    frame = rng.integers(0, 4, (shape[0], shape[1], 3), dtype=np.uint8)
+    # a blob of the object in the middle of the frame
+    frame[shape[0] // 3: shape[0] // 2, shape[1] // 4: shape[1] // 2] = OBJECT_COLOR
+    return frame
+
+
+def previous_mask(segmentation_frame, width, height):
+    # what event.instance_masks[object_id] builds on access, then the sensor's float copy and resize
+    mask_frame = np.all(segmentation_frame == np.array(OBJECT_COLOR, dtype=np.uint8), axis=-1)
+    result = np.expand_dims(mask_frame.astype(np.float64), axis=-1)
+    if result.shape[:2] == (width, height):
+        return result
+    return cv2.resize(result, (height, width)).reshape(width, height, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for name, (source_shape, (width, height)) in RESOLUTIONS.items():
+        segmentation_frame = make_segmentation_frame(source_shape, rng)
+        mask_at_resolution = ObjectMaskAtResolution(width, height)
+        output = np.zeros((width, height, 1))
+
+        def new_mask():
+            np.copyto(output[:, :, 0], mask_at_resolution.mask(segmentation_frame, OBJECT_COLOR))
+            return output
+
+        old = timeit.timeit(lambda: previous_mask(segmentation_frame, width, height), number=args.number) / args.number
+        new = timeit.timeit(new_mask, number=args.number) / args.number
+        print('{:11s} {}x{} -> {}x{}: previous {:.3f} ms, ObjectMaskAtResolution {:.3f} ms ({:.1f}x)'.format(
+            name, source_shape[0], source_shape[1], width, height, old * 1000, new * 1000, old / new))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Checks the binning backends of utils.batched_transformation_utils.project_point_cloud_to_map_batched against the
+previous implementation (a bincount weighted by validity over every point, invalid points included) and times them
+on CPU for map sizes from 100x100 to 800x800, on a batch of masked 224x224 point clouds as the object displacement
+map model bins them.
+
+python scripts/benchmark_point_cloud_binning.py
+"""
+import argparse
+import timeit
+
+import torch
+
+from utils.batched_transformation_utils import project_point_cloud_to_map_batched
+
+BINS = [0.02, 2.0]
+RESOLUTION_IN_CM = 5
+BACKENDS = ['bincount', 'sparse'] + (['scatter_reduce'] if hasattr(torch.Tensor, 'scatter_reduce_') else [])
+
+
+def previous_binning(xyz_points, bins, map_size, resolution_in_cm):
+    # bin_axis="y", flip_row_col=True
+    xyz_points = xyz_points.reshape([xyz_points.shape[0], 1, *xyz_points.shape[1:]])
+    num_clouds, h, w, _ = xyz_points.shape
+    uvw_points = torch.stack([xyz_points[..., i] for i in [2, 0, 1]], dim=-1)
+    num_bins = len(bins) + 1
+    isnotnan = ~torch.isnan(xyz_points[..., 0])
+    uvw_points_binned = torch.cat(
+        (
+            torch.round(100 * uvw_points[..., :-1] / resolution_in_cm).long(),
+            torch.bucketize(uvw_points[..., -1:].contiguous(), boundaries=uvw_points.new(bins)),
+        ),
+        dim=-1,
+    )
+    maxes = xyz_points.new().long().new([map_size, map_size, num_bins]).reshape((1, 1, 1, 3))
+    isvalid = torch.logical_and(
+        torch.logical_and((uvw_points_binned >= 0).all(-1), (uvw_points_binned < maxes).all(-1)), isnotnan,
+    )
+    uvw_points_binned_with_index_mat = torch.cat(
+        (
+            torch.repeat_interleave(torch.arange(0, num_clouds).to(xyz_points.device), h * w).reshape(-1, 1),
+            uvw_points_binned.reshape(-1, 3),
+        ),
+        dim=1,
+    )
+    uvw_points_binned_with_index_mat[~isvalid.reshape(-1), :] = 0
+    ind = (
+        uvw_points_binned_with_index_mat[:, 0] * (map_size * map_size * num_bins)
+        + uvw_points_binned_with_index_mat[:, 1] * (map_size * num_bins)
+        + uvw_points_binned_with_index_mat[:, 2] * num_bins
+        + uvw_points_binned_with_index_mat[:, 3]
+    )
+    ind[~isvalid.reshape(-1)] = 0
+    count = torch.bincount(ind.view(-1), isvalid.view(-1).long(), minlength=num_clouds * map_size * map_size * num_bins)
+    return count.view(num_clouds, map_size, map_size, num_bins)
+
+
+def make_point_clouds(batch_size, map_size, masked_percent):
+    # points spread over the whole map (a few of them outside of it), NaN where the mask is off
+    extent = map_size * RESOLUTION_IN_CM / 100
+    xyz_points = torch.rand(batch_size, 224 * 224, 3) * torch.tensor([extent * 1.05, 2.5, extent * 1.05])
+    xyz_points[torch.rand(batch_size, 224 * 224) < masked_percent] = float('nan')
+    return xyz_points
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch_size', type=int, default=4)
+    parser.add_argument('--masked_percent', type=float, default=0.9)
+    parser.add_argument('--number', type=int, default=20)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    torch.set_num_threads(1)
+    for map_size in [100, 200, 400, 800]:
+        xyz_points = make_point_clouds(args.batch_size, map_size, args.masked_percent)
+        expected = previous_binning(xyz_points, BINS, map_size, RESOLUTION_IN_CM)
+        timings = [timeit.timeit(lambda: previous_binning(xyz_points, BINS, map_size, RESOLUTION_IN_CM),
+                                 number=args.number) / args.number]
+        for backend in BACKENDS:
+            binned = project_point_cloud_to_map_batched(xyz_points, 'y', BINS, map_size, RESOLUTION_IN_CM, True, backend)
+            assert binned.dtype == expected.dtype and torch.equal(binned, expected), backend
+            timings.append(timeit.timeit(
+                lambda: project_point_cloud_to_map_batched(xyz_points, 'y', BINS, map_size, RESOLUTION_IN_CM, True, backend),
+                number=args.number) / args.number)
+        print('map {:3d}x{:3d}: previous {:7.2f} ms, '.format(map_size, map_size, timings[0] * 1000) + ', '.join(
+            '{} {:7.2f} ms'.format(backend, timing * 1000) for backend, timing in zip(BACKENDS, timings[1:])))
+
+
+if __name__ == '__main__':
+    main()
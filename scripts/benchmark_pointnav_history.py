@@ -0,0 +1,57 @@
+"""Times utils.calculation_utils.RecencyWeightedPointHistory against the list of tensors the pointnav emulator
+sensors used to re-sum every step, over long episodes in which the object is seen at random steps: the time per
+step should stay flat towards the end of the episode. tests/test_calculation_utils.py checks that the averages
+match.
+
+python scripts/benchmark_pointnav_history.py
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from utils.calculation_utils import RecencyWeightedPointHistory
+
+
+def previous_aggregation(pointnav_history_aggr, current_step_number):
+    weights = [1. / (current_step_number + 1 - num_steps) for mid, num_pixels, num_steps in pointnav_history_aggr]
+    total_weights = sum(weights)
+    total_sum = [mid * (1. / (current_step_number + 1 - num_steps)) for mid, num_pixels, num_steps in pointnav_history_aggr]
+    total_sum = sum(total_sum)
+    return total_sum / total_weights
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--episode_length', type=int, default=500)
+    parser.add_argument('--visible_percent', type=float, default=0.7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    midpoints = torch.tensor(rng.uniform(-3, 3, (args.episode_length, 3)), dtype=torch.float32)
+    visible = rng.random(args.episode_length) < args.visible_percent
+
+    previous_history, history = [], RecencyWeightedPointHistory()
+    previous_times, times = [], []
+    for step in range(args.episode_length):
+        start = time.perf_counter()
+        if visible[step]:
+            previous_history.append((midpoints[step], 1, step))
+        if previous_history:
+            previous_aggregation(previous_history, step)
+        previous_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        if visible[step]:
+            history.append(midpoints[step], step)
+        history.weighted_average(step)
+        times.append(time.perf_counter() - start)
+
+    for first, last in [(0, 50), (args.episode_length - 50, args.episode_length)]:
+        print('steps {:3d}-{:3d}: list re-sum {:.3f} ms/step, RecencyWeightedPointHistory {:.3f} ms/step'.format(
+            first, last, np.mean(previous_times[first:last]) * 1000, np.mean(times[first:last]) * 1000))
+
+
+if __name__ == '__main__':
+    main()
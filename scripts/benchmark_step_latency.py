@@ -0,0 +1,44 @@
+"""Controller calls and latency per step without motion noise, with zero drifts (simple1d without parameters,
+whose drifts are skipped) and with habitat noise. The FakeController sleeps --round-trip-latency seconds per
+call in place of Unity, so the differences are what the drift calls cost.
+
+python scripts/benchmark_step_latency.py --steps 500 --round-trip-latency 0.005
+"""
+import argparse
+import random
+from collections import deque
+
+import numpy as np
+
+from ithor_arm.ithor_arm_constants import MOVE_AHEAD, ROTATE_RIGHT, ROTATE_LEFT, MOVE_ARM_HEIGHT_P, MOVE_ARM_HEIGHT_M
+from scripts.benchmark_env_step import make_fake_environment
+
+LATENCY_ACTIONS = [MOVE_AHEAD, MOVE_AHEAD, ROTATE_RIGHT, ROTATE_LEFT, MOVE_ARM_HEIGHT_P, MOVE_ARM_HEIGHT_M]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--steps', type=int, default=500)
+    parser.add_argument('--round-trip-latency', type=float, default=0.005)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    actions = [rng.choice(LATENCY_ACTIONS) for _ in range(args.steps)]
+    for noise in [None, 'simple1d', 'habitat']:
+        np.random.seed(args.seed)
+        env_args = dict() if noise is None else dict(motion_noise_type=noise, motion_noise_args=dict())
+        env = make_fake_environment(env_args, round_trip_latency=args.round_trip_latency)
+        env.step_latencies = deque(maxlen=len(actions))
+        calls_before = env.controller.step_count
+        for action in actions:
+            env.step(dict(action=action))
+        latencies = np.array(env.step_latencies) * 1000
+        print('noise={}: {:.2f} controller calls/step, step latency mean {:.2f} ms, '
+              'p50 {:.2f} ms, p95 {:.2f} ms'.format(
+                  noise, (env.controller.step_count - calls_before) / len(actions),
+                  latencies.mean(), np.percentile(latencies, 50), np.percentile(latencies, 95)))
+
+
+if __name__ == '__main__':
+    main()
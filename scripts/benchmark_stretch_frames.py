@@ -0,0 +1,66 @@
+"""Counts how often StretchManipulaTHOREnvironment processes its camera frames while the frame sensors of
+a typical Stretch config read them, and times those reads. With the per-event memo each camera property
+is computed once per step, however many sensors read it, except kinect_depth, which draws its own noise mask
+per read unless --share-kinect-depth-noise is set.
+
+If allenact's vision sensors do not import (e.g. with a moviepy that has no moviepy.editor), the camera
+properties those sensors read are read directly instead.
+
+python scripts/benchmark_stretch_frames.py --steps 200
+"""
+import argparse
+import time
+
+from scripts.fake_controller import FakeController
+from utils.stretch_utils.stretch_constants import MOVE_ARM_HEIGHT_P, MOVE_ARM_HEIGHT_M
+from utils.stretch_utils.stretch_ithor_arm_environment import StretchManipulaTHOREnvironment
+
+
+class FakeStretchManipulaTHOREnvironment(StretchManipulaTHOREnvironment):
+    def create_checked_controller(self):
+        return FakeController(scene_name='Procedural', width=self.frame_size, height=self.frame_size)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--steps', type=int, default=200)
+    parser.add_argument('--frame-size', type=int, default=224)
+    parser.add_argument('--share-kinect-depth-noise', action='store_true')
+    args = parser.parse_args()
+
+    FakeStretchManipulaTHOREnvironment.frame_size = args.frame_size
+    env = FakeStretchManipulaTHOREnvironment(
+        env_args=dict(commit_id='fake', share_kinect_depth_noise=args.share_kinect_depth_noise))
+    env.reset('Procedural')
+    # two consumers per camera, as in the configs that use both the raw depth and the depth sensors
+    try:
+        from utils.stretch_utils.stretch_thor_sensors import RGBSensorStretchIntel, DepthSensorStretchIntel, \
+            RGBSensorStretchKinect, DepthSensorStretchKinect, IntelRawDepthSensor, KinectRawDepthSensor
+        sensors = [
+            RGBSensorStretchIntel(height=224, width=224, uuid='rgb_lowres'),
+            DepthSensorStretchIntel(height=224, width=224, use_normalization=True, uuid='depth_lowres'),
+            RGBSensorStretchKinect(height=224, width=224, uuid='rgb_lowres_arm'),
+            DepthSensorStretchKinect(height=224, width=224, use_normalization=True, uuid='depth_lowres_arm'),
+            IntelRawDepthSensor(),
+            KinectRawDepthSensor(),
+        ]
+        reads = [lambda sensor=sensor: sensor.get_observation(env, None) for sensor in sensors]
+    except ImportError as e:
+        print('reading the camera properties directly, the sensors do not import: {}'.format(e))
+        reads = [lambda name=name: getattr(env, name) for name in
+                 ['intel_frame', 'intel_depth', 'kinect_frame', 'kinect_depth', 'intel_depth', 'kinect_depth']]
+
+    computations_before = env.frame_computations
+    read_time = 0.0
+    for i in range(args.steps):
+        env.step(dict(action=[MOVE_ARM_HEIGHT_P, MOVE_ARM_HEIGHT_M][i % 2]))
+        start = time.perf_counter()
+        for read in reads:
+            read()
+        read_time += time.perf_counter() - start
+    print('{} reads, {:.2f} processed frames per step, {:.3f} ms of reads per step'.format(
+        len(reads), (env.frame_computations - computations_before) / args.steps, read_time / args.steps * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Times a sample of utils.noise_from_habitat._TruncatedMultivariateGaussian, which serves samples from blocks drawn
+at once, against the previous sampler (one scipy truncnorm.rvs call per element), and a step of
+ithor_arm.ithor_arm_noise_models.NoiseInMotionHabitatFlavor. tests/test_noise_from_habitat.py checks that both
+sample the same distribution.
+
+python scripts/benchmark_truncated_gaussian.py
+"""
+import argparse
+import timeit
+
+import numpy as np
+import scipy.stats
+
+from ithor_arm.ithor_arm_noise_models import NoiseInMotionHabitatFlavor
+from utils.noise_from_habitat import _TruncatedMultivariateGaussian
+
+HABITAT_MODELS = [([0.074, 0.036], [0.019, 0.033]), ([0.189], [0.038]), ([0.002, 0.003], [0.0, 0.002]), ([0.219], [0.019])]
+
+
+def previous_sample(model, truncation=None):
+    sample = np.zeros_like(model.mean)
+    for i in range(len(model.mean)):
+        stdev = np.sqrt(model.cov[i, i])
+        mean = model.mean[i]
+        a, b = -3, 3
+        if truncation is not None and truncation[i] is not None:
+            trunc = truncation[i]
+            if trunc[0] is not None:
+                a = max((trunc[0] - mean) / stdev, a)
+            if trunc[1] is not None:
+                b = min((trunc[1] - mean) / stdev, b)
+        sample[i] = scipy.stats.truncnorm.rvs(a, b, mean, stdev)
+    return sample
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=2000)
+    args = parser.parse_args()
+
+    model = _TruncatedMultivariateGaussian(*HABITAT_MODELS[0])
+    old = timeit.timeit(lambda: previous_sample(model), number=args.number) / args.number
+    new = timeit.timeit(model.sample, number=args.number) / args.number
+    print('one 2d sample: previous {:.1f} us, buffered {:.1f} us'.format(old * 1e6, new * 1e6))
+    noise_model = NoiseInMotionHabitatFlavor()
+    step = timeit.timeit(lambda: (noise_model.get_ahead_drift(), noise_model.get_rotate_drift()), number=args.number) / args.number
+    print('NoiseInMotionHabitatFlavor ahead and rotate drift: {:.1f} us'.format(step * 1e6))
+
+
+if __name__ == '__main__':
+    main()
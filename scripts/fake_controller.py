@@ -0,0 +1,117 @@
+"""A stand-in for the ai2thor Controller that does no rendering, used to time and sanity check the
+environment wrappers without a Unity build."""
+import copy
+import math
+import time
+
+import numpy as np
+
+
+class FakeEvent:
+    def __init__(self, metadata, width=224, height=224):
+        self.metadata = metadata
+        self.frame = np.zeros((height, width, 3), dtype=np.uint8)
+        self.depth_frame = np.ones((height, width), dtype=np.float32)
+        self.instance_segmentation_frame = np.zeros((height, width, 3), dtype=np.uint8)
+        self.object_id_to_color = {}
+        self.third_party_camera_frames = [self.frame]
+        self.third_party_depth_frames = [self.depth_frame]
+        self.third_party_instance_segmentation_frames = [self.instance_segmentation_frame]
+
+
+def _initial_metadata(scene_name, number_of_objects):
+    objects = [
+        dict(
+            objectId="Object|{}".format(i),
+            objectType="Object",
+            position=dict(x=0.1 * i, y=0.9, z=-0.1 * i),
+            rotation=dict(x=0.0, y=0.0, z=0.0),
+            breakable=False,
+            visible=False,
+        )
+        for i in range(number_of_objects)
+    ]
+    joints = [
+        dict(name="robot_arm_{}_jnt".format(i + 1), position=dict(x=0.0, y=0.8, z=0.0),
+             rootRelativePosition=dict(x=0.0, y=0.0, z=0.0))
+        for i in range(4)
+    ]
+    return dict(
+        sceneName=scene_name,
+        lastActionSuccess=True,
+        errorMessage="",
+        actionReturn=None,
+        agent=dict(position=dict(x=0.0, y=0.9009995460510254, z=0.0), rotation=dict(x=0.0, y=0.0, z=0.0),
+                   cameraHorizon=0.0, isStanding=True),
+        objects=objects,
+        inventoryObjects=[],
+        arm=dict(joints=joints, heldObjects=[], pickupableObjects=[], handSphereCenter=dict(x=0.0, y=0.0, z=0.0)),
+    )
+
+
+class FakeController:
+    """Answers the subset of controller actions the environment wrappers issue. Agent motion is
+    integrated on a plane so trajectories are meaningful; every other action is a successful no-op.
+
+    `fail_on` is a set of action names that raise a RuntimeError when stepped, which is how a Unity
+    crash is simulated. `round_trip_latency` seconds are slept on every step to stand in for the time a
+    request to Unity takes.
+    """
+
+    def __init__(self, scene_name="Procedural", number_of_objects=50, width=224, height=224,
+                 fail_on=None, round_trip_latency=0.0, **kwargs):
+        self.width = width
+        self.height = height
+        self.fail_on = set() if fail_on is None else set(fail_on)
+        self.round_trip_latency = round_trip_latency
+        self.number_of_steps = 0
+        self.steps_by_action = {}
+        self.stopped = False
+        self.reachable_positions = [
+            dict(x=0.25 * i, y=0.9009995460510254, z=0.25 * j) for i in range(-8, 9) for j in range(-8, 9)
+        ]
+        self.last_event = FakeEvent(_initial_metadata(scene_name, number_of_objects), width, height)
+
+    def reset(self, scene=None, **kwargs):
+        if "reset" in self.fail_on:
+            raise RuntimeError("FakeController asked to fail on reset")
+        self.last_event = FakeEvent(_initial_metadata(scene, len(self.last_event.metadata["objects"])),
+                                    self.width, self.height)
+        return self.last_event
+
+    def stop(self):
+        self.stopped = True
+
+    def step(self, action=None, **action_args):
+        if isinstance(action, dict):
+            action = dict(action)
+        else:
+            action = dict(action=action)
+        action.update(action_args)
+        name = action["action"]
+        if name in self.fail_on:
+            raise RuntimeError("FakeController asked to fail on {}".format(name))
+        self.number_of_steps += 1
+        if self.round_trip_latency > 0:
+            time.sleep(self.round_trip_latency)
+        self.steps_by_action[name] = self.steps_by_action.get(name, 0) + 1
+
+        metadata = self.last_event.metadata
+        agent = metadata["agent"]
+        metadata["lastActionSuccess"] = True
+        metadata["actionReturn"] = None
+        if name == "MoveAgent":
+            rotation = math.radians(agent["rotation"]["y"])
+            ahead, right = action.get("ahead", 0.0), action.get("right", 0.0)
+            agent["position"]["x"] += ahead * math.sin(rotation) + right * math.cos(rotation)
+            agent["position"]["z"] += ahead * math.cos(rotation) - right * math.sin(rotation)
+        elif name == "RotateAgent":
+            agent["rotation"]["y"] = (agent["rotation"]["y"] + action["degrees"]) % 360
+        elif name == "TeleportFull":
+            agent["position"] = dict(x=action["x"], y=action["y"], z=action["z"])
+            agent["rotation"] = dict(action["rotation"])
+            agent["cameraHorizon"] = action["horizon"]
+        elif name == "GetReachablePositions":
+            metadata["actionReturn"] = copy.deepcopy(self.reachable_positions)
+        self.last_event = FakeEvent(metadata, self.width, self.height)
+        return self.last_event
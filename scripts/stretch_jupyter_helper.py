@@ -11,6 +11,7 @@ import numpy as np
 from pyquaternion import Quaternion
 
 from manipulathor_utils.debugger_util import ForkedPdb, visualize_current_frames
+from utils.nan_inf_utils import scrub_nan_inf
 from utils.stretch_utils.stretch_constants import INTEL_FOV_W, INTEL_FOV_H, KINECT_FOV_W, KINECT_FOV_H
 
 ADITIONAL_ARM_ARGS = {
@@ -321,15 +322,7 @@ def find_arm_distance_to_obj(controller, object_type):
     return distance
 
 def remove_nan_inf_for_frames(frame, type_of_frame=''):
-
-    is_nan = (frame != frame)
-    is_inf = np.isinf(frame)
-    if np.any(is_nan) or np.any(is_inf):
-        mask = is_nan + is_inf
-        print('Found nan ', type_of_frame, mask.sum())
-        frame[mask] = 0
-
-    return frame
+    return scrub_nan_inf(frame, type_of_frame)
 
 
 # def old_execute_command(controller, command,action_dict_addition):
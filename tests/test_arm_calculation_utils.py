@@ -0,0 +1,74 @@
+"""convert_world_to_agent_coordinate and convert_world_to_agent_coordinate_batched must give the positions and
+rotations of the previous implementation, which built scipy rotations and a 4x4 matrix per call and scanned the
+inverses saved every 45 degrees, for yaws on and off the 45 degree grid, negative and past 360."""
+import math
+import warnings
+
+import numpy as np
+import pytest
+import torch
+
+from ithor_arm.arm_calculation_utils import _quantized_yaw, convert_world_to_agent_coordinate, \
+    convert_world_to_agent_coordinate_batched
+from scripts.benchmark_agent_coordinates import as_dict, previous_conversion, saved_inverse_rotation_mats
+
+
+def make_yaws(rng):
+    # within 5 degrees of a multiple of 45 in [0, 360] the yaws snap to it, exactly 5 degrees away they do not
+    grid = np.arange(-90, 451, 45)
+    return np.concatenate([
+        np.arange(-90, 451, 15),
+        rng.uniform(-720, 720, 200),
+        np.arange(0, 361, 45) + rng.uniform(-4.9, 4.9, 9),
+        grid + 4.999, grid - 4.999, grid + 5, grid - 5,
+        [22.5, -22.5, 337.5, 382.5, -0.0],
+    ])
+
+
+def previous_snapped_yaw(deg):
+    for k in saved_inverse_rotation_mats.keys():
+        if abs(k - deg) < 5:
+            return k % 360
+    return deg
+
+
+def test_quantized_yaw_snaps_as_the_saved_inverses():
+    for yaw in make_yaws(np.random.default_rng(0)):
+        assert _quantized_yaw(float(yaw)) == previous_snapped_yaw(yaw), yaw
+    assert math.isnan(_quantized_yaw(float('nan')))
+
+
+def test_convert_world_to_agent_coordinate_matches_previous_conversion():
+    # both implementations warn about the gimbal lock of objects rotated by 90 degrees around y
+    warnings.simplefilter('ignore', UserWarning)
+    rng = np.random.default_rng(0)
+    for yaw in make_yaws(rng):
+        agent = as_dict(rng.uniform(-5, 5, 3), (0, yaw, 0))
+        for world_obj in [as_dict(torch.rand(3) * 5), as_dict(rng.uniform(-5, 5, 3), rng.uniform(-180, 180, 3)),
+                          as_dict(rng.uniform(-5, 5, 3), (0, rng.choice([90, 135, 180, 270]), 0))]:
+            expected, result = previous_conversion(world_obj, agent), convert_world_to_agent_coordinate(world_obj, agent)
+            for key in ['position', 'rotation']:
+                assert np.allclose([expected[key][k] for k in 'xyz'], [result[key][k] for k in 'xyz'], atol=1e-9), (yaw, key)
+            assert expected['rotation'] == result['rotation']
+
+
+@pytest.mark.parametrize("single_agent", [False, True])
+def test_batched_conversion_matches_previous_conversion(single_agent):
+    rng = np.random.default_rng(1)
+    yaws = make_yaws(rng)
+    world_positions = rng.uniform(-5, 5, (len(yaws), 3))
+    agent_positions = rng.uniform(-5, 5, (len(yaws), 3))
+    if single_agent:
+        world_positions = world_positions[:10]
+        for agent, yaw in zip(agent_positions, yaws):
+            batched = convert_world_to_agent_coordinate_batched(world_positions, agent, yaw)
+            expected = [[previous_conversion(as_dict(world), as_dict(agent, (0, yaw, 0)))['position'][k] for k in 'xyz']
+                        for world in world_positions]
+            assert batched.shape == (len(world_positions), 3)
+            assert np.allclose(batched, expected, atol=1e-9), yaw
+    else:
+        batched = convert_world_to_agent_coordinate_batched(world_positions, agent_positions, yaws)
+        expected = [[previous_conversion(as_dict(world), as_dict(agent, (0, yaw, 0)))['position'][k] for k in 'xyz']
+                    for world, agent, yaw in zip(world_positions, agent_positions, yaws)]
+        assert batched.shape == (len(yaws), 3)
+        assert np.allclose(batched, expected, atol=1e-9)
@@ -0,0 +1,82 @@
+"""The cached camera model unprojects like the previous square-frame code and inverts a pinhole projection for
+non-square frames with different horizontal and vertical fields of view, and every point cloud binning backend
+gives the map of the previous weighted bincount."""
+import math
+
+import pytest
+import torch
+
+from scripts.benchmark_camera_unprojection import previous_unprojection
+from scripts.benchmark_point_cloud_binning import BINS, RESOLUTION_IN_CM, make_point_clouds, previous_binning
+from utils.batched_transformation_utils import depth_frame_to_camera_space_xyz_batched, horizontal_fov, \
+    project_point_cloud_to_map_batched
+from utils.stretch_utils.stretch_constants import KINECT_RESIZED_W, KINECT_RESIZED_H, KINECT_FOV_W, KINECT_FOV_H
+
+
+def test_square_frames_match_previous_unprojection():
+    torch.manual_seed(0)
+    depth_frame = torch.rand(4, 64, 64) * 5
+    mask = torch.rand(4, 64, 64) < 0.3
+    fov = torch.full((4,), 90.)
+    original = depth_frame.clone()
+
+    points = depth_frame_to_camera_space_xyz_batched(depth_frame, mask, fov)
+    assert torch.equal(depth_frame, original)
+    assert torch.allclose(points, previous_unprojection(depth_frame.clone(), mask, fov), atol=1e-5, equal_nan=True)
+
+
+def test_kinect_frames_reproject_to_their_pixels():
+    height, width = KINECT_RESIZED_H, KINECT_RESIZED_W
+    torch.manual_seed(0)
+    depth_frame = torch.rand(2, height, width, dtype=torch.float32) * 5 + 0.1
+    mask = torch.ones_like(depth_frame, dtype=torch.bool)
+    points = depth_frame_to_camera_space_xyz_batched(
+        depth_frame, mask, torch.full((2,), float(KINECT_FOV_W)), torch.full((2,), float(KINECT_FOV_H)))
+    assert points.shape == (2, 3, height * width)
+
+    # pinhole projection with the focal lengths of the two fields of view, y pointing up
+    f_x = (width / 2) / math.tan(math.radians(KINECT_FOV_W) / 2)
+    f_y = (height / 2) / math.tan(math.radians(KINECT_FOV_H) / 2)
+    x, y, z = points[:, 0].double(), points[:, 1].double(), points[:, 2].double()
+    column = f_x * x / z + width / 2 - 0.5
+    row = -f_y * y / z + height / 2 - 0.5
+    # torch 1.8 has no meshgrid indexing argument
+    rows = torch.arange(height).reshape(-1, 1).repeat(1, width)
+    columns = torch.arange(width).repeat(height, 1)
+    assert torch.allclose(z, depth_frame.reshape(2, -1).double())
+    assert torch.allclose(column, columns.reshape(1, -1).double().expand_as(column), atol=1e-3)
+    assert torch.allclose(row, rows.reshape(1, -1).double().expand_as(row), atol=1e-3)
+
+
+def test_horizontal_fov():
+    fov_y = torch.tensor([float(KINECT_FOV_H)])
+    assert horizontal_fov(fov_y, 224, 224) is fov_y
+    assert abs(float(horizontal_fov(fov_y, KINECT_RESIZED_H, KINECT_RESIZED_W)) - KINECT_FOV_W) < 0.5
+
+
+@pytest.mark.parametrize("backend", [
+    "bincount",
+    "sparse",
+    pytest.param("scatter_reduce", marks=pytest.mark.skipif(
+        not hasattr(torch.Tensor, "scatter_reduce_"), reason="needs Tensor.scatter_reduce_")),
+])
+def test_binning_backends_match_previous_binning(backend):
+    torch.manual_seed(0)
+    xyz_points = make_point_clouds(2, 50, masked_percent=0.5)
+    expected = previous_binning(xyz_points, BINS, 50, RESOLUTION_IN_CM)
+    binned = project_point_cloud_to_map_batched(xyz_points, 'y', BINS, 50, RESOLUTION_IN_CM, True, backend)
+    assert binned.dtype == expected.dtype
+    assert torch.equal(binned, expected)
+
+
+@pytest.mark.parametrize("backend", ["bincount", "sparse"])
+def test_binning_without_valid_points(backend):
+    xyz_points = torch.full((1, 100, 3), float('nan'))
+    binned = project_point_cloud_to_map_batched(xyz_points, 'y', BINS, 10, RESOLUTION_IN_CM, True, backend)
+    assert binned.dtype == torch.float64
+    assert not binned.any()
+
+
+def test_unknown_binning_backend():
+    with pytest.raises(ValueError):
+        project_point_cloud_to_map_batched(make_point_clouds(1, 10, 0.5), 'y', BINS, 10, RESOLUTION_IN_CM, True, 'dense')
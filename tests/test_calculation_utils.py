@@ -0,0 +1,43 @@
+"""RecencyWeightedPointHistory must give the averages the pointnav emulator sensors computed by re-summing their list
+of midpoints every step, with and without a window and through the growth and compaction of its buffers."""
+import numpy as np
+import pytest
+import torch
+
+from scripts.benchmark_pointnav_history import previous_aggregation
+from utils.calculation_utils import RecencyWeightedPointHistory
+
+
+@pytest.mark.parametrize("window", [None, 1, 5, 40])
+@pytest.mark.parametrize("capacity", [1, 4, 64])
+@pytest.mark.parametrize("visible_percent", [0.05, 0.7, 1.])
+def test_weighted_average_matches_previous_aggregation(window, capacity, visible_percent):
+    rng = np.random.default_rng(0)
+    episode_length = 300
+    midpoints = torch.tensor(rng.uniform(-3, 3, (episode_length, 3)), dtype=torch.float32)
+    visible = rng.random(episode_length) < visible_percent
+
+    previous_history, history = [], RecencyWeightedPointHistory(window, capacity=capacity)
+    for step in range(episode_length):
+        if visible[step]:
+            previous_history.append((midpoints[step], 1, step))
+            history.append(midpoints[step], step)
+        if window is not None:
+            previous_history = [entry for entry in previous_history if entry[2] > step - window]
+        expected = previous_aggregation(previous_history, step) if previous_history else None
+        result = history.weighted_average(step)
+
+        assert (expected is None) == (result is None)
+        assert len(history) == len(previous_history)
+        if expected is not None:
+            assert result.dtype == expected.dtype == torch.float32
+            assert torch.allclose(result, expected, atol=1e-5)
+
+
+def test_weighted_average_of_midpoints_from_the_same_step():
+    history = RecencyWeightedPointHistory(capacity=1)
+    history.append(np.array([0., 0., 0.]), 3)
+    history.append(np.array([2., 4., 6.]), 3)
+    history.append(np.array([3., 3., 3.]), 5)
+    # weights 1/3, 1/3 and 1
+    assert torch.allclose(history.weighted_average(5), torch.tensor([2.2, 2.6, 3.]))
@@ -0,0 +1,118 @@
+"""MaskNoise must be reproducible from its seed, keep the shape and dtype of the masks, and give every mask of a
+batch what the same noise applied to that mask alone gives."""
+import cv2
+import numpy as np
+import pytest
+
+from scripts.benchmark_mask_noise import NOISE_SETTINGS, SCREEN_SIZE, make_masks
+from utils.mask_noise_utils import MaskNoise
+
+BATCH_SIZE = 16
+
+
+def make_test_masks():
+    masks = make_masks(BATCH_SIZE, np.random.default_rng(0))
+    # masks touching the frame border, where the dilation/erosion padding matters
+    masks[0, :20, :30] = 1
+    masks[1, -10:, -40:] = 1
+    masks[2, :, :] = 1
+    masks[3, :, :] = 0
+    return masks
+
+
+def ellipse(radius):
+    return cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * radius + 1, 2 * radius + 1))
+
+
+def one_mask_at_a_time_dilate_erode(masks, percent, max_kernel_radius, seed):
+    rng = np.random.default_rng(seed)
+    selected = rng.random(len(masks)) < percent
+    dilate = rng.random(len(masks)) < 0.5
+    radii = rng.integers(1, max_kernel_radius + 1, len(masks))
+    expected = []
+    for mask, is_selected, is_dilation, radius in zip(masks, selected, dilate, radii):
+        mask = (mask[:, :, 0] > 0.5).astype(np.uint8)
+        if is_selected:
+            mask = (cv2.dilate if is_dilation else cv2.erode)(mask, ellipse(radius))
+        expected.append(mask)
+    return np.stack(expected)[:, :, :, None]
+
+
+def one_mask_at_a_time_dropout(masks, percent, seed):
+    rng = np.random.default_rng(seed)
+    binary = masks[:, :, :, 0] > 0.5
+    uniforms = rng.random(np.count_nonzero(binary), dtype=np.float32)
+    expected = []
+    for mask in binary:
+        mask = mask.copy()
+        mask_pixels = np.flatnonzero(mask)
+        mask.reshape(-1)[mask_pixels[uniforms[:len(mask_pixels)] < percent]] = False
+        uniforms = uniforms[len(mask_pixels):]
+        expected.append(mask)
+    return np.stack(expected)[:, :, :, None]
+
+
+def one_mask_at_a_time_false_positives(masks, percent, max_blob_radius, seed):
+    rng = np.random.default_rng(seed)
+    group = np.flatnonzero(rng.random(len(masks)) < percent)
+    rows = rng.integers(0, SCREEN_SIZE, len(group))
+    cols = rng.integers(0, SCREEN_SIZE, len(group))
+    radii = rng.integers(1, max_blob_radius + 1, len(group))
+    expected = masks[:, :, :, 0] > 0.5
+    for index, row, col, radius in zip(group, rows, cols, radii):
+        # the whole blob on a padded canvas, then cropped back to the frame
+        canvas = np.zeros((SCREEN_SIZE + 2 * max_blob_radius, SCREEN_SIZE + 2 * max_blob_radius), dtype=bool)
+        top, left = row + max_blob_radius - radius, col + max_blob_radius - radius
+        canvas[top:top + 2 * radius + 1, left:left + 2 * radius + 1] = ellipse(radius).astype(bool)
+        expected[index] |= canvas[max_blob_radius:-max_blob_radius, max_blob_radius:-max_blob_radius]
+    return expected[:, :, :, None]
+
+
+def test_mask_noise_is_reproducible_from_its_seed():
+    masks = make_test_masks()
+    first, second = MaskNoise(seed=3, **NOISE_SETTINGS), MaskNoise(seed=3, **NOISE_SETTINGS)
+    for _ in range(3):
+        assert np.array_equal(first(masks), second(masks))
+    assert not np.array_equal(MaskNoise(seed=4, **NOISE_SETTINGS)(masks), MaskNoise(seed=3, **NOISE_SETTINGS)(masks))
+
+
+@pytest.mark.parametrize("max_kernel_radius", [1, 3])
+def test_dilate_erode_matches_one_mask_at_a_time(max_kernel_radius):
+    masks = make_test_masks()
+    noise = MaskNoise(dilation_erosion_percent=0.8, max_kernel_radius=max_kernel_radius, seed=5)
+    expected = one_mask_at_a_time_dilate_erode(masks, 0.8, max_kernel_radius, seed=5)
+    assert np.array_equal(noise(masks), expected)
+
+
+def test_dropout_matches_one_mask_at_a_time():
+    masks = make_test_masks()
+    noise = MaskNoise(dropout_percent=0.3, seed=6)
+    expected = one_mask_at_a_time_dropout(masks, 0.3, seed=6)
+    assert np.array_equal(noise(masks), expected)
+
+
+def test_false_positives_match_one_mask_at_a_time():
+    masks = make_test_masks()
+    noise = MaskNoise(false_positive_percent=0.9, max_blob_radius=20, seed=7)
+    expected = one_mask_at_a_time_false_positives(masks, 0.9, 20, seed=7)
+    assert np.array_equal(noise(masks), expected)
+
+
+@pytest.mark.parametrize("settings", [
+    dict(dilation_erosion_percent=1.),
+    dict(dropout_percent=0.5),
+    dict(false_positive_percent=1.),
+    NOISE_SETTINGS,
+])
+@pytest.mark.parametrize("dtype", [np.float64, np.float32, np.uint8, np.bool_])
+@pytest.mark.parametrize("with_channel", [True, False])
+def test_mask_noise_keeps_shape_and_dtype(settings, dtype, with_channel):
+    masks = make_test_masks().astype(dtype)
+    if not with_channel:
+        masks = masks[:, :, :, 0]
+    before = masks.copy()
+    noisy = MaskNoise(seed=0, **settings)(masks)
+    assert noisy.shape == masks.shape
+    assert noisy.dtype == masks.dtype
+    assert np.isin(noisy, [0, 1]).all()
+    assert np.array_equal(masks, before)
@@ -0,0 +1,58 @@
+"""The buffered _TruncatedMultivariateGaussian samples the truncated normal (Kolmogorov-Smirnov tests against its
+CDF and against the previous one truncnorm.rvs call per element sampler, on fixed seeds), seeded models repeat
+their samples and truncations beyond the 3 standard deviations stay in range."""
+import numpy as np
+import pytest
+import scipy.stats
+
+from ithor_arm.ithor_arm_noise_models import NoiseInMotionHabitatFlavor
+from scripts.benchmark_truncated_gaussian import HABITAT_MODELS, previous_sample
+from utils.noise_from_habitat import _TruncatedMultivariateGaussian
+
+NUMBER_OF_SAMPLES = 4000
+MIN_P_VALUE = 1e-3
+
+
+def truncnorm_bounds(mean, stdev, truncation):
+    a, b = -3, 3
+    if truncation is not None and truncation[0] is not None:
+        a = max((truncation[0] - mean) / stdev, a)
+    if truncation is not None and truncation[1] is not None:
+        b = min((truncation[1] - mean) / stdev, b)
+    return a, b
+
+
+@pytest.mark.parametrize("seed, mean, cov, truncation", [
+    *[(seed, mean, cov, None) for seed, (mean, cov) in enumerate(HABITAT_MODELS)],
+    (len(HABITAT_MODELS), [0.074, 0.036], [0.019, 0.033], [(0.0, None), (None, 0.1)]),
+])
+def test_samples_follow_the_truncated_normal(seed, mean, cov, truncation):
+    np.random.seed(seed)
+    model = _TruncatedMultivariateGaussian(mean, cov, seed=seed)
+    samples = np.array([model.sample(truncation) for _ in range(NUMBER_OF_SAMPLES)])
+    previous_samples = np.array([previous_sample(model, truncation) for _ in range(NUMBER_OF_SAMPLES // 4)])
+    for i, (mean_i, variance) in enumerate(zip(mean, cov)):
+        if variance == 0:
+            assert np.all(samples[:, i] == mean_i)
+            continue
+        stdev = np.sqrt(variance)
+        a, b = truncnorm_bounds(mean_i, stdev, None if truncation is None else truncation[i])
+        assert scipy.stats.kstest(samples[:, i], scipy.stats.truncnorm(a, b, mean_i, stdev).cdf).pvalue > MIN_P_VALUE
+        assert scipy.stats.ks_2samp(samples[:, i], previous_samples[:, i]).pvalue > MIN_P_VALUE
+
+
+def test_seeded_noise_models_repeat():
+    first, second = NoiseInMotionHabitatFlavor(seed=3), NoiseInMotionHabitatFlavor(seed=3)
+    for _ in range(200):
+        assert first.get_ahead_drift() == second.get_ahead_drift()
+        assert first.get_rotate_drift() == second.get_rotate_drift()
+
+
+def test_truncation_beyond_three_standard_deviations():
+    model = _TruncatedMultivariateGaussian([0.5, 0.5], [0.04, 0.04], seed=0)
+    for _ in range(100):
+        sample = model.sample([(2.0, None), (None, -1.0)])
+        assert np.all(np.isfinite(sample))
+        assert np.allclose(sample, [1.1, -0.1])
+    with pytest.raises(AssertionError):
+        model.sample([(0.6, 0.4), None])
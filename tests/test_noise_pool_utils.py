@@ -0,0 +1,88 @@
+"""Motion noise drawn from a NoisePool replays by (seed, episode, step) whatever was drawn before, its normals and
+truncated normals have the right distributions, and environments number their noise episodes as their task
+samplers do."""
+import numpy as np
+import scipy.stats
+
+from ithor_arm.ithor_arm_constants import MOVE_AHEAD, ROTATE_RIGHT
+from scripts.benchmark_env_step import make_fake_environment
+from scripts.benchmark_noise_pool import HABITAT_ARGS, episode_drifts, make_models
+from utils.noise_from_habitat import _TruncatedMultivariateGaussian
+from utils.noise_pool_utils import NoisePool, episode_index
+
+MIN_P_VALUE = 1e-3
+
+
+def test_drifts_replay_by_seed_episode_and_step():
+    pool = NoisePool(7)
+    models = make_models(pool)
+    for model in models:
+        recorded = [episode_drifts(model, pool, episode, 300) for episode in range(3)]
+        replay_pool = NoisePool(7)
+        replay_model = make_models(replay_pool)[models.index(model)]
+        # a fresh pool, episodes out of order and an episode entered halfway
+        for episode in reversed(range(3)):
+            assert np.array_equal(recorded[episode], episode_drifts(replay_model, replay_pool, episode, 300))
+        assert np.array_equal(recorded[2][150:], episode_drifts(replay_model, replay_pool, 2, 300, start_step=150))
+        assert not np.array_equal(recorded[0], recorded[1])
+        other_seed = NoisePool(8)
+        replay_model.use_noise_pool(other_seed)
+        assert not np.array_equal(recorded[0], episode_drifts(replay_model, other_seed, 0, 300))
+
+
+def test_pool_distributions():
+    samples = 20000
+    pool = NoisePool(0, steps_per_block=samples)
+    pool.start_episode()
+    normals = []
+    for step in range(samples):
+        pool.start_step(step)
+        normals.append(pool.normals(1)[0])
+    assert scipy.stats.kstest(normals, 'norm').pvalue > MIN_P_VALUE
+
+    gaussian = _TruncatedMultivariateGaussian([0.5], [0.04])
+    gaussian.noise_pool = NoisePool(1, steps_per_block=samples)
+    gaussian.noise_pool.start_episode()
+    truncated, bounded = [], []
+    for step in range(samples):
+        gaussian.noise_pool.start_step(step)
+        truncated.append(gaussian.sample()[0])
+        bounded.append(gaussian.sample([(0.45, None)])[0])
+    assert scipy.stats.kstest(truncated, scipy.stats.truncnorm(-3, 3, loc=0.5, scale=0.2).cdf).pvalue > MIN_P_VALUE
+    assert scipy.stats.kstest(bounded, scipy.stats.truncnorm(-0.25, 3, loc=0.5, scale=0.2).cdf).pvalue > MIN_P_VALUE
+
+
+def test_pool_numbers_are_finite():
+    pool = NoisePool(3, uniforms_per_step=4, steps_per_block=4096)
+    pool.start_episode(0)
+    pool.start_step(0)
+    pool.uniforms(1)
+    uniforms, normals, truncated_normals = pool._blocks
+    assert np.all((uniforms > 0) & (uniforms < 1))
+    assert np.all(np.isfinite(normals))
+    assert np.all(np.abs(truncated_normals) <= 3)
+
+
+def test_noise_episodes_do_not_depend_on_earlier_episodes():
+    def poses(env, episode):
+        env.start_noise_episode(episode)
+        result = []
+        for action in [MOVE_AHEAD, ROTATE_RIGHT, MOVE_AHEAD, MOVE_AHEAD]:
+            env.step(dict(action=action))
+            location = env.get_agent_location()
+            result.append([location['x'], location['z'], location['rotation']])
+        return np.array(result)
+
+    env_args = dict(motion_noise_type='habitat', motion_noise_args=HABITAT_ARGS, noise_pool_seed=0)
+    episode = episode_index('FloorPlan1_physics', dict(x=1.0, z=2.0))
+    fresh = make_fake_environment(env_args)
+    fresh.reset(scene_name='FloorPlan1_physics')
+    worker = make_fake_environment(env_args)
+    worker.reset(scene_name='FloorPlan1_physics')
+    # the second environment runs another episode first, without a reset in between, and is put back at the start
+    start = fresh.controller.last_event.metadata['agent']
+    poses(worker, episode_index('FloorPlan2_physics'))
+    worker.controller.step(dict(action='TeleportFull', horizon=start['cameraHorizon'], rotation=start['rotation'],
+                                **start['position']))
+    assert np.array_equal(poses(fresh, episode), poses(worker, episode))
+    assert episode == episode_index('FloorPlan1_physics', dict(z=2.0, x=1.0))
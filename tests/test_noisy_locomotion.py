@@ -0,0 +1,65 @@
+"""Skipping the zero drifts of noisy locomotion must leave the agent where stepping every drift leaves it, also
+when MoveAgent is stopped by an obstacle."""
+import random
+
+import numpy as np
+import pytest
+
+from ithor_arm.ithor_arm_constants import MOVE_AHEAD, ROTATE_RIGHT, ROTATE_LEFT
+from scripts.benchmark_env_step import make_fake_environment
+from scripts.fake_controller import FakeController
+
+SIMPLE1D_ARGS = dict(
+    ahead_noise_meta_dist_params={'bias_dist': [0, 0.04], 'variance_dist': [0, 0.10]},
+    lateral_noise_meta_dist_params={'bias_dist': [0, 0.04], 'variance_dist': [0, 0.04]},
+    turning_noise_meta_dist_params={'bias_dist': [0, 10], 'variance_dist': [0, 10]},
+)
+
+
+class WalledFakeController(FakeController):
+    """MoveAgent fails and leaves the agent in place if it would end up beyond x = 0.5."""
+
+    def step(self, action=None, **action_args):
+        name = action["action"] if isinstance(action, dict) else action
+        agent = self.last_event.metadata["agent"]
+        start = dict(agent["position"])
+        event = super().step(action, **action_args)
+        if name == "MoveAgent" and event.metadata["agent"]["position"]["x"] > 0.5:
+            event.metadata["agent"]["position"] = start
+            event.metadata["lastActionSuccess"] = False
+        return event
+
+
+def replay(trajectory, env_args, step_zero_drifts=False):
+    env = make_fake_environment(env_args)
+    if step_zero_drifts:
+        env.is_null_motion = lambda controller_action: False
+    env.controller = WalledFakeController()
+    np.random.seed(0)
+    env.noise_model.reset_noise_model()
+    poses = []
+    for action in trajectory:
+        env.step(dict(action=action))
+        agent = env.last_event.metadata["agent"]
+        poses.append([agent["position"]["x"], agent["position"]["z"], agent["rotation"]["y"]])
+    return np.array(poses), env.controller.number_of_steps
+
+
+@pytest.mark.parametrize("noise_args", [
+    dict(motion_noise_type="simple1d", motion_noise_args=SIMPLE1D_ARGS),
+    dict(motion_noise_type="simple1d", motion_noise_args=dict()),
+    dict(motion_noise_type="habitat", motion_noise_args=dict()),
+    dict(),
+])
+def test_skipping_zero_drifts_matches_stepping_them(noise_args):
+    rng = random.Random(0)
+    trajectory = [rng.choice([MOVE_AHEAD, MOVE_AHEAD, ROTATE_RIGHT, ROTATE_LEFT]) for _ in range(300)]
+    all_drift_poses, all_drift_steps = replay(trajectory, noise_args, step_zero_drifts=True)
+    poses, steps = replay(trajectory, noise_args)
+
+    assert np.allclose(all_drift_poses[:, :2], poses[:, :2], atol=1e-9)
+    rotation_error = (all_drift_poses[:, 2] - poses[:, 2] + 180) % 360 - 180
+    assert np.allclose(rotation_error, 0, atol=1e-9)
+    assert steps <= all_drift_steps
+    # the trajectory walks into the wall
+    assert all_drift_poses[:, 0].max() <= 0.5
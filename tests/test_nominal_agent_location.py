@@ -0,0 +1,31 @@
+"""nominal_agent_location stays a dict shaped like get_agent_location, and a new one after every action."""
+from ithor_arm.ithor_arm_constants import MOVE_AHEAD, ROTATE_RIGHT
+from scripts.benchmark_env_step import make_fake_environment
+
+
+def test_nominal_agent_location_is_a_fresh_dict():
+    env = make_fake_environment(dict())
+    env.reset(scene_name="FloorPlan1_physics")
+    before = env.nominal_agent_location
+    assert isinstance(before, dict)
+    assert before.keys() == env.get_agent_location().keys()
+    snapshot = dict(before)
+
+    env.step(dict(action=MOVE_AHEAD))
+    env.step(dict(action=ROTATE_RIGHT))
+    after = env.nominal_agent_location
+    assert isinstance(after, dict)
+    assert before == snapshot
+    assert after is not before
+    assert (after['x'], after['z'], after['rotation']) != (before['x'], before['z'], before['rotation'])
+    assert all(isinstance(after[k], float) for k in ['x', 'y', 'z', 'rotation'])
+
+
+def test_nominal_agent_pose_matches_nominal_agent_location():
+    env = make_fake_environment(dict())
+    env.reset(scene_name="FloorPlan1_physics")
+    for action in [MOVE_AHEAD, ROTATE_RIGHT, MOVE_AHEAD]:
+        env.step(dict(action=action))
+        pose = env.nominal_agent_pose
+        location = env.nominal_agent_location
+        assert [float(pose[k]) for k in ['x', 'y', 'z', 'rotation']] == [location[k] for k in ['x', 'y', 'z', 'rotation']]
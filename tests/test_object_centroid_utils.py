@@ -0,0 +1,84 @@
+"""ObjectCentroidEstimator must give the centroids the pointnav emulator sensors computed one frame unprojection per
+sensor, and unproject a frame only once for all the sensors of a step."""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import torch
+
+from scripts.benchmark_object_centroids import CAMERAS, DEVICE, MIN_XYZ, SCREEN_SIZE, make_depth_frame, make_mask
+from utils.calculation_utils import calc_world_coordinates, get_mid_point_of_object_from_depth_and_mask
+from utils.noise_in_motion_util import squeeze_bool_mask
+from utils.object_centroid_utils import ObjectCentroidEstimator, object_centroid_estimator_of
+
+
+def mid_point_keeping_zero_depth(mask, depth_frame_original, min_xyz, camera_xyz, camera_rotation, camera_horizon, fov, device):
+    # get_mid_point_of_object_from_depth_and_mask of ithor_arm/near_deadline_sensors.py, which does not treat 0 depth
+    # as missing (that module needs allenact's vision sensors to import)
+    mask = squeeze_bool_mask(mask)
+    depth_frame_masked = depth_frame_original.copy()
+    depth_frame_masked[~mask] = -1
+    world_space_point_cloud = calc_world_coordinates(min_xyz, camera_xyz, camera_rotation, camera_horizon, fov, device, depth_frame_masked)
+    valid_points = (world_space_point_cloud == world_space_point_cloud).sum(dim=-1) == 3
+    return world_space_point_cloud[valid_points].mean(dim=0)
+
+
+def make_masks(rng):
+    masks = [make_mask(rng) for _ in range(4)]
+    # a mask without any valid depth point has a NaN centroid
+    masks.append(np.zeros((SCREEN_SIZE, SCREEN_SIZE, 1)))
+    return masks
+
+
+@pytest.mark.parametrize("zero_depth_is_missing", [True, False])
+@pytest.mark.parametrize("camera", list(CAMERAS))
+def test_centroid_matches_one_unprojection_per_sensor(zero_depth_is_missing, camera):
+    rng = np.random.default_rng(0)
+    previous = get_mid_point_of_object_from_depth_and_mask if zero_depth_is_missing else mid_point_keeping_zero_depth
+    estimator = ObjectCentroidEstimator()
+    for _ in range(3):
+        estimator.start_step(object())
+        depth_frame = make_depth_frame(rng)
+        # missing depth in the middle of every mask
+        depth_frame[SCREEN_SIZE // 2 - 30: SCREEN_SIZE // 2 + 30] = -1
+        for mask in make_masks(rng):
+            expected = previous(mask, depth_frame, MIN_XYZ, *CAMERAS[camera], DEVICE)
+            centroid, number_of_points = estimator.centroid(mask, depth_frame, MIN_XYZ, *CAMERAS[camera], DEVICE,
+                                                            zero_depth_is_missing=zero_depth_is_missing)
+            assert centroid.dtype == expected.dtype == torch.float32
+            assert torch.allclose(centroid, expected, atol=1e-5, equal_nan=True)
+            valid_depth = (depth_frame != -1) & ((depth_frame != 0) | (not zero_depth_is_missing))
+            assert number_of_points == np.count_nonzero(squeeze_bool_mask(mask) & valid_depth)
+
+
+def test_centroid_of_a_depth_tensor():
+    rng = np.random.default_rng(1)
+    depth_frame = make_depth_frame(rng)
+    mask = make_mask(rng)
+    expected = get_mid_point_of_object_from_depth_and_mask(mask, depth_frame, MIN_XYZ, *CAMERAS['intel'], DEVICE)
+    centroid, _ = ObjectCentroidEstimator().centroid(mask, torch.from_numpy(depth_frame), MIN_XYZ, *CAMERAS['intel'], DEVICE)
+    assert torch.allclose(centroid, expected, atol=1e-5)
+
+
+def test_sensors_of_one_step_share_the_point_cloud():
+    rng = np.random.default_rng(2)
+    depth_frame = make_depth_frame(rng)[:, :, None]
+    env = SimpleNamespace(controller=SimpleNamespace(last_event=object()))
+    source_mask, destination_mask = make_mask(rng), make_mask(rng)
+
+    estimator = object_centroid_estimator_of(env)
+    estimator.centroid(source_mask, depth_frame.squeeze(-1), MIN_XYZ, *CAMERAS['intel'], DEVICE)
+    assert (estimator.computed_point_clouds, estimator.reused_point_clouds) == (1, 0)
+    # a second sensor reading the same frame, through its own squeezed view
+    assert object_centroid_estimator_of(env) is estimator
+    estimator.centroid(destination_mask, depth_frame.squeeze(-1), MIN_XYZ, *CAMERAS['intel'], DEVICE)
+    assert (estimator.computed_point_clouds, estimator.reused_point_clouds) == (1, 1)
+    # another camera pose is another point cloud
+    estimator.centroid(source_mask, depth_frame.squeeze(-1), MIN_XYZ, *CAMERAS['kinect'], DEVICE)
+    assert (estimator.computed_point_clouds, estimator.reused_point_clouds) == (2, 1)
+
+    # the next step unprojects its frame again, even if it is in the same memory
+    env.controller.last_event = object()
+    object_centroid_estimator_of(env).centroid(source_mask, depth_frame.squeeze(-1), MIN_XYZ, *CAMERAS['intel'], DEVICE)
+    assert (estimator.computed_point_clouds, estimator.reused_point_clouds) == (3, 1)
+    assert estimator.metrics() == {"sensors/computed_point_clouds": 3, "sensors/reused_point_clouds": 1}
@@ -0,0 +1,54 @@
+"""ObjectMaskAtResolution must give the previous full resolution mask, resized with cv2.INTER_NEAREST where the
+resolutions differ, and MaskRegion bit-exactly the regions NoisyObjectRegion computed before, in every dtype."""
+import cv2
+import numpy as np
+import pytest
+
+from scripts.benchmark_mask_region import NUMBER_OF_REPEAT, REGION_SIZE, make_mask, previous_region
+from scripts.benchmark_object_mask import OBJECT_COLOR, previous_mask
+from utils.object_mask_utils import MaskRegion, ObjectMaskAtResolution
+
+
+def make_scattered_segmentation_frame(shape, rng):
+    # object pixels all over the frame, so that every sampled index is checked
+    frame = rng.integers(0, 4, (shape[0], shape[1], 3), dtype=np.uint8)
+    frame[rng.random(shape) < 0.5] = OBJECT_COLOR
+    return frame
+
+
+@pytest.mark.parametrize("source_shape", [(224, 224), (300, 400), (400, 300), (720, 720), (1280, 720), (720, 1280)])
+@pytest.mark.parametrize("output_shape", [(224, 224), (180, 320), (320, 180)])
+def test_object_mask_at_resolution_matches_previous_mask(source_shape, output_shape):
+    rng = np.random.default_rng(0)
+    width, height = output_shape
+    mask_at_resolution = ObjectMaskAtResolution(width, height)
+    for _ in range(3):
+        segmentation_frame = make_scattered_segmentation_frame(source_shape, rng)
+        mask = mask_at_resolution.mask(segmentation_frame, OBJECT_COLOR)
+        assert mask.shape == (width, height)
+        if source_shape == output_shape:
+            expected = previous_mask(segmentation_frame, width, height)[:, :, 0]
+        else:
+            # the previous bilinear resize gave fractional edges, the pixels kept are the nearest neighbours
+            full_mask = previous_mask(segmentation_frame, *source_shape)[:, :, 0]
+            expected = cv2.resize(full_mask, (height, width), interpolation=cv2.INTER_NEAREST)
+        assert np.array_equal(mask, expected)
+
+
+def test_object_mask_at_resolution_without_frame_or_color():
+    mask_at_resolution = ObjectMaskAtResolution(224, 224)
+    segmentation_frame = make_scattered_segmentation_frame((300, 400), np.random.default_rng(0))
+    assert not mask_at_resolution.mask(None, OBJECT_COLOR).any()
+    assert not mask_at_resolution.mask(segmentation_frame, None).any()
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.uint8, np.bool_])
+@pytest.mark.parametrize("kind", ['binary', 'sparse', 'fractional'])
+def test_mask_region_matches_previous_region(dtype, kind):
+    rng = np.random.default_rng(0)
+    mask_region = MaskRegion(REGION_SIZE, NUMBER_OF_REPEAT, dtype=dtype)
+    for _ in range(200):
+        mask = make_mask(kind, rng)
+        region = mask_region.region(mask)
+        assert region.dtype == dtype
+        assert np.array_equal(region.astype(np.float64), previous_region(mask))
@@ -0,0 +1,36 @@
+"""KianaBinnedPointCloudMapBuilder gives, at every step of a short depth sequence, the outputs of the builder that
+unprojected the whole frame, and its tensor backed map gives those of the numpy one."""
+import numpy as np
+import pytest
+import torch
+
+from ithor_arm.pointcloud_sensors import KianaBinnedPointCloudMapBuilder
+from scripts.benchmark_binned_point_cloud_map import MAP_INFO, MIN_XYZ, make_sequence, previous_update, replay
+
+
+@pytest.mark.parametrize("full_frame", [False, True])
+def test_map_matches_previous_builder(full_frame):
+    sequence = make_sequence(12, full_frame, np.random.default_rng(0))
+    expected, _ = replay(previous_update, KianaBinnedPointCloudMapBuilder(**MAP_INFO), sequence)
+    results, _ = replay(KianaBinnedPointCloudMapBuilder.update, KianaBinnedPointCloudMapBuilder(**MAP_INFO), sequence)
+    for expected_outputs, outputs in zip(expected, results):
+        assert expected_outputs.keys() == outputs.keys()
+        for key, value in expected_outputs.items():
+            assert value.dtype == outputs[key].dtype
+            assert np.array_equal(value, outputs[key]), key
+
+
+@pytest.mark.parametrize("resolution_in_cm", [20, 5])
+def test_tensor_map_matches_numpy_map(resolution_in_cm):
+    sequence = make_sequence(12, False, np.random.default_rng(1))
+    map_info = dict(MAP_INFO, resolution_in_cm=resolution_in_cm)
+    numpy_builder = KianaBinnedPointCloudMapBuilder(**map_info)
+    tensor_builder = KianaBinnedPointCloudMapBuilder(as_tensor=True, **map_info)
+    numpy_builder.reset(min_xyz=MIN_XYZ)
+    tensor_builder.reset(min_xyz=MIN_XYZ)
+    for depth_frame, position, rotation, horizon in sequence:
+        expected = numpy_builder.update(depth_frame.copy(), position, rotation, horizon)
+        outputs = tensor_builder.update(depth_frame.copy(), position, rotation, horizon)
+        for key, value in expected.items():
+            assert outputs[key].dtype == torch.float32
+            assert np.array_equal(value, outputs[key].numpy()), key
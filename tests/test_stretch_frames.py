@@ -0,0 +1,20 @@
+"""The Stretch camera frames are processed once per event, the kinect depth noise is only shared when asked for."""
+import pytest
+
+from scripts.benchmark_stretch_frames import FakeStretchManipulaTHOREnvironment
+from utils.stretch_utils.stretch_constants import MOVE_ARM_HEIGHT_P
+
+
+@pytest.mark.parametrize("share_kinect_depth_noise", [False, True])
+def test_kinect_depth_noise_is_shared_only_when_asked(share_kinect_depth_noise):
+    FakeStretchManipulaTHOREnvironment.frame_size = 64
+    env = FakeStretchManipulaTHOREnvironment(
+        env_args=dict(commit_id='fake', share_kinect_depth_noise=share_kinect_depth_noise))
+    env.reset('Procedural')
+    env.step(dict(action=MOVE_ARM_HEIGHT_P))
+
+    assert env.intel_depth is env.intel_depth
+    assert not env.intel_depth.flags.writeable
+    first, second = env.kinect_depth, env.kinect_depth
+    assert (first is second) == share_kinect_depth_noise
+    assert first.flags.writeable != share_kinect_depth_noise
@@ -0,0 +1,79 @@
+"""SupervisedController against the FakeController: a crashed controller is replaced, by the warm standby if
+there is one, and the replacement is configured like the controller it replaces."""
+import time
+
+from ithor_arm.supervised_controller import SupervisedController
+from scripts.benchmark_env_step import FakeManipulaTHOREnvironment
+from scripts.fake_controller import FakeController
+
+
+class ControllerFactory:
+    def __init__(self, startup_time=0.0):
+        self.startup_time = startup_time
+        self.controllers = []
+
+    def __call__(self):
+        time.sleep(self.startup_time)
+        controller = FakeController(number_of_objects=2)
+        self.controllers.append(controller)
+        return controller
+
+
+def test_attribute_writes_reach_the_controller():
+    factory = ControllerFactory()
+    supervised = SupervisedController(factory)
+    supervised.docker_enabled = True
+    assert factory.controllers[0].docker_enabled is True
+    assert supervised.docker_enabled is True
+    assert "docker_enabled" not in vars(supervised)
+
+
+def test_restart_replays_attributes_and_setup_steps():
+    factory = ControllerFactory()
+    supervised = SupervisedController(factory)
+    supervised.docker_enabled = True
+    supervised.setup_step({"action": "ChangeResolution", "x": 300, "y": 300})
+    supervised.setup_step({"action": "ChangeResolution", "x": 400, "y": 400})
+    supervised.step("Pass")
+
+    failed = supervised.controller
+    replacement = supervised.restart()
+
+    assert replacement is supervised.controller is factory.controllers[1]
+    assert failed.stopped
+    assert replacement.docker_enabled is True
+    # only the last setup action of each name is replayed
+    assert replacement.steps_by_action == {"ChangeResolution": 1}
+    assert supervised.metrics()["controller/restart_count"] == 1
+
+
+def test_restart_swaps_in_the_standby():
+    factory = ControllerFactory(startup_time=0.3)
+    supervised = SupervisedController(factory, keep_standby=True)
+    supervised._standby_thread.join()
+    standby = factory.controllers[1]
+
+    supervised.restart()
+
+    assert supervised.controller is standby
+    assert supervised.restart_latencies[-1] < 0.2
+    supervised.stop()
+    # the standby spawned after the restart is stopped with the wrapper
+    assert factory.controllers[2].stopped
+
+
+def test_environment_reset_recovers_from_a_crashed_controller():
+    FakeManipulaTHOREnvironment.fake_controller_args = dict(number_of_objects=2)
+    env = FakeManipulaTHOREnvironment(object_open_speed=2.0,
+                                      env_args=dict(commit_id="fake", controller_standby=True))
+    crashed = env.controller.controller
+    crashed.fail_on.add("reset")
+
+    env.reset("FloorPlan1_physics")
+
+    replacement = env.controller.controller
+    assert replacement is not crashed and crashed.stopped
+    assert replacement.docker_enabled is False
+    assert replacement.steps_by_action["ChangeOpenSpeed"] >= 1
+    assert env.controller_metrics()["controller/restart_count"] == 1
+    env.stop()
@@ -1,55 +1,85 @@
+import functools
 import torch
 import math
 
-from typing import Sequence, cast
+from typing import Optional, Sequence, cast
 
-def depth_frame_to_camera_space_xyz_batched(
-    depth_frame: torch.Tensor, mask: torch.Tensor, fov: torch.Tensor
-) -> torch.Tensor:
-    """Transforms a input depth map into a collection of xyz points (i.e. a
-    point cloud) in the camera's coordinate frame.
-    # Parameters
-    depth_frame : A square depth map, i.e. an BxMxM matrix with entry `depth_frame[i, j, k]` equaling
-        the distance from the camera to nearest surface at pixel (j,k) in batch i.
-    fov: The field of view of the camera.
-    # Returns
-    A 3xN matrix with entry [:, i] equalling a the xyz coordinates (in the camera's coordinate
-    frame) of a point in the point cloud corresponding to the input depth frame.
+class CameraModel:
+    """Pinhole camera of `height` x `width` depth frames with horizontal and vertical fields of view `fov_x` and
+    `fov_y` (in degrees, they need not be equal, e.g. the Kinect and Intel cameras of the Stretch).
+
+    Holds the camera space direction of every pixel center, scaled so that its z is 1, in the row major order of
+    the frame. Unprojecting a depth frame is then a single multiplication of these directions by the depths. Use
+    `camera_model` to get the (cached) model of a camera rather than building it every call.
     """
-    assert torch.all(fov == fov[0])
-    assert depth_frame.shape[-2] == depth_frame.shape[-1]
-    assert len(depth_frame.shape) == 3
-    depth_frame[~mask] = float('nan')
 
-    resolution = depth_frame.shape[-1]
+    def __init__(self, height: int, width: int, fov_x: float, fov_y: float, device: torch.device):
+        # pixel centers relative to the center of the frame, put on the clipping plane
+        x = (torch.arange(width, dtype=torch.float32, device=device) + 0.5 - width / 2.0) * (
+            (2.0 / width) * math.tan((fov_x / 2) / 180 * math.pi)
+        )
+        # Make "up" in y be positive
+        y = -(torch.arange(height, dtype=torch.float32, device=device) + 0.5 - height / 2.0) * (
+            (2.0 / height) * math.tan((fov_y / 2) / 180 * math.pi)
+        )
+        self.height = height
+        self.width = width
+        self.ray_directions = torch.stack(
+            [
+                x.repeat(height),  # This is x
+                y.repeat_interleave(width),  # This is y
+                torch.ones(height * width, dtype=torch.float32, device=device),
+            ],
+            dim=0,
+        )
 
-    mask = torch.ones_like(depth_frame[0], dtype=bool)
+    def unproject(self, depth_frame: torch.Tensor, mask: Optional[torch.Tensor] = None) -> torch.Tensor:
+        """Bx3xN camera space points of the BxHxW `depth_frame`, NaN where `mask` is False. The inputs are not
+        modified."""
+        depths = depth_frame.reshape(depth_frame.shape[0], 1, -1)
+        if mask is not None:
+            depths = torch.where(mask.reshape(depths.shape), depths, depths.new_tensor(float('nan')))
+        return self.ray_directions * depths
 
-    # pixel centers
-    camera_space_yx_offsets = (
-        torch.stack(torch.where(mask))
-        + 0.5  # Offset by 0.5 so that we are in the middle of the pixel
-    )
 
-    # Subtract center
-    camera_space_yx_offsets -= resolution / 2.0
+@functools.lru_cache(maxsize=16)
+def camera_model(height: int, width: int, fov_x: float, fov_y: float, device: torch.device) -> CameraModel:
+    return CameraModel(height, width, fov_x, fov_y, device)
 
-    # Make "up" in y be positive
-    camera_space_yx_offsets[0, :] *= -1
 
-    # Put points on the clipping plane
-    camera_space_yx_offsets *= (2.0 / resolution) * torch.tan((fov[0] / 2) / 180 * math.pi)
+def horizontal_fov(fov_y: torch.Tensor, height: int, width: int) -> torch.Tensor:
+    """Horizontal field of view (in degrees) of `height` x `width` frames with the vertical field of view `fov_y`.
+    Unity cameras, and so the fov in the ai2thor metadata, are specified by their vertical field of view."""
+    if height == width:
+        return fov_y
+    return torch.rad2deg(2 * torch.atan(torch.tan(torch.deg2rad(fov_y) / 2) * (width / height)))
 
-    camera_space_xyz = torch.cat(
-        [
-            camera_space_yx_offsets[1:, :],  # This is x
-            camera_space_yx_offsets[:1, :],  # This is y
-            torch.ones_like(camera_space_yx_offsets[:1, :]),
-        ],
-        axis=0,
-    )
 
-    return camera_space_xyz.repeat(depth_frame.shape[0], 1, 1) * depth_frame.reshape(depth_frame.shape[0], 1, -1)
+def depth_frame_to_camera_space_xyz_batched(
+    depth_frame: torch.Tensor, mask: torch.Tensor, fov: torch.Tensor, fov_y: Optional[torch.Tensor] = None
+) -> torch.Tensor:
+    """Transforms a input depth map into a collection of xyz points (i.e. a
+    point cloud) in the camera's coordinate frame.
+    # Parameters
+    depth_frame : A depth map, i.e. an BxHxW matrix with entry `depth_frame[i, j, k]` equaling
+        the distance from the camera to nearest surface at pixel (j,k) in batch i. It is not modified.
+    mask : BxHxW boolean tensor, the points where it is False are NaN.
+    fov: The (horizontal) field of view of the camera, one per batch entry, all equal.
+    fov_y: The vertical field of view, `fov` if None.
+    # Returns
+    A Bx3xN matrix with entry [b, :, i] equalling a the xyz coordinates (in the camera's coordinate
+    frame) of a point in the point cloud corresponding to the input depth frame b.
+    """
+    assert torch.all(fov == fov[0])
+    assert len(depth_frame.shape) == 3
+    fov_x = float(fov[0])
+    if fov_y is None:
+        fov_y = fov_x
+    else:
+        assert torch.all(fov_y == fov_y[0])
+        fov_y = float(fov_y[0])
+    model = camera_model(depth_frame.shape[-2], depth_frame.shape[-1], fov_x, fov_y, depth_frame.device)
+    return model.unproject(depth_frame, mask)
 
 
 def camera_space_xyz_to_world_xyz_batched(
@@ -138,6 +168,7 @@ def project_point_cloud_to_map_batched(
     map_size: int,
     resolution_in_cm: int,
     flip_row_col: bool,
+    backend: str = "bincount",
 ):
     """Bins an input point cloud into a map tensor with the bins equaling the
     channels.
@@ -158,12 +189,33 @@ def project_point_cloud_to_map_batched(
         in space.
     flip_row_col: Should the rows/cols of the map be flipped? See the 'Returns' section below for more
         info.
+    backend: How the valid points are counted into the map, "bincount" (the default), "scatter_reduce" (needs a
+        torch with Tensor.scatter_reduce_, 1.12 or later) or "sparse" (a COO accumulator). All give the same map,
+        see scripts/benchmark_point_cloud_binning.py.
     # Returns
     A collection of maps of shape (... x map_size x map_size x (len(bins)+1)), note that bin_axis
     has been moved to the last index of this returned map, the other two axes stay in their original
     order unless `flip_row_col` has been called in which case they are reversed (useful as often
     rows should correspond to y or z instead of x).
     """
+    num_clouds, num_bins = xyz_points.shape[0], len(bins) + 1
+    ind = point_cloud_to_map_indices(xyz_points, bin_axis, bins, map_size, resolution_in_cm, flip_row_col)
+    return _count_map_indices(ind, num_clouds * map_size * map_size * num_bins, backend).view(
+        num_clouds, map_size, map_size, num_bins
+    )
+
+
+def point_cloud_to_map_indices(
+    xyz_points: torch.Tensor,
+    bin_axis: str,
+    bins: Sequence[float],
+    map_size: int,
+    resolution_in_cm: int,
+    flip_row_col: bool,
+) -> torch.Tensor:
+    """Flat indices, into a (num_clouds x map_size x map_size x (len(bins)+1)) map, of the points of `xyz_points`
+    that fall into the map, see `project_point_cloud_to_map_batched` for the parameters. Counting these indices
+    gives that function's map, adding them into an existing map updates it without building a dense update."""
     bin_dim = ["x", "y", "z"].index(bin_axis)
 
     start_shape = xyz_points.shape
@@ -207,29 +259,36 @@ def project_point_cloud_to_map_batched(
         isnotnan,
     )
 
-    uvw_points_binned_with_index_mat = torch.cat(
-        (
-            torch.repeat_interleave(
-                torch.arange(0, num_clouds).to(xyz_points.device), h * w
-            ).reshape(-1, 1),
-            uvw_points_binned.reshape(-1, 3),
-        ),
-        dim=1,
-    )
-    # from manipulathor_utils.debugger_util import ForkedPdb; ForkedPdb().set_trace()
-
-    uvw_points_binned_with_index_mat[~isvalid.reshape(-1), :] = 0
+    # invalid points are dropped here rather than counted with weight 0
+    cloud_index = torch.arange(num_clouds, device=xyz_points.device).reshape(num_clouds, 1, 1)
     ind = (
-        uvw_points_binned_with_index_mat[:, 0] * (map_size * map_size * num_bins)
-        + uvw_points_binned_with_index_mat[:, 1] * (map_size * num_bins)
-        + uvw_points_binned_with_index_mat[:, 2] * num_bins
-        + uvw_points_binned_with_index_mat[:, 3]
-    )
-    ind[~isvalid.reshape(-1)] = 0
-    count = torch.bincount(
-        ind.view(-1),
-        isvalid.view(-1).long(),
-        minlength=num_clouds * map_size * map_size * num_bins,
+        cloud_index * (map_size * map_size * num_bins)
+        + uvw_points_binned[..., 0] * (map_size * num_bins)
+        + uvw_points_binned[..., 1] * num_bins
+        + uvw_points_binned[..., 2]
     )
+    return ind[isvalid]
 
-    return count.view(num_clouds, map_size, map_size, num_bins)
\ No newline at end of file
+
+def _count_map_indices(ind: torch.Tensor, size: int, backend: str) -> torch.Tensor:
+    """Number of occurrences of every index in [0, size) among `ind`, as a float64 tensor of that size (the
+    dtype the weighted bincount this replaced returned)."""
+    if backend == "bincount":
+        # unit float64 weights count straight into the float64 map, .double() on the counts would be a second pass.
+        # Without any index torch returns int64 zeros whatever the weights, .to() only copies then.
+        weights = torch.ones(ind.shape, dtype=torch.float64, device=ind.device)
+        return torch.bincount(ind, weights, minlength=size).to(torch.float64)
+    elif backend == "scatter_reduce":
+        if not hasattr(torch.Tensor, "scatter_reduce_"):
+            raise ValueError("The scatter_reduce binning backend needs torch 1.12 or later, use bincount")
+        count = torch.zeros(size, dtype=torch.float64, device=ind.device)
+        return count.scatter_reduce_(0, ind, torch.ones(ind.shape, dtype=torch.float64, device=ind.device), reduce="sum")
+    elif backend == "sparse":
+        # only the touched cells are accumulated, the dense map is written once at the end
+        values = torch.ones(ind.shape, dtype=torch.float64, device=ind.device)
+        # the indices are in range by construction, torch versions that check sparse invariants need not
+        no_checks = dict(check_invariants=False) if hasattr(torch.sparse, "check_sparse_tensor_invariants") else {}
+        count = torch.sparse_coo_tensor(ind.unsqueeze(0), values, (size,), **no_checks)
+        return count.coalesce().to_dense()
+    else:
+        raise ValueError("Unknown binning backend {}".format(backend))
@@ -1,3 +1,5 @@
+from typing import Optional
+
 import torch
 from allenact.embodiedai.mapping.mapping_utils.point_cloud_utils import depth_frame_to_world_space_xyz, camera_space_xyz_to_world_xyz
 from utils.noise_in_motion_util import squeeze_bool_mask
@@ -67,3 +69,50 @@ def get_mid_point_of_object_from_depth_and_mask(mask, depth_frame_original, min_
     point_in_world = world_space_point_cloud[valid_points]
     midpoint_agent_coord = point_in_world.mean(dim=0)
     return midpoint_agent_coord
+
+
+class RecencyWeightedPointHistory:
+    """The object midpoints observed during an episode, averaged with weight 1 / (current_step + 1 - step) for
+    a midpoint observed at `step`, the aggregation of the pointnav emulator sensors.
+
+    Midpoints and steps are appended to preallocated arrays (doubled when full) and the average is one
+    vectorized pass over them. The weights of all the midpoints change with every step so there is no exact
+    running sum, but with `window` only the midpoints of the last `window` steps are kept and a step costs
+    O(window) instead of O(episode length).
+    """
+
+    def __init__(self, window: Optional[int] = None, capacity: int = 64):
+        self.window = window
+        self._midpoints = np.empty((capacity, 3), dtype=np.float64)
+        self._steps = np.empty(capacity, dtype=np.float64)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    def append(self, midpoint, step: int):
+        if self._end == len(self._steps):
+            number_kept = len(self)
+            if number_kept * 2 > len(self._steps):
+                self._midpoints = np.concatenate([self._midpoints, np.empty_like(self._midpoints)])
+                self._steps = np.concatenate([self._steps, np.empty_like(self._steps)])
+            self._midpoints[:number_kept] = self._midpoints[self._start:self._end]
+            self._steps[:number_kept] = self._steps[self._start:self._end]
+            self._start, self._end = 0, number_kept
+        self._midpoints[self._end] = midpoint
+        self._steps[self._end] = step
+        self._end += 1
+
+    def _forget_before(self, current_step: int):
+        if self.window is not None:
+            self._start += int(np.searchsorted(self._steps[self._start:self._end], current_step - self.window, side='right'))
+
+    def weighted_average(self, current_step: int) -> Optional[torch.Tensor]:
+        """Weighted average of the midpoints as a float32 tensor, None if there are none (in the window)."""
+        self._forget_before(current_step)
+        if len(self) == 0:
+            return None
+        weights = 1. / (current_step + 1 - self._steps[self._start:self._end])
+        midpoint = weights @ self._midpoints[self._start:self._end] / weights.sum()
+        return torch.from_numpy(midpoint.astype(np.float32))
@@ -0,0 +1,91 @@
+"""Seeded noise for batches of binary object masks: dilation/erosion, pixel dropout and false positive blobs."""
+from typing import Optional
+
+import cv2
+import numpy as np
+
+
+class MaskNoise:
+    """Applies, independently to every mask of a batch,
+
+    - with probability `dilation_erosion_percent` a dilation or an erosion (equally likely) by an elliptical
+      kernel of radius 1 to `max_kernel_radius`,
+    - per pixel dropout of the mask pixels with probability `dropout_percent`,
+    - with probability `false_positive_percent` a false positive disc of radius 1 to `max_blob_radius` at a
+      random position.
+
+    The kernels and blob shapes are built once. All the random numbers of a batch are drawn at once from the
+    generator seeded with `seed`. The masks that get the same morphological operation are stacked (padded so
+    that they do not touch) into one image and dilated or eroded by a single cv2 call, dropout only draws numbers
+    for the mask pixels, and blobs are pasted into their bounding boxes.
+    """
+
+    def __init__(self,
+                 dilation_erosion_percent: float = 0.,
+                 max_kernel_radius: int = 3,
+                 dropout_percent: float = 0.,
+                 false_positive_percent: float = 0.,
+                 max_blob_radius: int = 10,
+                 seed: Optional[int] = None):
+        self.dilation_erosion_percent = dilation_erosion_percent
+        self.dropout_percent = dropout_percent
+        self.false_positive_percent = false_positive_percent
+        self.max_blob_radius = max_blob_radius
+        self.kernels = {radius: cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * radius + 1, 2 * radius + 1))
+                        for radius in range(1, max_kernel_radius + 1)}
+        self.blobs = {radius: cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * radius + 1, 2 * radius + 1)).astype(bool)
+                      for radius in range(1, max_blob_radius + 1)}
+        self.rng = np.random.default_rng(seed)
+
+    def __call__(self, masks: np.ndarray) -> np.ndarray:
+        """Noisy copy of `masks`, a (batch, width, height) or (batch, width, height, 1) array of binary masks,
+        with the same shape and dtype."""
+        batch_size, width, height = masks.shape[:3]
+        noisy = masks.reshape(batch_size, width, height) > 0.5
+
+        if self.dilation_erosion_percent > 0:
+            self._dilate_erode(noisy)
+        if self.dropout_percent > 0:
+            # random numbers only for the mask pixels, the background has nothing to drop
+            mask_pixels = np.flatnonzero(noisy)
+            dropped = mask_pixels[self.rng.random(len(mask_pixels), dtype=np.float32) < self.dropout_percent]
+            noisy.reshape(-1)[dropped] = False
+        if self.false_positive_percent > 0:
+            self._add_false_positives(noisy)
+
+        return noisy.reshape(masks.shape).astype(masks.dtype, copy=False)
+
+    def _dilate_erode(self, noisy: np.ndarray):
+        batch_size, width, height = noisy.shape
+        selected = self.rng.random(batch_size) < self.dilation_erosion_percent
+        dilate = self.rng.random(batch_size) < 0.5
+        radii = self.rng.integers(1, len(self.kernels) + 1, batch_size)
+        for is_dilation in [True, False]:
+            operation = cv2.dilate if is_dilation else cv2.erode
+            # outside of the frame counts as background for a dilation and as mask for an erosion, as in cv2
+            padding_value = 0 if is_dilation else 1
+            for radius, kernel in self.kernels.items():
+                group = np.flatnonzero(selected & (dilate == is_dilation) & (radii == radius))
+                if len(group) == 0:
+                    continue
+                stacked = np.full((len(group), width + 2 * radius, height + 2 * radius), padding_value, dtype=np.uint8)
+                stacked[:, radius:-radius, radius:-radius] = noisy[group]
+                stacked = operation(stacked.reshape(-1, height + 2 * radius), kernel)
+                stacked = stacked.reshape(len(group), width + 2 * radius, height + 2 * radius)
+                noisy[group] = stacked[:, radius:-radius, radius:-radius]
+
+    def _add_false_positives(self, noisy: np.ndarray):
+        batch_size, width, height = noisy.shape
+        group = np.flatnonzero(self.rng.random(batch_size) < self.false_positive_percent)
+        if len(group) == 0:
+            return
+        rows = self.rng.integers(0, width, len(group))
+        cols = self.rng.integers(0, height, len(group))
+        radii = self.rng.integers(1, self.max_blob_radius + 1, len(group))
+        # only the bounding box of every blob is touched, clipped to the frame
+        for index, row, col, radius in zip(group, rows, cols, radii):
+            blob = self.blobs[radius]
+            top, left = row - radius, col - radius
+            first_row, first_col = max(top, 0), max(left, 0)
+            last_row, last_col = min(row + radius + 1, width), min(col + radius + 1, height)
+            noisy[index, first_row:last_row, first_col:last_col] |= blob[first_row - top:last_row - top, first_col - left:last_col - left]
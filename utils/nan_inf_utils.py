@@ -0,0 +1,26 @@
+"""Replacing the NaN and inf values Unity occasionally returns (in depth frames and in metadata) with 0."""
+import math
+from typing import Dict
+
+import numpy as np
+
+
+def scrub_nan_inf(frame: np.ndarray, type_of_frame: str = '') -> np.ndarray:
+    """Sets the NaN and +-inf entries of `frame` to 0 in place and returns it, keeping its dtype. Integer frames
+    (rgb) can not hold either and are returned untouched."""
+    if frame.dtype.kind not in 'fc':
+        return frame
+    # one isfinite pass and one boolean buffer, inverted in place into the mask of entries to clear
+    finite = np.isfinite(frame)
+    if finite.all():
+        return frame
+    non_finite = np.logical_not(finite, out=finite)
+    if type_of_frame:
+        print('Found nan ', type_of_frame, np.count_nonzero(non_finite))
+    frame[non_finite] = 0
+    return frame
+
+
+def scrub_nan_inf_values(flawed_dict: Dict[str, float]) -> Dict[str, float]:
+    """Copy of a dict of numbers (e.g. a metadata position) with NaN and +-inf replaced by 0."""
+    return {k: (0 if v != v or math.isinf(v) else v) for (k, v) in flawed_dict.items()}
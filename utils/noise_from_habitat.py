@@ -15,16 +15,28 @@ from typing import Any, List, Optional, Sequence, Tuple
 
 import attr
 import numpy as np
-import scipy.stats
+import scipy.special
 from attr import Attribute
 from numpy import ndarray
 
 @attr.s(auto_attribs=True, init=False, slots=True)
 class _TruncatedMultivariateGaussian:
+    """Diagonal gaussian truncated to 3 standard deviations.
+
+    Untruncated calls to `sample` are served from blocks of `buffer_size` samples drawn at once from the
+    model's own generator, seeded with `seed` (or from numpy's global random state if it is None). With a
+    `noise_pool` (see utils.noise_pool_utils), every sample is drawn from the pool's uniforms of the current step.
+    """
     mean: np.ndarray
     cov: np.ndarray
-
-    def __init__(self, mean: Sequence, cov: Sequence) -> None:
+    buffer_size: int
+    _rng: np.random.Generator = attr.ib(eq=False, repr=False)
+    _buffer: Optional[np.ndarray] = attr.ib(eq=False, repr=False)
+    _next_sample: int = attr.ib(eq=False, repr=False)
+    noise_pool: Optional[Any] = attr.ib(eq=False, repr=False)
+    _stdev: np.ndarray = attr.ib(eq=False, repr=False)
+
+    def __init__(self, mean: Sequence, cov: Sequence, seed: Optional[Any] = None, buffer_size: int = 256) -> None:
         self.mean = np.array(mean)
         self.cov = np.array(cov)
         if len(self.cov.shape) == 1:
@@ -34,32 +46,59 @@ class _TruncatedMultivariateGaussian:
                 np.count_nonzero(self.cov - np.diag(np.diagonal(self.cov))) == 0
         ), "Only supports diagonal covariance"
 
+        self.buffer_size = buffer_size
+        if seed is None:
+            seed = np.random.randint(2 ** 32)
+        self._rng = np.random.default_rng(seed)
+        self._buffer = None
+        self._next_sample = 0
+        self.noise_pool = None
+        self._stdev = np.sqrt(np.diagonal(self.cov))
+
+    def _draw(self, a, b, size=None) -> ndarray:
+        # inverse transform sampling, as scipy's truncnorm does for these bounds, without its per call overhead
+        if self.noise_pool is not None:
+            lower, upper = scipy.special.ndtr(a), scipy.special.ndtr(b)
+            uniform = lower + (upper - lower) * self.noise_pool.uniforms(len(self.mean))
+        else:
+            uniform = self._rng.uniform(scipy.special.ndtr(a), scipy.special.ndtr(b), size=size)
+        return self.mean + self._stdev * scipy.special.ndtri(uniform)
+
     def sample(
             self,
             truncation: Optional[
                 List[Optional[Tuple[Optional[Any], Optional[Any]]]]
             ] = None,
     ) -> ndarray:
-        if truncation is not None:
-            assert len(truncation) == len(self.mean)
-
-        sample = np.zeros_like(self.mean)
+        if truncation is None and self.noise_pool is not None:
+            return (self.mean + self._stdev * self.noise_pool.truncated_normals(len(self.mean))).astype(self.mean.dtype)
+        if truncation is None:
+            if self._buffer is None or self._next_sample == self.buffer_size:
+                # Always truncate to 3 standard deviations
+                self._buffer = self._draw(-3, 3, size=(self.buffer_size, len(self.mean)))
+                self._next_sample = 0
+            sample = self._buffer[self._next_sample].astype(self.mean.dtype)
+            self._next_sample += 1
+            return sample
+
+        assert len(truncation) == len(self.mean)
+
+        a, b = np.full(len(self.mean), -3.0), np.full(len(self.mean), 3.0)
         for i in range(len(self.mean)):
             stdev = np.sqrt(self.cov[i, i])
             mean = self.mean[i]
-            # Always truncate to 3 standard deviations
-            a, b = -3, 3
 
-            if truncation is not None and truncation[i] is not None:
+            if truncation[i] is not None:
                 trunc = truncation[i]
                 if trunc[0] is not None:
-                    a = max((trunc[0] - mean) / stdev, a)
+                    a[i] = max((trunc[0] - mean) / stdev, a[i])
                 if trunc[1] is not None:
-                    b = min((trunc[1] - mean) / stdev, b)
+                    b[i] = min((trunc[1] - mean) / stdev, b[i])
 
-            sample[i] = scipy.stats.truncnorm.rvs(a, b, mean, stdev)
-
-        return sample
+        # a bound beyond the 3 standard deviations leaves only the end of the support in range, sample that end
+        a, b = np.clip(a, -3.0, 3.0), np.clip(b, -3.0, 3.0)
+        assert np.all(a <= b), "Empty truncation {}".format(truncation)
+        return self._draw(a, b, size=len(self.mean)).astype(self.mean.dtype)
 
 
 @attr.s(auto_attribs=True, slots=True)
@@ -67,8 +106,16 @@ class MotionNoiseModel:
     linear: _TruncatedMultivariateGaussian
     rotation: _TruncatedMultivariateGaussian
 
+    def use_noise_pool(self, noise_pool) -> None:
+        self.linear.noise_pool = noise_pool
+        self.rotation.noise_pool = noise_pool
+
 
 @attr.s(auto_attribs=True, slots=True)
 class ControllerNoiseModel:
     linear_motion: MotionNoiseModel
     rotational_motion: MotionNoiseModel
+
+    def use_noise_pool(self, noise_pool) -> None:
+        self.linear_motion.use_noise_pool(noise_pool)
+        self.rotational_motion.use_noise_pool(noise_pool)
@@ -0,0 +1,118 @@
+"""Pre-generated random numbers for the motion noise models of one environment.
+
+The motion noise models used to call numpy/scipy for one or two numbers at every action, which costs far more in
+call overhead than in arithmetic, and drew them from the global random state, so a noisy evaluation could not be
+reproduced. A `NoisePool` draws uniforms in blocks of `steps_per_block` steps and hands every step its own slot of
+`uniforms_per_step` numbers. A block only depends on (seed, episode, block index), so the noise of any (seed,
+episode, step) is reproduced exactly, whatever happened before it.
+
+Set env_args['noise_pool_seed'] to draw the environment's motion noise from a pool. Without a task sampler's help
+episodes are numbered by the environment's resets, which depends on how the episodes are split between workers;
+the task samplers therefore number every episode by `episode_index` of its data point (see
+ManipulaTHOREnvironment.start_noise_episode), so that the same episode gets the same noise with any number of
+workers.
+"""
+import json
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import scipy.special
+
+
+# the noise models truncate their gaussians to 3 standard deviations, see utils.noise_from_habitat
+TRUNCATION_BOUNDS = (scipy.special.ndtr(-3.0), scipy.special.ndtr(3.0))
+# the uniforms are kept this far from 0 and 1, where ndtri is infinite
+UNIFORM_EPS = 2.0 ** -53
+
+
+def episode_index(*keys: Any) -> int:
+    """A non-negative episode number that only depends on `keys` (e.g. the scene and the data point of an episode),
+    the same in every process."""
+    return zlib.crc32(json.dumps(keys, sort_keys=True, default=str).encode())
+
+
+class NoisePool:
+    """Uniform (and standard normal) random numbers addressed by (seed, episode, step).
+
+    Every draw takes the next uniforms of the current step, `normals` and `truncated_normals` are the same uniforms
+    transformed when their block is generated. Numbers drawn after `start_episode` and before the first
+    `start_step` (when the noise models are reset) come from the episode's slot for step -1.
+
+    # Attributes
+
+    drawn_blocks : Number of blocks generated since the pool was created.
+    """
+
+    def __init__(self, seed: int, uniforms_per_step: int = 16, steps_per_block: int = 256):
+        self.seed = seed
+        self.uniforms_per_step = uniforms_per_step
+        self.steps_per_block = steps_per_block
+        self.episode = -1
+        self.step = -1
+        self.drawn_blocks = 0
+        self._block_key: Optional[Tuple[int, int]] = None
+        self._blocks: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        self._row: Optional[int] = None
+        self._used = 0
+
+    def start_episode(self, episode: Optional[int] = None):
+        """Moves to the reset of `episode`, or of the episode after the current one."""
+        self.episode = self.episode + 1 if episode is None else episode
+        self.start_step(-1)
+
+    def start_step(self, step: int):
+        """Moves to the start of `step` of the current episode, the numbers of a step are the same every time."""
+        self.step = step
+        self._row = None
+        self._used = 0
+
+    def _generate_block(self, block: int):
+        rng = np.random.default_rng([self.seed, self.episode, block])
+        # random() is in [0, 1), 0 would map to an infinite normal
+        uniforms = np.clip(rng.random((self.steps_per_block, self.uniforms_per_step)), UNIFORM_EPS, 1 - UNIFORM_EPS)
+        lower, upper = TRUNCATION_BOUNDS
+        self._blocks = (
+            uniforms,
+            scipy.special.ndtri(uniforms),
+            scipy.special.ndtri(lower + (upper - lower) * uniforms),
+        )
+        self._block_key = (self.episode, block)
+        self.drawn_blocks += 1
+
+    def _take(self, n: int, kind: int) -> np.ndarray:
+        assert self.episode >= 0, "Please call `start_episode` before drawing from the pool."
+        if self._used + n > self.uniforms_per_step:
+            raise ValueError(
+                "Step {} drew more than the {} uniforms of a step, increase uniforms_per_step".format(
+                    self.step, self.uniforms_per_step
+                )
+            )
+        if self._row is None:
+            slot = self.step + 1
+            block = slot // self.steps_per_block
+            if self._block_key != (self.episode, block):
+                self._generate_block(block)
+            self._row = slot % self.steps_per_block
+        numbers = self._blocks[kind][self._row, self._used: self._used + n]
+        self._used += n
+        return numbers
+
+    def uniforms(self, n: int) -> np.ndarray:
+        """The next `n` uniforms in (0, 1) of the current step."""
+        return self._take(n, 0)
+
+    def normals(self, n: int) -> np.ndarray:
+        """The next `n` standard normals of the current step."""
+        return self._take(n, 1)
+
+    def truncated_normals(self, n: int) -> np.ndarray:
+        """The next `n` standard normals truncated to [-3, 3] of the current step."""
+        return self._take(n, 2)
+
+    def normal(self, loc: float = 0.0, scale: float = 1.0) -> float:
+        """A drop-in for np.random.normal(loc, scale)."""
+        return loc + scale * float(self._take(1, 1)[0])
+
+    def metrics(self) -> Dict[str, float]:
+        return {"noise_pool/drawn_blocks": self.drawn_blocks}
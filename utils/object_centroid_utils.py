@@ -0,0 +1,104 @@
+"""Object centroids from masked depth frames, shared by the pointnav emulator sensors of one environment step.
+
+The pointnav emulator sensors used to copy the depth frame, set everything outside their mask to -1 and
+unproject the whole frame to a world space point cloud, once per sensor, although the source and destination
+sensors (and the sensors of the arm and of the agent body) unproject the same frames from the same camera poses.
+`object_centroid_estimator_of(env)` returns an estimator that, within a step, unprojects every (depth frame,
+camera pose) once and computes the centroids of any number of masks over that point cloud with one matrix
+product.
+"""
+from typing import Dict, Hashable, List, Sequence, Tuple
+
+import numpy as np
+import torch
+
+from utils.calculation_utils import calc_world_coordinates
+from utils.noise_in_motion_util import squeeze_bool_mask
+
+
+def _frame_key(depth_frame) -> Hashable:
+    # the memory a frame views rather than its id, squeezed views of the same frame share their point cloud
+    if isinstance(depth_frame, torch.Tensor):
+        return depth_frame.data_ptr(), tuple(depth_frame.shape), depth_frame.stride()
+    return depth_frame.__array_interface__['data'][0], depth_frame.shape, depth_frame.strides
+
+
+class ObjectCentroidEstimator:
+    """Point clouds of the current step, keyed by depth frame and camera pose.
+
+    # Attributes
+
+    computed_point_clouds : Number of depth frames unprojected since the environment was created.
+    reused_point_clouds : Number of centroid requests served from an already unprojected frame.
+    """
+
+    def __init__(self):
+        self.event = None
+        self.point_clouds: Dict[Hashable, Tuple[np.ndarray, torch.Tensor, torch.Tensor]] = {}
+        self.computed_point_clouds = 0
+        self.reused_point_clouds = 0
+
+    def start_step(self, event):
+        self.event = event
+        self.point_clouds = {}
+
+    def _point_cloud(self, depth_frame, min_xyz, camera_xyz, camera_rotation, camera_horizon, fov, device,
+                     zero_depth_is_missing) -> Tuple[torch.Tensor, torch.Tensor]:
+        key = (_frame_key(depth_frame), tuple(np.asarray(camera_xyz, dtype=np.float64) - min_xyz), float(camera_rotation),
+               float(camera_horizon), float(fov), zero_depth_is_missing, str(device))
+        if key in self.point_clouds:
+            self.reused_point_clouds += 1
+            return self.point_clouds[key][1:]
+
+        if isinstance(depth_frame, torch.Tensor):
+            depth = depth_frame.detach().cpu().numpy().astype(np.float32)
+        else:
+            depth = np.array(depth_frame, dtype=np.float32)
+        depth = depth.reshape(depth_frame.shape[0], depth_frame.shape[1])
+        if zero_depth_is_missing:
+            depth[depth == 0] = -1
+        # a point is NaN exactly when its depth is missing (-1) or NaN, cheaper to find on the frame than on the points
+        valid_points = (depth != -1) & (depth == depth)
+        world_space_point_cloud = calc_world_coordinates(min_xyz, camera_xyz, camera_rotation, camera_horizon, fov, device, depth)
+        valid_points = torch.from_numpy(valid_points.reshape(-1)).to(world_space_point_cloud.device)
+        points = world_space_point_cloud.reshape(-1, 3).double().masked_fill_(~valid_points[:, None], 0)
+        # the frame is kept with its point cloud so that its memory can not be reused within the step
+        self.point_clouds[key] = (depth_frame, points, valid_points)
+        self.computed_point_clouds += 1
+        return points, valid_points
+
+    def centroids(self, masks: Sequence, depth_frame, min_xyz, camera_xyz, camera_rotation, camera_horizon, fov,
+                  device, zero_depth_is_missing: bool = True) -> List[Tuple[torch.Tensor, int]]:
+        """(centroid, number of points) of the valid depth points under each of `masks`, as
+        get_mid_point_of_object_from_depth_and_mask computes them: -1 (and, if zero_depth_is_missing, 0) depth is
+        missing, the centroid is a float32 tensor and is NaN for masks without valid points."""
+        points, valid_points = self._point_cloud(depth_frame, min_xyz, camera_xyz, camera_rotation, camera_horizon,
+                                                 fov, device, zero_depth_is_missing)
+        stacked_masks = torch.stack([torch.as_tensor(squeeze_bool_mask(mask)).reshape(-1) for mask in masks])
+        stacked_masks = (stacked_masks.to(valid_points.device) & valid_points).double()
+        number_of_points = stacked_masks.sum(dim=1)
+        sums = stacked_masks @ points
+        centroids = (sums / number_of_points[:, None]).float()
+        return [(centroid, int(count)) for centroid, count in zip(centroids, number_of_points)]
+
+    def centroid(self, mask, depth_frame, min_xyz, camera_xyz, camera_rotation, camera_horizon, fov, device,
+                 zero_depth_is_missing: bool = True) -> Tuple[torch.Tensor, int]:
+        return self.centroids([mask], depth_frame, min_xyz, camera_xyz, camera_rotation, camera_horizon, fov,
+                              device, zero_depth_is_missing)[0]
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "sensors/computed_point_clouds": self.computed_point_clouds,
+            "sensors/reused_point_clouds": self.reused_point_clouds,
+        }
+
+
+def object_centroid_estimator_of(env) -> ObjectCentroidEstimator:
+    estimator = getattr(env, "object_centroid_estimator", None)
+    if estimator is None:
+        estimator = ObjectCentroidEstimator()
+        env.object_centroid_estimator = estimator
+    event = env.controller.last_event
+    if estimator.event is not event:
+        estimator.start_step(event)
+    return estimator
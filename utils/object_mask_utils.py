@@ -0,0 +1,97 @@
+"""Object masks computed straight at a sensor's output resolution from the instance segmentation frame."""
+from typing import Dict, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+
+class ObjectMaskAtResolution:
+    """Mask of one object, `width` rows by `height` columns (the layout the mask sensors return).
+
+    When the segmentation frame has a different resolution, the output pixels are sampled with a nearest
+    neighbour index map, computed once per source resolution the way cv2.resize computes it for INTER_NEAREST,
+    so only the sampled pixels are compared against the object's color. The returned masks are views of buffers
+    owned by this object and are overwritten by the next call.
+    """
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        number_of_pixels = width * height
+        self._index_maps: Dict[Tuple[int, int], Optional[np.ndarray]] = {}
+        self._pixels = np.empty((number_of_pixels, 3), dtype=np.uint8)
+        self._mask = np.empty(number_of_pixels, dtype=bool)
+        self._channel_mask = np.empty(number_of_pixels, dtype=bool)
+
+    def _index_map(self, source_shape: Tuple[int, int]) -> Optional[np.ndarray]:
+        if source_shape not in self._index_maps:
+            if source_shape == (self.width, self.height):
+                index_map = None
+            else:
+                # floor(i * (1 / scale)) as in cv2's resizeNN, i * (source / output) rounds differently for some sizes
+                rows = np.floor(np.arange(self.width) * (1.0 / (self.width / source_shape[0]))).astype(np.intp)
+                cols = np.floor(np.arange(self.height) * (1.0 / (self.height / source_shape[1]))).astype(np.intp)
+                rows = np.minimum(rows, source_shape[0] - 1)
+                cols = np.minimum(cols, source_shape[1] - 1)
+                index_map = (rows[:, None] * source_shape[1] + cols[None, :]).reshape(-1)
+            self._index_maps[source_shape] = index_map
+        return self._index_maps[source_shape]
+
+    def source_pixels_per_pixel(self, segmentation_frame: Optional[np.ndarray]) -> float:
+        """How many segmentation pixels one output pixel stands for, to compare pixel counts with thresholds
+        that were tuned on full resolution masks."""
+        if segmentation_frame is None:
+            return 1.0
+        return segmentation_frame.shape[0] * segmentation_frame.shape[1] / (self.width * self.height)
+
+    def mask(self, segmentation_frame: Optional[np.ndarray], color: Optional[Sequence[int]]) -> np.ndarray:
+        """Boolean (width, height) mask of the pixels of `segmentation_frame` that have `color`, all False if
+        either is missing (the object is not in the scene or segmentation is not rendered)."""
+        mask = self._mask
+        if segmentation_frame is None or color is None:
+            mask[:] = False
+            return mask.reshape(self.width, self.height)
+        pixels = segmentation_frame.reshape(-1, 3)
+        index_map = self._index_map(segmentation_frame.shape[:2])
+        if index_map is not None:
+            pixels = np.take(pixels, index_map, axis=0, out=self._pixels)
+        np.equal(pixels[:, 0], color[0], out=mask)
+        for channel in [1, 2]:
+            np.equal(pixels[:, channel], color[channel], out=self._channel_mask)
+            mask &= self._channel_mask
+        return mask.reshape(self.width, self.height)
+
+
+
+class MaskRegion:
+    """Coarse region of a (width, height, 1) mask: the mask resized to region_size x region_size cells (bilinear,
+    as cv2.resize), thresholded, and every cell repeated number_of_repeat times along both axes.
+
+    The resize, the threshold and the repeats all write into preallocated buffers. The cells are repeated along
+    the columns into a row buffer and the rows are then copied number_of_repeat times through a (region_size,
+    number_of_repeat, output_size) view of the output, so every copy has a contiguous inner axis. The output
+    buffers have `dtype` and two of them are used in turns, the returned region is overwritten by the call after
+    the next one.
+    """
+
+    def __init__(self, region_size: int, number_of_repeat: int, threshold: float = 0.1, dtype=np.float64):
+        self.region_size = region_size
+        self.number_of_repeat = number_of_repeat
+        self.threshold = threshold
+        output_size = region_size * number_of_repeat
+        self._outputs = [np.zeros((output_size, output_size, 1), dtype=dtype) for _ in range(2)]
+        self._resized = np.empty((region_size, region_size), dtype=np.float64)
+        self._cells = np.empty((region_size, region_size), dtype=bool)
+        self._cell_rows = np.empty((region_size, output_size), dtype=dtype)
+
+    def region(self, mask: np.ndarray) -> np.ndarray:
+        mask = mask.reshape(mask.shape[0], mask.shape[1])
+        if mask.dtype != self._resized.dtype:
+            mask = mask.astype(self._resized.dtype)
+        cv2.resize(mask, (self.region_size, self.region_size), dst=self._resized)
+        np.greater(self._resized, self.threshold, out=self._cells)
+        np.copyto(self._cell_rows.reshape(self.region_size, self.region_size, self.number_of_repeat), self._cells[:, :, None])
+        self._outputs.reverse()
+        output = self._outputs[0]
+        np.copyto(output.reshape(self.region_size, self.number_of_repeat, -1), self._cell_rows[:, None, :])
+        return output
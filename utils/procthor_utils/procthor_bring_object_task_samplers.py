@@ -21,6 +21,7 @@ from ithor_arm.ithor_arm_viz import LoggerVisualizer
 from manipulathor_utils.debugger_util import ForkedPdb
 from scripts.dataset_generation.find_categories_to_use import ROBOTHOR_TRAIN, KITCHEN_TRAIN, KITCHEN_TEST, KITCHEN_VAL
 from utils.manipulathor_data_loader_utils import get_random_query_image, get_random_query_feature_from_img_adr
+from utils.noise_pool_utils import episode_index
 from utils.procthor_utils.procthor_types import AgentPose, Vector3
 from utils.stretch_utils.stretch_constants import ADITIONAL_ARM_ARGS
 from utils.stretch_utils.stretch_ithor_arm_environment import StretchManipulaTHOREnvironment
@@ -161,7 +162,8 @@ class ProcTHORDiverseBringObjectTaskSampler(TaskSampler):
         self.episode_index = 0
         self.house_inds_index = 0
         self.reachable_positions_map = {}
-        self.house_dataset = self.house_dataset['train'] #TODO separately for test and val
+        self.house_dataset_split = 'train' #TODO separately for test and val
+        self.house_dataset = self.house_dataset[self.house_dataset_split]
 
         ROOMS_TO_USE = [int(scene.replace('ProcTHOR', '')) for scene in self.scenes]
 
@@ -276,20 +278,21 @@ class ProcTHORDiverseBringObjectTaskSampler(TaskSampler):
             return False
 
         # NOTE: Set reachable positions
+        # all houses are "Procedural" to the env, name this one so the env can share its reachable positions
+        self.env.reachable_positions_scene_key = f"ProcTHOR_{self.house_dataset_split}_{self.house_index}"
         if self.house_index not in self.reachable_positions_map:
             # pose = self.house["metadata"]["agent"].copy()
             # event = self.env.controller.step(action="TeleportFull", **pose)
             # if not event:
             #     get_logger().warning(f"Initial teleport failing in {self.house_index}.")
             #     return False
-            rp_event = self.env.controller.step(action="GetReachablePositions")
-            if not rp_event:
+            reachable_positions = self.env.get_reachable_positions()
+            if not reachable_positions:
                 # NOTE: Skip scenes where GetReachablePositions fails
                 get_logger().warning(
                     f"GetReachablePositions failed in {self.house_index}"
                 )
                 return False
-            reachable_positions = rp_event.metadata["actionReturn"]
             self.reachable_positions_map[self.house_index] = reachable_positions
         return True
 
@@ -380,6 +383,8 @@ class ProcTHORDiverseBringObjectTaskSampler(TaskSampler):
                 f"Teleport failing in {self.house_index} at {starting_pose}"
             )
 
+        # the environment is only reset with a new house, the episodes are numbered here
+        self.env.start_noise_episode(episode_index(self.house_dataset_split, self.house_index, data_point, starting_pose))
         self.episode_index += 1
         # self.max_tasks -= 1 TODO is none decrease when it's inference
 
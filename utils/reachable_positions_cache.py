@@ -0,0 +1,85 @@
+"""Reachable positions cached per scene and agent configuration.
+
+GetReachablePositions depends on the scene, on how the agent is configured and on where the objects are. The
+cache is keyed on the first two only, so one query per (scene, agent configuration) serves the environments and
+task samplers of a process. Passing a directory additionally stores every result as one .npy file, which lets
+later runs skip the query too.
+
+The cached grid is the one of the first reset of a scene: once objects have been moved (the bring-object
+samplers place them anew every episode) it can be stale around them. It is only meant for consumers that
+tolerate that, such as map bounds and exploration coverage. Pass a scene_key of None to get_or_query for the
+exact grid of the current placement.
+"""
+import hashlib
+import json
+import os
+import warnings
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# env_args entries that change what GetReachablePositions returns
+REACHABILITY_ENV_ARGS = ['agentMode', 'agentControllerType', 'gridSize', 'commit_id', 'local_executable_path']
+
+
+def agent_config_hash(env_args: Dict) -> str:
+    config = {k: env_args.get(k) for k in REACHABILITY_ENV_ARGS}
+    return hashlib.md5(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()[:12]
+
+
+class ReachablePositionsCache:
+    def __init__(self):
+        self._positions: Dict[Tuple[str, str], List[Dict[str, float]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _file_name(cache_dir, scene_key, config_hash):
+        scene_key = str(scene_key).replace(os.sep, '_')
+        return os.path.join(cache_dir, '{}_{}.npy'.format(scene_key, config_hash))
+
+    def _load(self, file_name) -> Optional[List[Dict[str, float]]]:
+        if not os.path.isfile(file_name):
+            return None
+        positions = np.load(file_name)
+        return [dict(x=float(x), y=float(y), z=float(z)) for (x, y, z) in positions]
+
+    def _save(self, file_name, positions):
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        # several samplers may write the same scene, so write to a private file and rename it in place
+        tmp_file_name = '{}.{}.tmp.npy'.format(file_name[:-len('.npy')], os.getpid())
+        np.save(tmp_file_name, np.array([[p['x'], p['y'], p['z']] for p in positions], dtype=np.float64))
+        os.replace(tmp_file_name, file_name)
+
+    def get_or_query(self, controller, scene_key: Optional[str], env_args: Dict, cache_dir: Optional[str] = None):
+        """Reachable positions of the scene currently loaded in `controller`, which the caller identifies with
+        `scene_key`. A `scene_key` of None (e.g. a ProcTHOR house nobody named) always queries Unity. The
+        returned list is shared between callers and must not be modified."""
+        key = None
+        if scene_key is not None:
+            key = (scene_key, agent_config_hash(env_args))
+            positions = self._positions.get(key)
+            if positions is None and cache_dir is not None:
+                positions = self._load(self._file_name(cache_dir, *key))
+                if positions is not None:
+                    self._positions[key] = positions
+            if positions is not None:
+                self.hits += 1
+                return positions
+
+        self.misses += 1
+        event = controller.step(action="GetReachablePositions")
+        if not event.metadata["lastActionSuccess"]:
+            warnings.warn(
+                "Error when getting reachable points: {}".format(event.metadata["errorMessage"])
+            )
+            return []
+        positions = event.metadata["actionReturn"]
+        if key is not None and positions:
+            self._positions[key] = positions
+            if cache_dir is not None:
+                self._save(self._file_name(cache_dir, *key), positions)
+        return positions
+
+
+REACHABLE_POSITIONS_CACHE = ReachablePositionsCache()
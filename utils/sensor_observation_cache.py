@@ -0,0 +1,97 @@
+"""Sensor observations memoized per environment step.
+
+Mask sensors are listed as sensors of their own and are also wrapped by one or more pointnav emulator
+sensors, which call their get_observation again. Decorating a get_observation with
+`memoize_observation_per_step` makes every call after the first one in the same step (same controller
+event and task) return the first result, so a sensor instance is computed at most once per step however
+many consumers it has. The result is shared, consumers must copy it before modifying it in place.
+
+Sensors that set `observation_key` (see `observation_key_from_settings`) share one observation with every
+sensor of the same class and settings instead of only with themselves, and the observations of the previous
+step are kept so that PrevFrameSensor can return them without processing the frame again.
+"""
+import functools
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class StepObservationCache:
+    """Observations of the current and the previous step of one environment, keyed by observation_key.
+
+    # Attributes
+
+    computed : Number of observations computed since the environment was created.
+    reused : Number of get_observation calls answered from the cache, i.e. recomputations avoided.
+    """
+
+    def __init__(self):
+        self.event = None
+        self.task = None
+        self.observations: Dict[Hashable, Tuple[Any, Any]] = {}
+        self.previous_observations: Dict[Hashable, Tuple[Any, Any]] = {}
+        self.computed = 0
+        self.reused = 0
+
+    def start_step(self, event, task):
+        if task is self.task:
+            self.previous_observations = self.observations
+        else:
+            self.previous_observations = {}
+        self.event = event
+        self.task = task
+        self.observations = {}
+
+    def previous_observation(self, sensor) -> Optional[Any]:
+        """The observation `sensor` (or a sensor with the same observation_key) returned in the previous step
+        of the current task, None if there is none."""
+        previous = self.previous_observations.get(observation_key(sensor))
+        if previous is None:
+            return None
+        self.reused += 1
+        return previous[1]
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "sensors/computed_observations": self.computed,
+            "sensors/reused_observations": self.reused,
+        }
+
+
+def observation_key(sensor) -> Hashable:
+    key = getattr(sensor, "observation_key", None)
+    return id(sensor) if key is None else key
+
+
+def observation_key_from_settings(sensor, *args, **kwargs) -> Hashable:
+    """Key shared by the sensors of the same class constructed with the same arguments, the uuid only names
+    the output."""
+    settings = sorted((k, repr(v)) for (k, v) in kwargs.items() if k != "uuid")
+    return (type(sensor).__name__, repr(args), tuple(settings))
+
+
+def observation_cache_of(env) -> StepObservationCache:
+    cache = getattr(env, "observation_cache", None)
+    if cache is None:
+        cache = StepObservationCache()
+        env.observation_cache = cache
+    return cache
+
+
+def memoize_observation_per_step(get_observation):
+    @functools.wraps(get_observation)
+    def wrapper(self, env, task, *args, **kwargs):
+        cache = observation_cache_of(env)
+        event = env.controller.last_event
+        if cache.event is not event or cache.task is not task:
+            cache.start_step(event, task)
+        key = observation_key(self)
+        cached = cache.observations.get(key)
+        if cached is not None:
+            cache.reused += 1
+            return cached[1]
+        observation = get_observation(self, env, task, *args, **kwargs)
+        # the sensor is kept next to its observation so that its id can not be reused within the step
+        cache.observations[key] = (self, observation)
+        cache.computed += 1
+        return observation
+
+    return wrapper
@@ -28,6 +28,7 @@ from torch.distributions.utils import lazy_property
 
 from ithor_arm.arm_calculation_utils import (
     convert_world_to_agent_coordinate,
+    convert_world_to_agent_coordinate_batched,
     convert_state_to_tensor,
     diff_position,
 )
@@ -35,13 +36,15 @@ from ithor_arm.ithor_arm_environment import ManipulaTHOREnvironment
 from ithor_arm.ithor_arm_sensors import DepthSensorThor
 from manipulathor_utils.debugger_util import ForkedPdb
 #
-from utils.calculation_utils import calc_world_coordinates
+from utils.calculation_utils import calc_world_coordinates, RecencyWeightedPointHistory
 from utils.detection_translator_util import THOR2COCO
 from utils.noise_in_motion_util import squeeze_bool_mask
+from utils.object_centroid_utils import object_centroid_estimator_of
 from utils.real_stretch_utils import get_binary_mask_of_arm, get_mid_point_of_object_from_depth_and_mask
 from utils.stretch_utils.stretch_constants import INTEL_RESIZED_H, INTEL_RESIZED_W, KINECT_REAL_W, KINECT_REAL_H, \
     MAX_INTEL_DEPTH, MIN_INTEL_DEPTH, MAX_KINECT_DEPTH, MIN_KINECT_DEPTH, INTEL_FOV_W, INTEL_FOV_H, KINECT_FOV_W, \
     KINECT_FOV_H
+from utils.sensor_observation_cache import memoize_observation_per_step
 
 
 class RealRGBSensorStretchIntel(
@@ -156,6 +159,7 @@ class StretchDetectronObjectMask(Sensor):
         return DefaultPredictor(self.cfg)
 
 
+    @memoize_observation_per_step
     def get_observation(
             self, env: ManipulaTHOREnvironment, task: Task, *args: Any, **kwargs: Any
     ) -> Any:
@@ -244,6 +248,7 @@ class StretchObjectMask(Sensor):
         self.cache = None
         super().__init__(**prepare_locals_for_super(locals()))
 
+    @memoize_observation_per_step
     def get_observation(
             self, env: ManipulaTHOREnvironment, task: Task, *args: Any, **kwargs: Any
     ) -> Any:
@@ -327,7 +332,7 @@ class RealStretchPickedUpObjSensor(Sensor):
 
 class RealKinectArmPointNavEmulSensor(Sensor):
 
-    def __init__(self, type: str, mask_sensor:Sensor, depth_sensor:Sensor, arm_mask_sensor:Sensor, uuid: str = "arm_point_nav_emul", **kwargs: Any):
+    def __init__(self, type: str, mask_sensor:Sensor, depth_sensor:Sensor, arm_mask_sensor:Sensor, history_window: Optional[int] = None, uuid: str = "arm_point_nav_emul", **kwargs: Any):
         observation_space = gym.spaces.Box(
             low=0, high=1, shape=(1,), dtype=np.float32
         )  # (low=-1.0, high=2.0, shape=(3, 4), dtype=np.float32)
@@ -342,6 +347,8 @@ class RealKinectArmPointNavEmulSensor(Sensor):
         self.dummy_answer = torch.zeros(3)
         self.dummy_answer[:] = 4 # is this good enough?
         self.device = torch.device("cpu")
+        # only the midpoints of the last history_window steps are averaged, all of them if None
+        self.history_window = history_window
         super().__init__(**prepare_locals_for_super(locals()))
     def get_camera_int_ext(self,env):
         #TODO all these values need to be checked
@@ -357,11 +364,11 @@ class RealKinectArmPointNavEmulSensor(Sensor):
         #TODO remove
         if self.type == 'destination':
             return self.dummy_answer
-        mask = (self.mask_sensor.get_observation(env, task, *args, **kwargs)) #TODO this is called multiple times?
+        mask = (self.mask_sensor.get_observation(env, task, *args, **kwargs)) # memoized per step, see utils.sensor_observation_cache
         depth_frame_original = self.depth_sensor.get_observation(env, task, *args, **kwargs).squeeze(-1)
 
         if task.num_steps_taken() == 0:
-            self.pointnav_history_aggr = []
+            self.pointnav_history_aggr = RecencyWeightedPointHistory(self.history_window)
             self.real_prev_location = None
             self.belief_prev_location = None
 
@@ -371,15 +378,15 @@ class RealKinectArmPointNavEmulSensor(Sensor):
 
         if mask.sum() != 0:
 
-            midpoint_agent_coord = get_mid_point_of_object_from_depth_and_mask(mask, depth_frame_original, self.min_xyz, camera_xyz, camera_rotation, camera_horizon, fov, self.device)
+            midpoint_agent_coord, _ = object_centroid_estimator_of(env).centroid(mask, depth_frame_original, self.min_xyz, camera_xyz, camera_rotation, camera_horizon, fov, self.device)
             if not torch.any(torch.isnan(midpoint_agent_coord) + torch.isinf(midpoint_agent_coord)):
-                self.pointnav_history_aggr.append((midpoint_agent_coord.cpu(), 1, task.num_steps_taken()))
+                self.pointnav_history_aggr.append(midpoint_agent_coord.cpu(), task.num_steps_taken())
 
-        arm_mask = self.arm_mask_sensor.get_observation(env, task, *args, **kwargs) #TODO this is also called twice
+        arm_mask = self.arm_mask_sensor.get_observation(env, task, *args, **kwargs) # memoized per step, see utils.sensor_observation_cache
         if arm_mask.sum() == 0: #Do we want to do some approximations or no?
             arm_world_coord = None #TODO approax for this
         else:
-            arm_world_coord = get_mid_point_of_object_from_depth_and_mask(arm_mask, depth_frame_original, self.min_xyz, camera_xyz, camera_rotation, camera_horizon, fov, self.device)
+            arm_world_coord, _ = object_centroid_estimator_of(env).centroid(arm_mask, depth_frame_original, self.min_xyz, camera_xyz, camera_rotation, camera_horizon, fov, self.device)
             # distance_in_agent_coord = midpoint_agent_coord - arm_location_in_camera
             # result = distance_in_agent_coord.cpu()
         if arm_mask.sum() != 0 or mask.sum() != 0:
@@ -392,22 +399,12 @@ class RealKinectArmPointNavEmulSensor(Sensor):
         result = self.history_aggregation(camera_xyz, camera_rotation, arm_world_coord, task.num_steps_taken())
         return result
     def history_aggregation(self, camera_xyz, camera_rotation, arm_world_coord, current_step_number):
-        if len(self.pointnav_history_aggr) == 0 or arm_world_coord is None:
+        midpoint = self.pointnav_history_aggr.weighted_average(current_step_number)
+        if midpoint is None or arm_world_coord is None:
             return self.dummy_answer
         else:
-            weights = [1. / (current_step_number + 1 - num_steps) for mid,num_pixels,num_steps in self.pointnav_history_aggr]
-            total_weights = sum(weights)
-            total_sum = [mid * (1. / (current_step_number + 1 - num_steps)) for mid,num_pixels,num_steps in self.pointnav_history_aggr]
-            total_sum = sum(total_sum)
-            midpoint = total_sum / total_weights
-            agent_state = dict(position=dict(x=camera_xyz[0], y=camera_xyz[1], z=camera_xyz[2], ), rotation=dict(x=0, y=camera_rotation, z=0))
-            midpoint_position_rotation = dict(position=dict(x=midpoint[0], y=midpoint[1], z=midpoint[2]), rotation=dict(x=0,y=0,z=0))
-            midpoint_agent_coord = convert_world_to_agent_coordinate(midpoint_position_rotation, agent_state)
-            midpoint_agent_coord = torch.Tensor([midpoint_agent_coord['position'][k] for k in ['x','y','z']])
-
-            arm_world_coord = dict(position=dict(x=arm_world_coord[0], y=arm_world_coord[1], z=arm_world_coord[2]), rotation=dict(x=0,y=0,z=0))
-            arm_state_agent_coord = convert_world_to_agent_coordinate(arm_world_coord, agent_state)
-            arm_state_agent_coord = torch.Tensor([arm_state_agent_coord['position'][k] for k in ['x','y','z']])
+            midpoint_agent_coord, arm_state_agent_coord = torch.Tensor(convert_world_to_agent_coordinate_batched(
+                [midpoint.numpy(), [arm_world_coord[0], arm_world_coord[1], arm_world_coord[2]]], camera_xyz, camera_rotation))
 
             distance_in_agent_coord = midpoint_agent_coord - arm_state_agent_coord
 
@@ -421,6 +418,7 @@ class KinectArmMaskSensor(Sensor):
         )  # (low=-1.0, high=2.0, shape=(3, 4), dtype=np.float32)
         super().__init__(**prepare_locals_for_super(locals()))
 
+    @memoize_observation_per_step
     def get_observation(
             self, env: ManipulaTHOREnvironment, task: Task, *args: Any, **kwargs: Any
     ) -> Any:
@@ -431,7 +429,7 @@ class KinectArmMaskSensor(Sensor):
 
 class RealIntelAgentBodyPointNavEmulSensor(Sensor):
 
-    def __init__(self, type: str, mask_sensor:Sensor, depth_sensor:Sensor, uuid: str = "point_nav_emul", **kwargs: Any):
+    def __init__(self, type: str, mask_sensor:Sensor, depth_sensor:Sensor, history_window: Optional[int] = None, uuid: str = "point_nav_emul", **kwargs: Any):
         observation_space = gym.spaces.Box(
             low=0, high=1, shape=(1,), dtype=np.float32
         )  # (low=-1.0, high=2.0, shape=(3, 4), dtype=np.float32)
@@ -444,6 +442,8 @@ class RealIntelAgentBodyPointNavEmulSensor(Sensor):
         self.dummy_answer = torch.zeros(3)
         self.dummy_answer[:] = 4 # is this good enough?
         self.device = torch.device("cpu")
+        # only the midpoints of the last history_window steps are averaged, all of them if None
+        self.history_window = history_window
 
 
         super().__init__(**prepare_locals_for_super(locals()))
@@ -466,7 +466,7 @@ class RealIntelAgentBodyPointNavEmulSensor(Sensor):
         mask = (self.mask_sensor.get_observation(env, task, *args, **kwargs))
 
         if task.num_steps_taken() == 0:
-            self.pointnav_history_aggr = []
+            self.pointnav_history_aggr = RecencyWeightedPointHistory(self.history_window)
             self.real_prev_location = None
             self.belief_prev_location = None
 
@@ -476,8 +476,8 @@ class RealIntelAgentBodyPointNavEmulSensor(Sensor):
 
         if mask.sum() != 0:
             depth_frame_original = self.depth_sensor.get_observation(env, task, *args, **kwargs).squeeze(-1)
-            middle_of_object = get_mid_point_of_object_from_depth_and_mask(mask, depth_frame_original, self.min_xyz, camera_xyz, camera_rotation, camera_horizon, fov, self.device)
-            self.pointnav_history_aggr.append((middle_of_object.cpu(), 1, task.num_steps_taken()))
+            middle_of_object, _ = object_centroid_estimator_of(env).centroid(mask, depth_frame_original, self.min_xyz, camera_xyz, camera_rotation, camera_horizon, fov, self.device)
+            self.pointnav_history_aggr.append(middle_of_object.cpu(), task.num_steps_taken())
 
             # result = middle_of_object.cpu()
         # else:
@@ -485,14 +485,10 @@ class RealIntelAgentBodyPointNavEmulSensor(Sensor):
         result = self.history_aggregation(camera_xyz, camera_rotation, task.num_steps_taken())
         return result
     def history_aggregation(self, camera_xyz, camera_rotation, current_step_number):
-        if len(self.pointnav_history_aggr) == 0:
+        midpoint = self.pointnav_history_aggr.weighted_average(current_step_number)
+        if midpoint is None:
             return self.dummy_answer
         else:
-            weights = [1. / (current_step_number + 1 - num_steps) for mid,num_pixels,num_steps in self.pointnav_history_aggr]
-            total_weights = sum(weights)
-            total_sum = [mid * (1. / (current_step_number + 1 - num_steps)) for mid,num_pixels,num_steps in self.pointnav_history_aggr]
-            total_sum = sum(total_sum)
-            midpoint = total_sum / total_weights
             agent_state = dict(position=dict(x=camera_xyz[0], y=camera_xyz[1], z=camera_xyz[2], ), rotation=dict(x=0, y=camera_rotation, z=0))
             midpoint_position_rotation = dict(position=dict(x=midpoint[0], y=midpoint[1], z=midpoint[2]), rotation=dict(x=0,y=0,z=0))
             midpoint_agent_coord = convert_world_to_agent_coordinate(midpoint_position_rotation, agent_state)
@@ -15,8 +15,9 @@ from ithor_arm.ithor_arm_viz import LoggerVisualizer
 from manipulathor_utils.debugger_util import ForkedPdb
 from scripts.dataset_generation.find_categories_to_use import ROBOTHOR_TRAIN, KITCHEN_TRAIN, KITCHEN_TEST, KITCHEN_VAL
 from utils.manipulathor_data_loader_utils import get_random_query_image, get_random_query_feature_from_img_adr
+from utils.noise_pool_utils import episode_index
 from utils.stretch_utils.stretch_ithor_arm_environment import StretchManipulaTHOREnvironment
-from scripts.stretch_jupyter_helper import get_reachable_positions, transport_wrapper
+from scripts.stretch_jupyter_helper import transport_wrapper
 from utils.stretch_utils.stretch_visualizer import StretchBringObjImageVisualizer
 
 
@@ -256,6 +257,7 @@ class StretchDiverseBringObjectTaskSampler(TaskSampler):
         agent_state = data_point["initial_agent_pose"]
 
         self.reset_scene(scene_name)
+        self.env.start_noise_episode(episode_index(data_point))
         # just because name of objects are changed
         def convert_name(env, object_info):
             prev_object_id = object_info['object_id']
@@ -14,7 +14,6 @@ from allenact_plugins.ithor_plugin.ithor_environment import IThorEnvironment
 
 from ithor_arm.ithor_arm_viz import LoggerVisualizer
 from scripts.hacky_objects_that_move import CONSTANTLY_MOVING_OBJECTS
-from scripts.stretch_jupyter_helper import get_reachable_positions_stretch
 from utils.calculation_utils import position_distance
 
 from utils.stretch_utils.stretch_constants import (
@@ -180,6 +179,7 @@ class AbstractStretchBringObjectTask(Task[IThorEnvironment]):
         result = super(AbstractStretchBringObjectTask, self).metrics()
         if self.is_done():
             result = {**result, **self.calc_action_stat_metrics()}
+            result = {**result, **self.env.controller_metrics()}
             final_obj_distance_from_goal = self.obj_distance_from_goal()
             result[
                 "metric/average/final_obj_distance_from_goal"
@@ -280,7 +280,7 @@ class StretchExploreWiseRewardTask(AbstractStretchBringObjectTask):
         self.agent_body_dist_to_obj = []
 
     def set_reachable_positions(self):
-        all_locations = [[k['x'], k['y'], k['z']] for k in get_reachable_positions_stretch(self.env.controller)]
+        all_locations = [[k['x'], k['y'], k['z']] for k in self.env.get_reachable_positions(use_cache=False)]
         if len(all_locations) == 0:#TODO more investigtaion on this
             all_locations = [[0,0,0]]
             print('NO AGENT LOCATION FOUND FOR', self.task_info['scene_name'])
@@ -577,7 +577,7 @@ class StretchObjectNavTask(StretchExploreWiseRewardTask):
     )
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        all_locations = [[k['x'], k['y'], k['z']] for k in get_reachable_positions_stretch(self.env.controller)]
+        all_locations = [[k['x'], k['y'], k['z']] for k in self.env.get_reachable_positions(use_cache=False)]
         self.all_reachable_positions = torch.Tensor(all_locations)
         self.has_visited = torch.zeros((len(self.all_reachable_positions), 1))
         self.source_observed_reward = False
@@ -1,3 +1,5 @@
+from types import MappingProxyType
+
 import ai2thor
 import ai2thor.fifo_server
 
@@ -84,6 +86,11 @@ ADITIONAL_ARM_ARGS = {
     "speed": 1,
 }
 
+ARM_ACTION_TEMPLATES = MappingProxyType({
+    name: MappingProxyType(dict(action=name, **ADITIONAL_ARM_ARGS))
+    for name in ["MoveAgent", "RotateAgent", "MoveArm", "MoveArmBase"]
+})
+
 MOVE_ARM_CONSTANT = 0.05
 ARM_LENGTH = 1.
 
@@ -2,6 +2,9 @@
 
 import copy
 import datetime
+import math
+from collections import deque
+import time
 import typing
 import warnings
 from typing import Dict, Union, Optional
@@ -15,16 +18,18 @@ from torch.distributions.utils import lazy_property
 
 from ithor_arm.ithor_arm_environment import ManipulaTHOREnvironment
 from ithor_arm.ithor_arm_noise_models import NoiseInMotionHabitatFlavor, NoiseInMotionSimple1DNormal
+from utils.noise_pool_utils import NoisePool
+from ithor_arm.supervised_controller import SupervisedController
 
 from utils.stretch_utils.stretch_constants import (
-    ADITIONAL_ARM_ARGS,
+    ADITIONAL_ARM_ARGS, ARM_ACTION_TEMPLATES,
     PICKUP, DONE, MOVE_AHEAD, ROTATE_RIGHT, ROTATE_LEFT, MOVE_BACK, MOVE_ARM_HEIGHT_P, MOVE_ARM_HEIGHT_M, MOVE_ARM_Z_P, MOVE_ARM_Z_M, MOVE_WRIST_P, MOVE_WRIST_M, MOVE_WRIST_P_SMALL, MOVE_WRIST_M_SMALL, ROTATE_LEFT_SMALL, ROTATE_RIGHT_SMALL,
 )
 from manipulathor_utils.debugger_util import ForkedPdb
 from scripts.jupyter_helper import ARM_MOVE_CONSTANT
 from scripts.stretch_jupyter_helper import get_relative_stretch_current_arm_state, WRIST_ROTATION, \
-    reset_environment_and_additional_commands, AGENT_ROTATION_DEG, AGENT_MOVEMENT_CONSTANT, \
-    remove_nan_inf_for_frames, get_reachable_positions
+    reset_environment_and_additional_commands, AGENT_ROTATION_DEG, AGENT_MOVEMENT_CONSTANT
+from utils.nan_inf_utils import scrub_nan_inf
 from utils.stretch_utils.stretch_constants import STRETCH_MANIPULATHOR_COMMIT_ID
 from utils.stretch_utils.stretch_sim2real_utils import kinect_reshape, intel_reshape
 
@@ -40,6 +45,10 @@ class StretchManipulaTHOREnvironment(ManipulaTHOREnvironment): #TODO this comes
 
     controller : The ai2thor controller.
     """
+
+    action_templates = ARM_ACTION_TEMPLATES
+    additional_arm_args = ADITIONAL_ARM_ARGS
+
     def __init__(
             self,
             x_display: Optional[str] = None,
@@ -123,10 +132,40 @@ class StretchManipulaTHOREnvironment(ManipulaTHOREnvironment): #TODO this comes
                 ForkedPdb().set_trace()
         else:
             self.noise_model = NoiseInMotionHabitatFlavor(effect_scale=0.0) # un-noise model
+        # Draw the motion noise from pre-generated blocks, replayable by (seed, episode, step), see
+        # utils.noise_pool_utils. The task samplers number the episodes (start_noise_episode), so with the same
+        # env_args['noise_pool_seed'] in every worker an episode gets the same noise whichever worker runs it.
+        self.noise_pool = NoisePool(env_args['noise_pool_seed']) if 'noise_pool_seed' in env_args else None
+        if self.noise_pool is not None:
+            self.noise_model.use_noise_pool(self.noise_pool)
+        # steps of the noise pool are counted from this action on
+        self.noise_episode_first_action = 0
 
         self.ahead_nominal = AGENT_MOVEMENT_CONSTANT
         self.rotate_nominal = AGENT_ROTATION_DEG
 
+        self.copy_free_step = env_args.get('copy_free_step', True)
+        # wall-clock seconds of the most recent env steps, controller calls included
+        self.step_latencies = deque(maxlen=1000)
+        # filled by sensors decorated with utils.sensor_observation_cache.memoize_observation_per_step
+        self.observation_cache = None
+        # point clouds shared by the pointnav emulator sensors, see utils.object_centroid_utils
+        self.object_centroid_estimator = None
+        self.reachable_positions_scene_key: Optional[str] = None
+        self._object_index_event: Optional[ai2thor.server.Event] = None
+        self._object_index: Dict[str, Dict] = {}
+        self._object_views: Dict[str, Dict] = {}
+        self._object_locations_event: Optional[ai2thor.server.Event] = None
+        self._object_locations = None
+        self._frames_event: Optional[ai2thor.server.Event] = None
+        self._frames: Dict[str, np.ndarray] = {}
+        # number of camera frames processed, at most one per property and event
+        self.frame_computations = 0
+        # kinect_reshape masks the kinect depth with a random clip_depth_kinect_frame mask. By default every read
+        # of kinect_depth draws its own, set env_args['share_kinect_depth_noise'] = True to memoize it like the
+        # other frames, so that all sensors see the same mask within a step.
+        self.share_kinect_depth_noise = env_args.get('share_kinect_depth_noise', False)
+
         # self.start(None)
 
 
@@ -134,8 +173,8 @@ class StretchManipulaTHOREnvironment(ManipulaTHOREnvironment): #TODO this comes
         self.docker_enabled = docker_enabled
 
 
-        self.MEMORY_SIZE = 5
-        # self.memory_frames = []
+        self.MEMORY_SIZE = env_args.get('memory_size', 0)
+        self.memory_frames = deque(maxlen=self.MEMORY_SIZE)
 
 
         if "quality" not in self.env_args:
@@ -146,8 +185,6 @@ class StretchManipulaTHOREnvironment(ManipulaTHOREnvironment): #TODO this comes
         # os.makedirs(directory_to_save, exist_ok=True)
         # timestamp = datetime.datetime.now().strftime("%Y_%m_%d_%H_%M_%S_%f.txt")
 
-    def get_reachable_positions(self):
-        return get_reachable_positions(self.controller)
     def start(
             self,
             scene_name: Optional[str],
@@ -195,7 +232,7 @@ class StretchManipulaTHOREnvironment(ManipulaTHOREnvironment): #TODO this comes
     ):
         self._move_mag = move_mag
         self._grid_size = self._move_mag
-        # self.memory_frames = []
+        self.memory_frames.clear()
 
         if scene_name is None:
             scene_name = self.controller.last_event.metadata["sceneName"]
@@ -207,27 +244,28 @@ class StretchManipulaTHOREnvironment(ManipulaTHOREnvironment): #TODO this comes
             reset_environment_and_additional_commands(self.controller, scene_name)
         except Exception as e:
             print("RESETTING THE SCENE,", scene_name, 'because of', str(e))
-            self.controller = self.create_controller()
+            self.controller.restart()
             reset_environment_and_additional_commands(self.controller, scene_name)
 
         if self.object_open_speed != 1.0:
-            self.controller.step(
+            self.controller.setup_step(
                 {"action": "ChangeOpenSpeed", "x": self.object_open_speed}
             )
 
         self._initially_reachable_points = None
         self._initially_reachable_points_set = None
-        self.controller.step({"action": "GetReachablePositions"})
-        if not self.controller.last_event.metadata["lastActionSuccess"]:
-            warnings.warn(
-                "Error when getting reachable points: {}".format(
-                    self.controller.last_event.metadata["errorMessage"]
-                )
-            )
-        self._initially_reachable_points = self.last_action_return
+        # procedural houses all share a scene name, the task sampler names them once the house is created
+        self.reachable_positions_scene_key = None if scene_name == 'Procedural' else scene_name
+        # the agent is snapped back onto this grid, so it has to match the objects of this episode
+        self._initially_reachable_points = self.get_reachable_positions(
+            use_cache=not self.restrict_to_initially_reachable_points
+        )
 
         self.list_of_actions_so_far = []
 
+        if self.noise_pool is not None:
+            self.noise_pool.start_episode()
+        self.noise_episode_first_action = 0
         self.noise_model.reset_noise_model()
         self.nominal_agent_location = self.get_agent_location()
 
@@ -250,75 +288,88 @@ class StretchManipulaTHOREnvironment(ManipulaTHOREnvironment): #TODO this comes
         controller = Controller(**self.env_args)#, commit_id=STRETCH_MANIPULATHOR_COMMIT_ID)
         return controller
 
-    @lazy_property
-    def controller(self):
-        self._started = True
+    def create_checked_controller(self):
         controller = self.create_controller()
         self.check_controller_version(controller)
         controller.docker_enabled = self.docker_enabled  # type: ignore
         return controller
 
+    @lazy_property
+    def controller(self):
+        self._started = True
+        return SupervisedController(
+            self.create_checked_controller, keep_standby=self.env_args.get('controller_standby', False)
+        )
+
+    def _memoized_frame(self, name: str, compute) -> np.ndarray:
+        """Processed camera frames are computed once per event, the result is shared between all sensors
+        reading it during the step and is therefore read-only."""
+        event = self.controller.last_event
+        if self._frames_event is not event:
+            self._frames_event = event
+            self._frames = {}
+        frame = self._frames.get(name)
+        if frame is None:
+            frame = compute(event)
+            frame.flags.writeable = False
+            self._frames[name] = frame
+            self.frame_computations += 1
+        return frame
+
     @property
     def kinect_frame(self) -> np.ndarray:
         """Returns rgb image corresponding to the agent's egocentric view."""
-        frame = self.controller.last_event.third_party_camera_frames[0].copy()
-        frame = remove_nan_inf_for_frames(frame, 'kinect_frame')
-        return kinect_reshape(frame)
+        return self._memoized_frame('kinect_frame', lambda event: kinect_reshape(self.kinect_frame_no_reshape))
 
     @property
     def kinect_frame_no_reshape(self) -> np.ndarray:
         """Returns rgb image corresponding to the agent's egocentric view."""
-        frame = self.controller.last_event.third_party_camera_frames[0].copy()
-        frame = remove_nan_inf_for_frames(frame, 'kinect_frame')
-        return frame
-    
+        return self._memoized_frame(
+            'kinect_frame_no_reshape',
+            lambda event: scrub_nan_inf(event.third_party_camera_frames[0].copy(), 'kinect_frame'),
+        )
+
     @property
     def kinect_depth(self) -> np.ndarray:
         """Returns rgb image corresponding to the agent's egocentric view."""
-        depth_frame = self.controller.last_event.third_party_depth_frames[0].copy()
-        depth_frame = remove_nan_inf_for_frames(depth_frame, 'depth_kinect')
-
-        # #TODO remove
-        if np.sum(depth_frame != self.controller.last_event.third_party_depth_frames[0].copy()) > 10:
-            ForkedPdb().set_trace()
-
-        return kinect_reshape(depth_frame)
+        if not self.share_kinect_depth_noise:
+            self.frame_computations += 1
+            return kinect_reshape(self.kinect_depth_no_reshape)
+        return self._memoized_frame('kinect_depth', lambda event: kinect_reshape(self.kinect_depth_no_reshape))
 
-    
     @property
     def kinect_depth_no_reshape(self) -> np.ndarray:
         """Returns rgb image corresponding to the agent's egocentric view."""
-        depth_frame = self.controller.last_event.third_party_depth_frames[0].copy()
-        depth_frame = remove_nan_inf_for_frames(depth_frame, 'depth_kinect')
-        return depth_frame
+        return self._memoized_frame(
+            'kinect_depth_no_reshape',
+            lambda event: scrub_nan_inf(event.third_party_depth_frames[0].copy(), 'depth_kinect'),
+        )
 
     @property
     def intel_frame(self) -> np.ndarray:
         """Returns rgb image corresponding to the agent's egocentric view."""
-        frame = self.controller.last_event.frame.copy()
-        frame = remove_nan_inf_for_frames(frame, 'intel_frame')
-        return intel_reshape(frame)
+        return self._memoized_frame('intel_frame', lambda event: intel_reshape(self.intel_frame_no_reshape))
 
     @property
     def intel_frame_no_reshape(self) -> np.ndarray:
         """Returns rgb image corresponding to the agent's egocentric view."""
-        frame = self.controller.last_event.frame.copy()
-        frame = remove_nan_inf_for_frames(frame, 'intel_frame')
-        return frame
-    
+        return self._memoized_frame(
+            'intel_frame_no_reshape',
+            lambda event: scrub_nan_inf(event.frame.copy(), 'intel_frame'),
+        )
+
     @property
     def intel_depth(self) -> np.ndarray:
         """Returns rgb image corresponding to the agent's egocentric view."""
-        depth_frame = self.controller.last_event.depth_frame.copy()
-        depth_frame = remove_nan_inf_for_frames(depth_frame, 'depth_intel')
-        return intel_reshape(depth_frame)
+        return self._memoized_frame('intel_depth', lambda event: intel_reshape(self.intel_depth_no_reshape))
 
     @property
     def intel_depth_no_reshape(self) -> np.ndarray:
         """Returns rgb image corresponding to the agent's egocentric view."""
-        depth_frame = self.controller.last_event.depth_frame.copy()
-        depth_frame = remove_nan_inf_for_frames(depth_frame, 'depth_intel')
-        return depth_frame
+        return self._memoized_frame(
+            'intel_depth_no_reshape',
+            lambda event: scrub_nan_inf(event.depth_frame.copy(), 'depth_intel'),
+        )
 
     def get_current_arm_state(self):
         ForkedPdb().set_trace()
@@ -349,39 +400,41 @@ class StretchManipulaTHOREnvironment(ManipulaTHOREnvironment): #TODO this comes
         #     "standing": metadata.get("isStanding", metadata["agent"].get("isStanding")),
         # }
 
-        curr_loc = self.nominal_agent_location
-        new_loc = copy.deepcopy(curr_loc)
-
-        if action_dict['action'] is 'RotateLeft':
-            new_loc["rotation"] = (new_loc["rotation"] - self.rotate_nominal) % 360
-        if action_dict['action'] is 'RotateLeftSmall':
-            new_loc["rotation"] = (new_loc["rotation"] - self.rotate_nominal/5) % 360
-        if action_dict['action'] is 'RotateRight':
-            new_loc["rotation"] = (new_loc["rotation"] + self.rotate_nominal) % 360
-        elif action_dict['action'] is 'RotateRightSmall':
-            new_loc["rotation"] = (new_loc["rotation"] + self.rotate_nominal/5) % 360
-        elif action_dict['action'] is 'MoveAhead':
-            new_loc["x"] += self.ahead_nominal * np.sin(new_loc["rotation"] * np.pi / 180)
-            new_loc["z"] += self.ahead_nominal * np.cos(new_loc["rotation"] * np.pi / 180)
-        elif action_dict['action'] is 'MoveBack':
-            new_loc["x"] -= self.ahead_nominal * np.sin(new_loc["rotation"] * np.pi / 180)
-            new_loc["z"] -= self.ahead_nominal * np.cos(new_loc["rotation"] * np.pi / 180)
-        elif action_dict['action'] is 'TeleportFull':
-            new_loc["x"] = action_dict['x']
-            new_loc["y"] = action_dict['y']
-            new_loc["z"] = action_dict['z']
-            new_loc["rotation"] = action_dict['rotation']['y']
-            new_loc["horizon"] = action_dict['horizon']
-
-        self.nominal_agent_location = new_loc
+        # the pose record is updated in place, nominal_agent_location is rebuilt from it when next read
+        pose = self._nominal_pose
+        self._nominal_location = None
+        action = action_dict['action']
+
+        if action == 'RotateLeft':
+            pose["rotation"] = (pose["rotation"] - self.rotate_nominal) % 360
+        elif action == 'RotateLeftSmall':
+            pose["rotation"] = (pose["rotation"] - self.rotate_nominal/5) % 360
+        elif action == 'RotateRight':
+            pose["rotation"] = (pose["rotation"] + self.rotate_nominal) % 360
+        elif action == 'RotateRightSmall':
+            pose["rotation"] = (pose["rotation"] + self.rotate_nominal/5) % 360
+        elif action == 'MoveAhead':
+            yaw = math.radians(pose["rotation"])
+            pose["x"] += self.ahead_nominal * math.sin(yaw)
+            pose["z"] += self.ahead_nominal * math.cos(yaw)
+        elif action == 'MoveBack':
+            yaw = math.radians(pose["rotation"])
+            pose["x"] -= self.ahead_nominal * math.sin(yaw)
+            pose["z"] -= self.ahead_nominal * math.cos(yaw)
+        elif action == 'TeleportFull':
+            pose["x"] = action_dict['x']
+            pose["y"] = action_dict['y']
+            pose["z"] = action_dict['z']
+            pose["rotation"] = action_dict['rotation']['y']
+            pose["horizon"] = action_dict['horizon']
 
     def step(
         self, action_dict: Dict[str, Union[str, int, float]]
     ) -> ai2thor.server.Event:
         """Take a step in the ai2thor environment."""
-
+        step_start_time = time.perf_counter()
         action = typing.cast(str, action_dict["action"])
-        original_action_dict = copy.deepcopy(action_dict)
+        original_action_dict = action_dict if self.copy_free_step else copy.deepcopy(action_dict)
 
         skip_render = "renderImage" in action_dict and not action_dict["renderImage"]
         last_frame: Optional[np.ndarray] = None
@@ -414,83 +467,47 @@ class StretchManipulaTHOREnvironment(ManipulaTHOREnvironment): #TODO this comes
             } # we have to change the last action success if the pik up fails, we do that in the task now
                 
         elif action in [MOVE_AHEAD, MOVE_BACK, ROTATE_RIGHT, ROTATE_LEFT, ROTATE_RIGHT_SMALL, ROTATE_LEFT_SMALL]:
-            copy_aditions = copy.deepcopy(ADITIONAL_ARM_ARGS)
-
+            if self.noise_pool is not None:
+                self.noise_pool.start_step(len(self.list_of_actions_so_far) - self.noise_episode_first_action)
             # RH: order matters, nominal action happens last
-            action_dict = {**action_dict, **copy_aditions}
             # ForkedPdb().set_trace()
             if action in [MOVE_AHEAD]:
                 noise = self.noise_model.get_ahead_drift(self.ahead_nominal)
-
-                action_dict["action"] = "RotateAgent"
-                action_dict["degrees"] = noise[2]
-                sr = self.controller.step(action_dict)
-
-                action_dict = {**copy_aditions}
-                action_dict["action"] = "MoveAgent"
-                action_dict["ahead"] = noise[0] + self.ahead_nominal
-                action_dict["right"] = noise[1]
+                drift_dict = self.arm_action_payload(action_dict, "RotateAgent", degrees=noise[2])
+                action_dict = self.arm_action_payload({}, "MoveAgent", ahead=noise[0] + self.ahead_nominal, right=noise[1])
 
             elif action in [MOVE_BACK]:
                 noise = self.noise_model.get_ahead_drift(self.ahead_nominal)
                 # TODO revisit - make sense to sample the same for ahead and back? 
                 # inclination is effect matters less than currently unmodeled hysteresis effects
-
-                action_dict["action"] = "RotateAgent"
-                action_dict["degrees"] = noise[2]
-                sr = self.controller.step(action_dict)
-
-                action_dict = {**copy_aditions}
-                action_dict["action"] = "MoveAgent"
-                action_dict["ahead"] = noise[0] - self.ahead_nominal
-                action_dict["right"] = noise[1]
+                drift_dict = self.arm_action_payload(action_dict, "RotateAgent", degrees=noise[2])
+                action_dict = self.arm_action_payload({}, "MoveAgent", ahead=noise[0] - self.ahead_nominal, right=noise[1])
 
 
             elif action in [ROTATE_RIGHT]:
                 noise = self.noise_model.get_rotate_drift()
-                action_dict["action"] = "MoveAgent"
-                action_dict["ahead"] = noise[0]
-                action_dict["right"] = noise[1]
-                sr = self.controller.step(action_dict)
-
-                action_dict = {**copy_aditions}
-                action_dict["action"] = "RotateAgent"
-                action_dict["degrees"] = noise[2] + self.rotate_nominal
+                drift_dict = self.arm_action_payload(action_dict, "MoveAgent", ahead=noise[0], right=noise[1])
+                action_dict = self.arm_action_payload({}, "RotateAgent", degrees=noise[2] + self.rotate_nominal)
 
             elif action in [ROTATE_LEFT]:
                 noise = self.noise_model.get_rotate_drift()
-                action_dict["action"] = "MoveAgent"
-                action_dict["ahead"] = noise[0]
-                action_dict["right"] = noise[1]
-                sr = self.controller.step(action_dict)
-
-                action_dict = {**copy_aditions}
-                action_dict["action"] = "RotateAgent"
-                action_dict["degrees"] = noise[2] - self.rotate_nominal
+                drift_dict = self.arm_action_payload(action_dict, "MoveAgent", ahead=noise[0], right=noise[1])
+                action_dict = self.arm_action_payload({}, "RotateAgent", degrees=noise[2] - self.rotate_nominal)
             
             elif action in [ROTATE_RIGHT_SMALL]:
                 # RH: lesser scaling noise is deliberate. Small actions are harder to be accurate
                 noise = self.noise_model.get_rotate_drift()
-                action_dict["action"] = "MoveAgent"
-                action_dict["ahead"] = noise[0]/2
-                action_dict["right"] = noise[1]/2
-                sr = self.controller.step(action_dict)
-
-                action_dict = {**copy_aditions}
-                action_dict["action"] = "RotateAgent"
-                action_dict["degrees"] = noise[2]/2 + self.rotate_nominal / 5
+                drift_dict = self.arm_action_payload(action_dict, "MoveAgent", ahead=noise[0]/2, right=noise[1]/2)
+                action_dict = self.arm_action_payload({}, "RotateAgent", degrees=noise[2]/2 + self.rotate_nominal / 5)
 
             elif action in [ROTATE_LEFT_SMALL]:
                 # RH: lesser scaling noise is deliberate. Small actions are harder to be accurate
                 noise = self.noise_model.get_rotate_drift()
-                action_dict["action"] = "MoveAgent"
-                action_dict["ahead"] = noise[0]/2
-                action_dict["right"] = noise[1]/2
-                sr = self.controller.step(action_dict)
+                drift_dict = self.arm_action_payload(action_dict, "MoveAgent", ahead=noise[0]/2, right=noise[1]/2)
+                action_dict = self.arm_action_payload({}, "RotateAgent", degrees=noise[2]/2 - self.rotate_nominal / 5)
 
-                action_dict = {**copy_aditions}
-                action_dict["action"] = "RotateAgent"
-                action_dict["degrees"] = noise[2]/2 - self.rotate_nominal / 5
+            if not self.is_null_motion(drift_dict):
+                sr = self.controller.step(drift_dict)
 
 
         elif action in [MOVE_ARM_HEIGHT_P,MOVE_ARM_HEIGHT_M,MOVE_ARM_Z_P,MOVE_ARM_Z_M,]:
@@ -538,14 +555,8 @@ class StretchManipulaTHOREnvironment(ManipulaTHOREnvironment): #TODO this comes
             # if the action fails, sample the noise model for a turn 
             # does this mess up metadata? and is this reasonable? what action failure modes happen in sim vs real?
             noise = self.noise_model.get_rotate_drift()
-            action_dict = {**copy.deepcopy(ADITIONAL_ARM_ARGS)}
-            action_dict["action"] = "MoveAgent"
-            action_dict["ahead"] = noise[0]
-            action_dict["right"] = noise[1]
-            sr = self.controller.step(action_dict)
-            action_dict = {**copy.deepcopy(ADITIONAL_ARM_ARGS)}
-            action_dict["action"] = "RotateAgent"
-            action_dict["degrees"] = noise[2]
-            sr = self.controller.step(action_dict)
+            sr = self.controller.step(self.arm_action_payload({}, "MoveAgent", ahead=noise[0], right=noise[1]))
+            sr = self.controller.step(self.arm_action_payload({}, "RotateAgent", degrees=noise[2]))
 
+        self.step_latencies.append(time.perf_counter() - step_start_time)
         return sr_nominal
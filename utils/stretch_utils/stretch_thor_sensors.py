@@ -18,6 +18,7 @@ from matplotlib import pyplot as plt
 
 from ithor_arm.arm_calculation_utils import (
     convert_world_to_agent_coordinate,
+    convert_world_to_agent_coordinate_batched,
     convert_state_to_tensor,
     diff_position,
 )
@@ -25,29 +26,41 @@ from ithor_arm.arm_calculation_utils import (
 # from ithor_arm.ithor_arm_environment import StretchManipulaTHOREnvironment
 # from ithor_arm.ithor_arm_sensors import DepthSensorThor
 # from ithor_arm.near_deadline_sensors import calc_world_coordinates
-from utils.calculation_utils import calc_world_coordinates, calc_world_xyz_from_agent_relative, get_mid_point_of_object_from_depth_and_mask
+from utils.calculation_utils import calc_world_coordinates, calc_world_xyz_from_agent_relative, get_mid_point_of_object_from_depth_and_mask, \
+    RecencyWeightedPointHistory
 
 from manipulathor_utils.debugger_util import ForkedPdb
 from utils.noise_in_motion_util import squeeze_bool_mask
+from utils.object_centroid_utils import object_centroid_estimator_of
+from utils.object_mask_utils import ObjectMaskAtResolution
 from utils.stretch_utils.stretch_ithor_arm_environment import StretchManipulaTHOREnvironment
 from utils.stretch_utils.stretch_sim2real_utils import kinect_reshape, intel_reshape
+from utils.sensor_observation_cache import memoize_observation_per_step, observation_cache_of, \
+    observation_key_from_settings
 from scripts.stretch_jupyter_helper import get_relative_stretch_current_arm_state
 
 class PrevFrameSensor(Sensor):
+    """Observation of `sensor` in the previous step (the current one at the start of a task).
+
+    The frame sensors memoize their observation per step under a key shared by all sensors with the same
+    settings, so `sensor` costs nothing when the config also lists a current-frame sensor like it, and the
+    previous frame is read from the environment's observation history instead of being kept here.
+    """
     def __init__(self, sensor, uuid: str):
+        assert hasattr(type(sensor).get_observation, '__wrapped__'), \
+            'PrevFrameSensor needs a sensor whose get_observation is memoized per step'
         self.sensor = sensor
-        self.prev_obs = None
 
         observation_space = sensor.observation_space
         super().__init__(**prepare_locals_for_super(locals()))
 
     def get_observation(self, env, task, *args, **kwargs):
+        # stepping the wrapped sensor first also moves the history on to this step
         obs = self.sensor.get_observation(env, task, *args, **kwargs)
-        if self.prev_obs is None or task.num_steps_taken() == 0:
-            self.prev_obs = obs
-        tmp = self.prev_obs
-        self.prev_obs = obs
-        return tmp
+        if task.num_steps_taken() == 0:
+            return obs
+        prev_obs = observation_cache_of(env).previous_observation(self.sensor)
+        return obs if prev_obs is None else prev_obs
 
 
 class DepthSensorStretchIntel(
@@ -63,8 +76,13 @@ class DepthSensorStretchIntel(
     """
     def __init__(self, full_frame=False, *args, **kwargs):
         self.full_frame = full_frame
+        self.observation_key = observation_key_from_settings(self, full_frame, *args, **kwargs)
         super().__init__(*args, **kwargs)
 
+    @memoize_observation_per_step
+    def get_observation(self, env, task, *args, **kwargs):
+        return super().get_observation(env, task, *args, **kwargs)
+
     def frame_from_env(self, env: StretchManipulaTHOREnvironment, task: Optional[Task]) -> np.ndarray:
         if self.full_frame:
             return env.intel_depth_no_reshape
@@ -88,8 +106,13 @@ class DepthSensorStretchKinect(
     """
     def __init__(self, full_frame=False, *args, **kwargs):
         self.full_frame = full_frame
+        self.observation_key = observation_key_from_settings(self, full_frame, *args, **kwargs)
         super().__init__(*args, **kwargs)
 
+    @memoize_observation_per_step
+    def get_observation(self, env, task, *args, **kwargs):
+        return super().get_observation(env, task, *args, **kwargs)
+
     def frame_from_env(self, env: StretchManipulaTHOREnvironment, task: Optional[Task]) -> np.ndarray:
         if self.full_frame:
             return env.kinect_depth_no_reshape
@@ -127,13 +150,17 @@ class RGBSensorStretchKinect(
     """
     def __init__(self, full_frame=False, *args, **kwargs):
         self.full_frame = full_frame
+        self.observation_key = observation_key_from_settings(self, full_frame, *args, **kwargs)
         super().__init__(*args, **kwargs)
 
+    @memoize_observation_per_step
+    def get_observation(self, env, task, *args, **kwargs):
+        return super().get_observation(env, task, *args, **kwargs)
+
     def frame_from_env(self, env: StretchManipulaTHOREnvironment, task: Optional[Task]) -> np.ndarray:
         if self.full_frame:
             return env.kinect_frame_no_reshape
-        rgb = env.controller.last_event.third_party_camera_frames[0].copy()
-        return kinect_reshape(rgb)
+        return env.kinect_frame
 
 
 class RGBSensorStretchKinectZero(
@@ -162,13 +189,17 @@ class RGBSensorStretchIntel(
     """
     def __init__(self, full_frame=False, *args, **kwargs):
         self.full_frame = full_frame
+        self.observation_key = observation_key_from_settings(self, full_frame, *args, **kwargs)
         super().__init__(*args, **kwargs)
 
+    @memoize_observation_per_step
+    def get_observation(self, env, task, *args, **kwargs):
+        return super().get_observation(env, task, *args, **kwargs)
+
     def frame_from_env(self, env: StretchManipulaTHOREnvironment, task: Optional[Task]) -> np.ndarray:
         if self.full_frame:
             return env.intel_frame_no_reshape
-        rgb = (env.controller.last_event.frame.copy())
-        return intel_reshape(rgb)#cv2.resize(rgb, (224,224))
+        return env.intel_frame
 
 # class NoisyObjectMaskStretch(NoisyObjectMask): TODO double check correctness of this
 #
@@ -236,8 +267,9 @@ class AgentOdometryEmulSensor(Sensor):
         sin_of_rot = np.sin(np.deg2rad(self.initial_rot))
         cos_of_rot = np.cos(np.deg2rad(self.initial_rot))
         if noisy_pose:
-            agent_xyz = np.array([env.nominal_agent_location[k] for k in ["x", "y", "z"]], dtype=np.float32) - self.initial_pos
-            agent_rot = env.nominal_agent_location['rotation'] - self.initial_rot
+            nominal_pose = env.nominal_agent_pose
+            agent_xyz = np.array(nominal_pose[["x", "y", "z"]].tolist(), dtype=np.float32) - self.initial_pos
+            agent_rot = float(nominal_pose['rotation']) - self.initial_rot
             prev_pos = self.noisy_prev_pos
             prev_rot = self.noisy_prev_rot
         else:
@@ -280,8 +312,8 @@ class AgentOdometryEmulSensor(Sensor):
         # print("last action", metadata["lastAction"])
         # Use env.nominal_agent_location to handle noise
 
-        # if task.num_steps_taken() == 0:
-        if metadata['lastAction'] == 'GetReachablePositions' or (self.fixed_frame and len(self.scene_names) == 0):
+        # the odometry frame starts at the pose of the first step of every episode
+        if task.num_steps_taken() == 0 or (self.fixed_frame and len(self.scene_names) == 0):
             self.initial_rot = metadata["agent"]["rotation"]["y"]
             self.initial_pos = np.array([metadata['agent']['position'][k] for k in ["x", "y", "z"]], dtype=np.float32)
 
@@ -461,7 +493,7 @@ class AgentBodyPointNavSensor(Sensor):
 
 class AgentBodyPointNavEmulSensor(Sensor):
 
-    def __init__(self, type: str, mask_sensor:Sensor, depth_sensor:Sensor, use_gt: bool = False, uuid: str = "point_nav_emul", **kwargs: Any):
+    def __init__(self, type: str, mask_sensor:Sensor, depth_sensor:Sensor, use_gt: bool = False, history_window: Optional[int] = None, uuid: str = "point_nav_emul", **kwargs: Any):
         observation_space = gym.spaces.Box(
             low=0, high=1, shape=(1,), dtype=np.float32
         )  # (low=-1.0, high=2.0, shape=(3, 4), dtype=np.float32)
@@ -474,6 +506,8 @@ class AgentBodyPointNavEmulSensor(Sensor):
         self.dummy_answer = torch.zeros(3)
         self.dummy_answer[:] = 4 # is this good enough?
         self.device = torch.device("cpu")
+        # only the midpoints of the last history_window steps are averaged, all of them if None
+        self.history_window = history_window
         self.use_gt = use_gt
 
 
@@ -491,12 +525,10 @@ class AgentBodyPointNavEmulSensor(Sensor):
             self, env: StretchManipulaTHOREnvironment, task: Task, *args: Any, **kwargs: Any
     ) -> Any:
 
-        mask = squeeze_bool_mask(self.mask_sensor.get_observation(env, task, *args, **kwargs))
-        depth_frame = self.depth_sensor.get_observation(env, task, *args, **kwargs)#env.controller.last_event.depth_frame.copy()
-        depth_frame[~mask] = -1
-        depth_frame[depth_frame == 0] = -1
+        mask = self.mask_sensor.get_observation(env, task, *args, **kwargs)
+        depth_frame = self.depth_sensor.get_observation(env, task, *args, **kwargs)
         if task.num_steps_taken() == 0:
-            self.pointnav_history_aggr = []
+            self.pointnav_history_aggr = RecencyWeightedPointHistory(self.history_window)
             self.real_prev_location = None
             self.belief_prev_location = None
 
@@ -510,12 +542,8 @@ class AgentBodyPointNavEmulSensor(Sensor):
         #TODO we have to rewrite this such that it rotates the object not the agent
         if mask.sum() != 0 or self.use_gt:
             if not self.use_gt:
-                world_space_point_cloud = calc_world_coordinates(self.min_xyz, camera_xyz, camera_rotation, camera_horizon, fov, self.device, depth_frame)
-                valid_points = (world_space_point_cloud == world_space_point_cloud).sum(dim=-1) == 3
-                point_in_world = world_space_point_cloud[valid_points]
-                middle_of_object = point_in_world.mean(dim=0)
+                middle_of_object, num_points = object_centroid_estimator_of(env).centroid(mask, depth_frame, self.min_xyz, camera_xyz, camera_rotation, camera_horizon, fov, self.device)
                 middle_of_object = check_for_nan_obj_location(middle_of_object, 'calc agent body')
-                num_points = len(point_in_world)
             else:
                 if self.type == 'source':
                     info_to_search = 'source_object_id'
@@ -526,20 +554,16 @@ class AgentBodyPointNavEmulSensor(Sensor):
                 position = env.get_object_by_id(task.task_info[info_to_search])['position']
                 middle_of_object = torch.tensor(np.array([position[k] for k in ["x", "y", "z"]], dtype=np.float32))
                 num_points = 1
-            self.pointnav_history_aggr.append((middle_of_object.cpu(), num_points, task.num_steps_taken()))
+            self.pointnav_history_aggr.append(middle_of_object.cpu(), task.num_steps_taken())
 
         return check_for_nan_obj_location(self.average_so_far(camera_xyz, camera_rotation, arm_state, task.num_steps_taken()), 'average agent body')
 
     def average_so_far(self, camera_xyz, camera_rotation, arm_state, current_step_number):
-        if len(self.pointnav_history_aggr) == 0:
+        midpoint = self.pointnav_history_aggr.weighted_average(current_step_number)
+        if midpoint is None:
             return self.dummy_answer
         else:
             # TODO do the averaging with number of pixels as well
-            weights = [1. / (current_step_number + 1 - num_steps) for mid,num_pixels,num_steps in self.pointnav_history_aggr]
-            total_weights = sum(weights)
-            total_sum = [mid * (1. / (current_step_number + 1 - num_steps)) for mid,num_pixels,num_steps in self.pointnav_history_aggr]
-            total_sum = sum(total_sum)
-            midpoint = total_sum / total_weights
             agent_state = dict(position=dict(x=camera_xyz[0], y=camera_xyz[1], z=camera_xyz[2], ), rotation=dict(x=0, y=camera_rotation, z=0))
             midpoint_position_rotation = dict(position=dict(x=midpoint[0], y=midpoint[1], z=midpoint[2]), rotation=dict(x=0,y=0,z=0))
             midpoint_agent_coord = convert_world_to_agent_coordinate(midpoint_position_rotation, agent_state)
@@ -566,7 +590,7 @@ def check_for_nan_visual_observations(tensor, where_it_occured=''): #TODO remove
     return tensor
 class ArmPointNavEmulSensor(Sensor):
 
-    def __init__(self, type: str, mask_sensor:Sensor, depth_sensor:Sensor, use_gt: bool = False, uuid: str = "arm_point_nav_emul", **kwargs: Any):
+    def __init__(self, type: str, mask_sensor:Sensor, depth_sensor:Sensor, use_gt: bool = False, history_window: Optional[int] = None, uuid: str = "arm_point_nav_emul", **kwargs: Any):
         observation_space = gym.spaces.Box(
             low=0, high=1, shape=(1,), dtype=np.float32
         )  # (low=-1.0, high=2.0, shape=(3, 4), dtype=np.float32)
@@ -580,6 +604,8 @@ class ArmPointNavEmulSensor(Sensor):
         self.dummy_answer = torch.zeros(3)
         self.dummy_answer[:] = 4 # is this good enough?
         self.device = torch.device("cpu")
+        # only the midpoints of the last history_window steps are averaged, all of them if None
+        self.history_window = history_window
         self.use_gt = use_gt
         super().__init__(**prepare_locals_for_super(locals()))
 
@@ -600,12 +626,10 @@ class ArmPointNavEmulSensor(Sensor):
             self, env: StretchManipulaTHOREnvironment, task: Task, *args: Any, **kwargs: Any
     ) -> Any:
 
-        mask = squeeze_bool_mask(self.mask_sensor.get_observation(env, task, *args, **kwargs))
-        depth_frame = self.depth_sensor.get_observation(env, task, *args, **kwargs)#env.controller.last_event.depth_frame.copy()
-        depth_frame[~mask] = -1
-        depth_frame[depth_frame == 0] = -1
+        mask = self.mask_sensor.get_observation(env, task, *args, **kwargs)
+        depth_frame = self.depth_sensor.get_observation(env, task, *args, **kwargs)
         if task.num_steps_taken() == 0:
-            self.pointnav_history_aggr = []
+            self.pointnav_history_aggr = RecencyWeightedPointHistory(self.history_window)
             self.real_prev_location = None
             self.belief_prev_location = None
 
@@ -619,12 +643,8 @@ class ArmPointNavEmulSensor(Sensor):
         #TODO we have to rewrite this such that it rotates the object not the agent
         if mask.sum() != 0 or self.use_gt:
             if not self.use_gt:
-                world_space_point_cloud = calc_world_coordinates(self.min_xyz, camera_xyz, camera_rotation, camera_horizon, fov, self.device, depth_frame)
-                valid_points = (world_space_point_cloud == world_space_point_cloud).sum(dim=-1) == 3
-                point_in_world = world_space_point_cloud[valid_points]
-                middle_of_object = point_in_world.mean(dim=0)
+                middle_of_object, num_points = object_centroid_estimator_of(env).centroid(mask, depth_frame, self.min_xyz, camera_xyz, camera_rotation, camera_horizon, fov, self.device)
                 middle_of_object = check_for_nan_obj_location(middle_of_object, 'calc arm sensor')
-                num_points = len(point_in_world)
             else:
                 if self.type == 'source':
                     info_to_search = 'source_object_id'
@@ -635,29 +655,20 @@ class ArmPointNavEmulSensor(Sensor):
                 position = env.get_object_by_id(task.task_info[info_to_search])['position']
                 middle_of_object = torch.tensor(np.array([position[k] for k in ["x", "y", "z"]], dtype=np.float32))
                 num_points = 1
-            self.pointnav_history_aggr.append((middle_of_object.cpu(), num_points, task.num_steps_taken()))
+            self.pointnav_history_aggr.append(middle_of_object.cpu(), task.num_steps_taken())
 
         return check_for_nan_obj_location(self.average_so_far(camera_xyz, camera_rotation, arm_state, task.num_steps_taken()), 'average arm sensor')
 
     def average_so_far(self, camera_xyz, camera_rotation, arm_state, current_step_number):
-        if len(self.pointnav_history_aggr) == 0:
+        midpoint = self.pointnav_history_aggr.weighted_average(current_step_number)
+        if midpoint is None:
             return self.dummy_answer
         else:
-            weights = [1. / (current_step_number + 1 - num_steps) for mid,num_pixels,num_steps in self.pointnav_history_aggr]
-            total_weights = sum(weights)
-            total_sum = [mid * (1. / (current_step_number + 1 - num_steps)) for mid,num_pixels,num_steps in self.pointnav_history_aggr]
-            total_sum = sum(total_sum)
-            midpoint = total_sum / total_weights
-            agent_state = dict(position=dict(x=camera_xyz[0], y=camera_xyz[1], z=camera_xyz[2], ), rotation=dict(x=0, y=camera_rotation, z=0))
-            midpoint_position_rotation = dict(position=dict(x=midpoint[0], y=midpoint[1], z=midpoint[2]), rotation=dict(x=0,y=0,z=0))
-            midpoint_agent_coord = convert_world_to_agent_coordinate(midpoint_position_rotation, agent_state)
-
-            arm_state_agent_coord = convert_world_to_agent_coordinate(arm_state, agent_state)
-            distance_in_agent_coord = dict(x=midpoint_agent_coord['position']['x'] - arm_state_agent_coord['position']['x'],y=midpoint_agent_coord['position']['y'] - arm_state_agent_coord['position']['y'],z=midpoint_agent_coord['position']['z'] - arm_state_agent_coord['position']['z'])
-
-            # distance_in_agent_coord = dict(x=midpoint_agent_coord['position']['x'], y=midpoint_agent_coord['position']['y'], z=midpoint_agent_coord['position']['z'])
+            midpoint_agent_coord, arm_state_agent_coord = convert_world_to_agent_coordinate_batched(
+                [midpoint.numpy(), [arm_state['position'][k] for k in ['x','y','z']]], camera_xyz, camera_rotation)
+            distance_in_agent_coord = midpoint_agent_coord - arm_state_agent_coord
 
-            agent_centric_middle_of_object = torch.Tensor([distance_in_agent_coord['x'], distance_in_agent_coord['y'], distance_in_agent_coord['z']])
+            agent_centric_middle_of_object = torch.Tensor(distance_in_agent_coord)
 
             # Removing this hurts the performance
             agent_centric_middle_of_object = agent_centric_middle_of_object #.abs() TODO investigate removing this again
@@ -686,7 +697,7 @@ class ArmPointNavEmulSensor(Sensor):
 
 class AgentBodyPointNavEmulSensorDeadReckoning(Sensor):
 
-    def __init__(self, type: str, mask_sensor:Sensor, depth_sensor:Sensor, uuid: str = "point_nav_emul", **kwargs: Any):
+    def __init__(self, type: str, mask_sensor:Sensor, depth_sensor:Sensor, history_window: Optional[int] = None, uuid: str = "point_nav_emul", **kwargs: Any):
         observation_space = gym.spaces.Box(
             low=0, high=1, shape=(1,), dtype=np.float32
         )  # (low=-1.0, high=2.0, shape=(3, 4), dtype=np.float32)
@@ -699,6 +710,8 @@ class AgentBodyPointNavEmulSensorDeadReckoning(Sensor):
         self.dummy_answer = torch.zeros(3)
         self.dummy_answer[:] = 4 # is this good enough?
         self.device = torch.device("cpu")
+        # only the midpoints of the last history_window steps are averaged, all of them if None
+        self.history_window = history_window
 
         super().__init__(**prepare_locals_for_super(locals()))
 
@@ -708,15 +721,16 @@ class AgentBodyPointNavEmulSensorDeadReckoning(Sensor):
             print('Warning multiple cameras')
 
         true_base = env.get_agent_location()
-        true_base = copy.deepcopy(dict(position=dict(x=true_base['x'], y=true_base['y'],z=true_base['z']), 
-                                          rotation=dict(x=0,y=true_base['rotation'], z=0)))
+        true_base = dict(position=dict(x=true_base['x'], y=true_base['y'],z=true_base['z']),
+                         rotation=dict(x=0,y=true_base['rotation'], z=0))
 
-        nominal_base = env.nominal_agent_location
-        nominal_base_xyz = np.array([nominal_base['x'],nominal_base['y'],nominal_base['z']])
-        nominal_base = copy.deepcopy(dict(position=dict(x=nominal_base['x'], y=nominal_base['y'],z=nominal_base['z']), 
-                                          rotation=dict(x=0,y=nominal_base['rotation'], z=0)))
+        nominal_pose = env.nominal_agent_pose
+        nominal_base_xyz = np.array(nominal_pose[['x','y','z']].tolist())
+        nominal_base = dict(position=dict(x=float(nominal_pose['x']), y=float(nominal_pose['y']),z=float(nominal_pose['z'])),
+                            rotation=dict(x=0,y=float(nominal_pose['rotation']), z=0))
 
-        m = copy.deepcopy(env.controller.last_event.metadata)
+        # only read below, so the event metadata is not copied
+        m = env.controller.last_event.metadata
 
         wrist = env.get_absolute_hand_state()
         relative_wrist = convert_world_to_agent_coordinate(wrist,true_base)
@@ -757,27 +771,23 @@ class AgentBodyPointNavEmulSensorDeadReckoning(Sensor):
         mask = self.mask_sensor.get_observation(env, task, *args, **kwargs)
         depth_frame = self.depth_sensor.get_observation(env, task, *args, **kwargs)
         if task.num_steps_taken() == 0:
-            self.pointnav_history_aggr = []
+            self.pointnav_history_aggr = RecencyWeightedPointHistory(self.history_window)
             self.real_prev_location = []
             self.belief_prev_location = []
 
         fov, camera_horizon, camera_xyz, camera_rotation, arm_state = self.get_agent_belief_state(env)
 
         if mask.sum() != 0:
-            midpoint_agent_coord = get_mid_point_of_object_from_depth_and_mask(mask, depth_frame, self.min_xyz, camera_xyz, camera_rotation, camera_horizon, fov, self.device)
-            self.pointnav_history_aggr.append((midpoint_agent_coord.cpu(), 1, task.num_steps_taken()))
+            midpoint_agent_coord, _ = object_centroid_estimator_of(env).centroid(mask, depth_frame, self.min_xyz, camera_xyz, camera_rotation, camera_horizon, fov, self.device)
+            self.pointnav_history_aggr.append(midpoint_agent_coord.cpu(), task.num_steps_taken())
 
         return self.history_aggregation(camera_xyz, camera_rotation, task.num_steps_taken())
     
     def history_aggregation(self, camera_xyz, camera_rotation, current_step_number):
-        if len(self.pointnav_history_aggr) == 0:
+        midpoint = self.pointnav_history_aggr.weighted_average(current_step_number)
+        if midpoint is None:
             return self.dummy_answer
         else:
-            weights = [1. / (current_step_number + 1 - num_steps) for mid,num_pixels,num_steps in self.pointnav_history_aggr]
-            total_weights = sum(weights)
-            total_sum = [mid * (1. / (current_step_number + 1 - num_steps)) for mid,num_pixels,num_steps in self.pointnav_history_aggr]
-            total_sum = sum(total_sum)
-            midpoint = total_sum / total_weights
             agent_state = dict(position=dict(x=camera_xyz[0], y=camera_xyz[1], z=camera_xyz[2], ), rotation=dict(x=0, y=camera_rotation, z=0))
             midpoint_position_rotation = dict(position=dict(x=midpoint[0], y=midpoint[1], z=midpoint[2]), rotation=dict(x=0,y=0,z=0))
             midpoint_agent_coord = convert_world_to_agent_coordinate(midpoint_position_rotation, agent_state)
@@ -788,7 +798,7 @@ class AgentBodyPointNavEmulSensorDeadReckoning(Sensor):
 
 class ArmPointNavEmulSensorDeadReckoning(Sensor):
 
-    def __init__(self, type: str, mask_sensor:Sensor, depth_sensor:Sensor, uuid: str = "arm_point_nav_emul", **kwargs: Any):
+    def __init__(self, type: str, mask_sensor:Sensor, depth_sensor:Sensor, history_window: Optional[int] = None, uuid: str = "arm_point_nav_emul", **kwargs: Any):
         observation_space = gym.spaces.Box(
             low=0, high=1, shape=(1,), dtype=np.float32
         )  # (low=-1.0, high=2.0, shape=(3, 4), dtype=np.float32)
@@ -802,6 +812,8 @@ class ArmPointNavEmulSensorDeadReckoning(Sensor):
         self.dummy_answer = torch.zeros(3)
         self.dummy_answer[:] = 4 # is this good enough?
         self.device = torch.device("cpu")
+        # only the midpoints of the last history_window steps are averaged, all of them if None
+        self.history_window = history_window
         super().__init__(**prepare_locals_for_super(locals()))
     
     def get_relative_nominal_locations(self,env):
@@ -809,15 +821,16 @@ class ArmPointNavEmulSensorDeadReckoning(Sensor):
             print('Warning multiple cameras')
 
         true_base = env.get_agent_location()
-        true_base = copy.deepcopy(dict(position=dict(x=true_base['x'], y=true_base['y'],z=true_base['z']), 
-                                          rotation=dict(x=0,y=true_base['rotation'], z=0)))
+        true_base = dict(position=dict(x=true_base['x'], y=true_base['y'],z=true_base['z']),
+                         rotation=dict(x=0,y=true_base['rotation'], z=0))
 
-        nominal_base = env.nominal_agent_location
-        nominal_base_xyz = np.array([nominal_base['x'],nominal_base['y'],nominal_base['z']])
-        nominal_base = copy.deepcopy(dict(position=dict(x=nominal_base['x'], y=nominal_base['y'],z=nominal_base['z']), 
-                                          rotation=dict(x=0,y=nominal_base['rotation'], z=0)))
+        nominal_pose = env.nominal_agent_pose
+        nominal_base_xyz = np.array(nominal_pose[['x','y','z']].tolist())
+        nominal_base = dict(position=dict(x=float(nominal_pose['x']), y=float(nominal_pose['y']),z=float(nominal_pose['z'])),
+                            rotation=dict(x=0,y=float(nominal_pose['rotation']), z=0))
 
-        m = copy.deepcopy(env.controller.last_event.metadata)
+        # only read below, so the event metadata is not copied
+        m = env.controller.last_event.metadata
 
         wrist = env.get_absolute_hand_state()
         relative_wrist = convert_world_to_agent_coordinate(wrist,true_base)
@@ -862,41 +875,27 @@ class ArmPointNavEmulSensorDeadReckoning(Sensor):
         mask = self.mask_sensor.get_observation(env, task, *args, **kwargs)
         depth_frame = self.depth_sensor.get_observation(env, task, *args, **kwargs)
 
-        # catch rare NaN error where tiny mask is lost in 0 missing values
-        squeeze_mask = squeeze_bool_mask(mask)
-        depth_frame_masked = depth_frame.copy()
-        depth_frame_masked[~squeeze_mask] = -1
-        depth_frame_masked[depth_frame_masked == 0] = -1 
-        
         if task.num_steps_taken() == 0:
-            self.pointnav_history_aggr = []
+            self.pointnav_history_aggr = RecencyWeightedPointHistory(self.history_window)
             self.real_prev_location = []
             self.belief_prev_location = []
 
         fov, camera_horizon, camera_xyz, camera_rotation, arm_state = self.get_agent_belief_state(env)
 
-        if depth_frame_masked[depth_frame_masked>0].sum() != 0:
-            midpoint_agent_coord = get_mid_point_of_object_from_depth_and_mask(mask, depth_frame, self.min_xyz, camera_xyz, camera_rotation, camera_horizon, fov, self.device)
-            self.pointnav_history_aggr.append((midpoint_agent_coord.cpu(), 1, task.num_steps_taken()))
+        midpoint_agent_coord, number_of_points = object_centroid_estimator_of(env).centroid(mask, depth_frame, self.min_xyz, camera_xyz, camera_rotation, camera_horizon, fov, self.device)
+        # catch rare NaN error where tiny mask is lost in 0 missing values
+        if number_of_points > 0:
+            self.pointnav_history_aggr.append(midpoint_agent_coord.cpu(), task.num_steps_taken())
 
         return self.history_aggregation(camera_xyz, camera_rotation, arm_state, task.num_steps_taken())
     
     def history_aggregation(self, camera_xyz, camera_rotation, arm_world_coord, current_step_number):
-        if len(self.pointnav_history_aggr) == 0:
+        midpoint = self.pointnav_history_aggr.weighted_average(current_step_number)
+        if midpoint is None:
             return self.dummy_answer
         else:
-            weights = [1. / (current_step_number + 1 - num_steps) for mid,num_pixels,num_steps in self.pointnav_history_aggr]
-            total_weights = sum(weights)
-            total_sum = [mid * (1. / (current_step_number + 1 - num_steps)) for mid,num_pixels,num_steps in self.pointnav_history_aggr]
-            total_sum = sum(total_sum)
-            midpoint = total_sum / total_weights
-            agent_state = dict(position=dict(x=camera_xyz[0], y=camera_xyz[1], z=camera_xyz[2], ), rotation=dict(x=0, y=camera_rotation, z=0))
-            midpoint_position_rotation = dict(position=dict(x=midpoint[0], y=midpoint[1], z=midpoint[2]), rotation=dict(x=0,y=0,z=0))
-            midpoint_agent_coord = convert_world_to_agent_coordinate(midpoint_position_rotation, agent_state)
-            midpoint_agent_coord = torch.Tensor([midpoint_agent_coord['position'][k] for k in ['x','y','z']])
-
-            arm_agent_coord = convert_world_to_agent_coordinate(arm_world_coord, agent_state)
-            arm_state_agent_coord = torch.Tensor([arm_agent_coord['position'][k] for k in ['x','y','z']])
+            midpoint_agent_coord, arm_state_agent_coord = torch.Tensor(convert_world_to_agent_coordinate_batched(
+                [midpoint.numpy(), [arm_world_coord['position'][k] for k in ['x','y','z']]], camera_xyz, camera_rotation))
 
             distance_in_agent_coord = midpoint_agent_coord - arm_state_agent_coord
 
@@ -996,7 +995,10 @@ class IntelNoisyObjectMask(Sensor):
         self.full_frame = False
         super().__init__(**prepare_locals_for_super(locals()))
         assert self.noise == 0
+        self.mask_at_resolution = ObjectMaskAtResolution(self.width, self.height)
+        self._outputs = [np.zeros((self.width, self.height, 1)) for _ in range(2)]
 
+    @memoize_observation_per_step
     def get_observation(
             self, env: StretchManipulaTHOREnvironment, task: Task, *args: Any, **kwargs: Any
     ) -> Any:
@@ -1009,38 +1011,21 @@ class IntelNoisyObjectMask(Sensor):
             raise Exception('Not implemented', self.type)
 
         target_object_id = task.task_info[info_to_search]
-        all_visible_masks = env.controller.last_event.instance_masks
-        if target_object_id in all_visible_masks:
-            mask_frame = all_visible_masks[target_object_id]
-
-            if self.distance_thr > 0:
-
-                agent_location = env.get_agent_location()
-                object_location = env.get_object_by_id(target_object_id)['position']
-                current_agent_distance_to_obj = sum([(object_location[k] - agent_location[k])**2 for k in ['x', 'z']]) ** 0.5
-
-                if self.only_close_big_masks:
-                    if current_agent_distance_to_obj > self.distance_thr or mask_frame.sum() < 20: # objects that are smaller than this many pixels should be removed. High chance all spatulas will be removed
-
-                        mask_frame[:] = 0
-
-        else:
-            mask_frame =np.zeros(env.controller.last_event.frame[:,:,0].shape)
-
-        result = (np.expand_dims(mask_frame.astype(np.float),axis=-1))
-        # if len(env.controller.last_event.instance_masks) == 0:
-        #     fake_mask = np.zeros(env.controller.last_event.frame[:,:,0].shape)
-        # else:
-        #     fake_mask = random.choice([v for v in env.controller.last_event.instance_masks.values()])
-        # fake_mask = (np.expand_dims(fake_mask.astype(np.float),axis=-1))
-        # fake_mask, is_real_mask = add_mask_noise(result, fake_mask, noise=self.noise)
-        assert self.noise == 0
-        is_real_mask = True
-        current_shape = result.shape
-        if (current_shape[0], current_shape[1]) == (self.width, self.height):
-            resized_mask = result
-        else:
-            resized_mask = cv2.resize(result, (self.height, self.width)).reshape(self.width, self.height, 1) # my gut says this is gonna be slow
+        event = env.controller.last_event
+        segmentation_frame = event.instance_segmentation_frame
+        mask = self.mask_at_resolution.mask(segmentation_frame, event.object_id_to_color.get(target_object_id))
+
+        if self.distance_thr > 0 and self.only_close_big_masks and mask.any():
+            agent_location = env.get_agent_location()
+            object_location = env.get_object_by_id(target_object_id)['position']
+            current_agent_distance_to_obj = sum([(object_location[k] - agent_location[k])**2 for k in ['x', 'z']]) ** 0.5
+            number_of_pixels = np.count_nonzero(mask) * self.mask_at_resolution.source_pixels_per_pixel(segmentation_frame)
+            if current_agent_distance_to_obj > self.distance_thr or number_of_pixels < 20: # objects that are smaller than this many pixels should be removed. High chance all spatulas will be removed
+                mask[:] = False
+
+        self._outputs.reverse()
+        resized_mask = self._outputs[0]
+        np.copyto(resized_mask[:, :, 0], mask)
         if self.full_frame:
             return resized_mask
         return intel_reshape(resized_mask)
@@ -1054,6 +1039,7 @@ class KinectAgentMask(Sensor):
         self.width = width
         super().__init__(**prepare_locals_for_super(locals()))
 
+    @memoize_observation_per_step
     def get_observation(
         self, env: StretchManipulaTHOREnvironment, task: Task, *args: Any, **kwargs: Any
     ) -> Any:
@@ -1096,7 +1082,10 @@ class KinectNoisyObjectMask(Sensor):
         self.full_frame = full_frame
         super().__init__(**prepare_locals_for_super(locals()))
         assert self.noise == 0
+        self.mask_at_resolution = ObjectMaskAtResolution(self.width, self.height)
+        self._outputs = [np.zeros((self.width, self.height, 1)) for _ in range(2)]
 
+    @memoize_observation_per_step
     def get_observation(
             self, env: StretchManipulaTHOREnvironment, task: Task, *args: Any, **kwargs: Any
     ) -> Any:
@@ -1109,33 +1098,23 @@ class KinectNoisyObjectMask(Sensor):
             raise Exception('Not implemented', self.type)
 
         target_object_id = task.task_info[info_to_search]
-        all_visible_masks = env.controller.last_event.third_party_instance_masks[0]
-        if len(env.controller.last_event.third_party_instance_masks) != 1:
+        event = env.controller.last_event
+        if len(event.third_party_instance_segmentation_frames) != 1:
             print('Warning multiple cameras')
-        # assert len(env.controller.last_event.third_party_instance_masks) == 1
-        if target_object_id in all_visible_masks:
-            mask_frame = all_visible_masks[target_object_id]
-
-            if self.distance_thr > 0:
-
-                agent_location = env.get_agent_location()
-                object_location = env.get_object_by_id(target_object_id)['position']
-                current_agent_distance_to_obj = sum([(object_location[k] - agent_location[k])**2 for k in ['x', 'z']]) ** 0.5
-                if self.only_close_big_masks:
-                    if current_agent_distance_to_obj > self.distance_thr or mask_frame.sum() < 20: # objects that are smaller than this many pixels should be removed. High chance all spatulas will be removed
-
-                        mask_frame[:] = 0
-
-        else:
-            mask_frame =np.zeros(env.controller.last_event.frame[:,:,0].shape)
-
-        mask_frame = (np.expand_dims(mask_frame.astype(np.float),axis=-1))
-
-        current_shape = mask_frame.shape
-        if (current_shape[0], current_shape[1]) == (self.width, self.height):
-            resized_mask = mask_frame
-        else:
-            resized_mask = cv2.resize(mask_frame, (self.height, self.width)).reshape(self.width, self.height, 1) # my gut says this is gonna be slow
+        segmentation_frame = event.third_party_instance_segmentation_frames[0]
+        mask = self.mask_at_resolution.mask(segmentation_frame, event.object_id_to_color.get(target_object_id))
+
+        if self.distance_thr > 0 and self.only_close_big_masks and mask.any():
+            agent_location = env.get_agent_location()
+            object_location = env.get_object_by_id(target_object_id)['position']
+            current_agent_distance_to_obj = sum([(object_location[k] - agent_location[k])**2 for k in ['x', 'z']]) ** 0.5
+            number_of_pixels = np.count_nonzero(mask) * self.mask_at_resolution.source_pixels_per_pixel(segmentation_frame)
+            if current_agent_distance_to_obj > self.distance_thr or number_of_pixels < 20: # objects that are smaller than this many pixels should be removed. High chance all spatulas will be removed
+                mask[:] = False
+
+        self._outputs.reverse()
+        resized_mask = self._outputs[0]
+        np.copyto(resized_mask[:, :, 0], mask)
         if self.full_frame:
             return resized_mask
         return kinect_reshape(resized_mask)